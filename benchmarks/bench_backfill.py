@@ -0,0 +1,97 @@
+"""
+Benchmark of the scaling of `Backfill` with the number of worker processes,
+against a local mock API server (see `mock_server.py`).
+
+Each shard's klines go through a CPU-bound transform (parsing the prices and
+volumes, repeated `--work` times), so that the single process runs are held
+back by the GIL. The throughput should grow close to linearly with the
+number of processes, up to the number of CPUs, or until the rate budget
+(`--max-requests-per-min`) is the bottleneck.
+
+Usage:
+    python benchmarks/bench_backfill.py [--processes 1 2 4] [--symbols 8] [--windows 16] [--work 20]
+"""
+import argparse
+import datetime
+import functools
+import json
+import os
+import sys
+import time
+
+from bench_client import start_server
+
+from sosi_api.backfill import Backfill
+
+KLINE_INTERVAL_MS = 60 * 1000
+
+
+def summarize(klines, work=1):
+    """The volume weighted average price of `klines`, computed `work` times."""
+    for _ in range(work):
+        volume = 0.0
+        notional = 0.0
+        for kline in klines:
+            v = float(kline[5])
+            volume += v
+            notional += v * (float(kline[2]) + float(kline[3]) + float(kline[4])) / 3
+    return dict(klines=len(klines), vwap=notional / volume if volume else None)
+
+
+def run(base_url, args, processes):
+    limit = args.limit
+    backfill = Backfill(
+        base_url,
+        endpoint="/api/v3/klines",
+        symbols=[f"SYM{i}" for i in range(args.symbols)],
+        t1=0,
+        t2=args.windows * limit * KLINE_INTERVAL_MS - 1,
+        window_delta=datetime.timedelta(milliseconds=limit * KLINE_INTERVAL_MS),
+        # One more than a window holds, so that each window takes one request
+        limit=limit + 1,
+        transform=functools.partial(summarize, work=args.work),
+        processes=processes,
+        max_requests_per_min=args.max_requests_per_min,
+    )
+    start = time.perf_counter()
+    klines = sum(result.records["klines"] for result in backfill)
+    seconds = time.perf_counter() - start
+    expected = args.symbols * args.windows * limit
+    if klines != expected:
+        raise AssertionError(f"Expected {expected} klines, received {klines}")
+    shards = args.symbols * args.windows
+    return dict(processes=processes, shards=shards, seconds=seconds, shards_per_second=shards / seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4], help="Numbers of worker processes to run with")
+    parser.add_argument("--symbols", type=int, default=8, help="Number of symbols")
+    parser.add_argument("--windows", type=int, default=16, help="Number of windows per symbol")
+    parser.add_argument("--limit", type=int, default=500, help="Number of klines per window")
+    parser.add_argument("--work", type=int, default=20, help="Repetitions of the transform of each shard")
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds the server delays each response by")
+    parser.add_argument("--max-requests-per-min", type=int, default=10 ** 6, help="Rate budget shared by the workers")
+    args = parser.parse_args()
+    # Only used by `start_server()`
+    args.records = 0
+    args.error_rate = 0.0
+
+    process, base_url = start_server(args)
+    try:
+        results = []
+        print(f"{'processes':<12}{'shards/s':>10}{'speedup':>10}", file=sys.stderr)
+        for processes in args.processes:
+            result = run(base_url, args, processes)
+            result["speedup"] = result["shards_per_second"] / results[0]["shards_per_second"] if results else 1.0
+            results.append(result)
+            print(f"{processes:<12}{result['shards_per_second']:>10.1f}{result['speedup']:>10.2f}", file=sys.stderr)
+    finally:
+        process.terminate()
+        process.wait()
+    print(json.dumps(dict(cpus=os.cpu_count(), config=vars(args), results=results), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
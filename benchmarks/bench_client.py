@@ -0,0 +1,277 @@
+"""
+Benchmark of the throughput, latency, memory and CPU use of the clients,
+against a local mock API server (see `mock_server.py`), in several modes:
+
+    sequential  A new client (and so a new connection) for every request.
+    pooled      A single client, reusing its keep-alive connections.
+    threaded    `BaseClient.request_many()` on a thread pool.
+    async       `AsyncBaseClient.request_many()` (requires aiohttp).
+    cached      Repeating the same request with a `ResponseCache`.
+    batching    A time-ranged request, split into windows fetched by threads.
+
+The results are written as json, so that they can be compared between
+releases. With `--compare`, the run fails if throughput dropped, or p99
+latency rose, by more than `--tolerance` compared to a previous run.
+
+Usage:
+    python benchmarks/bench_client.py [--requests 200] [--latency 0.005] [--output results.json]
+    python benchmarks/bench_client.py --compare results.json
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from sosi_api import AsyncBaseClient, BaseClient
+from sosi_api.utils.cache import ResponseCache
+from sosi_api.utils.metrics import RequestHooks
+from sosi_api.utils.retry import RetryPolicy
+
+MODES = ("sequential", "pooled", "threaded", "async", "cached", "batching")
+DATA_ENDPOINT = "/api/v3/data"
+KLINES_ENDPOINT = "/api/v3/klines"
+KLINE_INTERVAL_MS = 60 * 1000
+
+
+class Recorder(RequestHooks):
+    """Collects the total latency of every request, and the counters."""
+
+    def __init__(self):
+        self.latencies = []
+        self.counters = collections.Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, phase, endpoint, seconds):
+        if phase == "total":
+            with self._lock:
+                self.latencies.append(seconds)
+
+    def increment(self, name, endpoint, amount=1, status=None):
+        with self._lock:
+            self.counters[name if status is None else f"{name}_{status}"] += amount
+
+
+def client_kwargs(args, recorder):
+    return dict(
+        max_requests_per_min=None,
+        metrics=recorder,
+        retry_policy=RetryPolicy(max_retries=10, backoff_factor=0.01),
+    )
+
+
+def run_sequential(base_url, args, recorder):
+    for _ in range(args.requests):
+        with BaseClient(base_url, **client_kwargs(args, recorder)) as client:
+            client.request(endpoint=DATA_ENDPOINT)
+
+
+def run_pooled(base_url, args, recorder):
+    with BaseClient(base_url, **client_kwargs(args, recorder)) as client:
+        for _ in range(args.requests):
+            client.request(endpoint=DATA_ENDPOINT)
+
+
+def run_threaded(base_url, args, recorder):
+    with BaseClient(base_url, pool_maxsize=args.concurrency, **client_kwargs(args, recorder)) as client:
+        results = client.request_many([dict(endpoint=DATA_ENDPOINT)] * args.requests, max_concurrency=args.concurrency)
+    errors = [result.error for result in results if not result.ok]
+    if errors:
+        raise errors[0]
+
+
+def run_async(base_url, args, recorder):
+    async def main():
+        async with AsyncBaseClient(base_url, pool_maxsize=args.concurrency, **client_kwargs(args, recorder)) as client:
+            return await client.request_many([dict(endpoint=DATA_ENDPOINT)] * args.requests, max_concurrency=args.concurrency)
+    results = asyncio.run(main())
+    errors = [result.error for result in results if not result.ok]
+    if errors:
+        raise errors[0]
+
+
+def run_cached(base_url, args, recorder):
+    with BaseClient(base_url, cache=ResponseCache(ttl=60), **client_kwargs(args, recorder)) as client:
+        for _ in range(args.requests):
+            client.request(endpoint=DATA_ENDPOINT)
+
+
+def run_batching(base_url, args, recorder):
+    # One request per window: each window holds `limit` klines, and asking
+    # for one more than that tells the client that the window is exhausted
+    limit = args.limit
+    t2 = args.requests * limit * KLINE_INTERVAL_MS - 1
+    with BaseClient(base_url, pool_maxsize=args.concurrency, **client_kwargs(args, recorder)) as client:
+        records = client._time_range_batched_request(
+            endpoint=KLINES_ENDPOINT,
+            t1=0,
+            t2=t2,
+            window_delta=datetime.timedelta(milliseconds=limit * KLINE_INTERVAL_MS),
+            limit=limit + 1,
+            max_workers=args.concurrency,
+        )
+    if len(records) != args.requests * limit:
+        raise AssertionError(f"Expected {args.requests * limit} klines, received {len(records)}")
+
+
+RUNNERS = {
+    "sequential": run_sequential,
+    "pooled": run_pooled,
+    "threaded": run_threaded,
+    "async": run_async,
+    "cached": run_cached,
+    "batching": run_batching,
+}
+
+
+def percentile(values, q):
+    """The `q` percentile (0-100) of `values`, by linear interpolation."""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def measure(mode, base_url, args):
+    """Run a mode once for timing, and once more for its peak memory."""
+    runner = RUNNERS[mode]
+
+    recorder = Recorder()
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    runner(base_url, args, recorder)
+    seconds = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    peak_memory = None
+    if args.memory:
+        tracemalloc.start()
+        try:
+            runner(base_url, args, Recorder())
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    calls = len(recorder.latencies)
+    return dict(
+        mode=mode,
+        calls=calls,
+        http_requests=recorder.counters["requests"],
+        seconds=seconds,
+        throughput=calls / seconds,
+        p50_ms=percentile(recorder.latencies, 50) * 1000,
+        p99_ms=percentile(recorder.latencies, 99) * 1000,
+        cpu_ms_per_call=cpu * 1000 / calls,
+        peak_memory_bytes=peak_memory,
+        retries=recorder.counters["retries"],
+        errors=recorder.counters["errors"],
+        cache_hits=recorder.counters["cache_hits"],
+    )
+
+
+def start_server(args):
+    """Start the mock server in its own process, so that its CPU use is not
+    counted, and return the process and its base url.
+    """
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py"),
+        "--latency", str(args.latency),
+        "--records", str(args.records),
+        "--error-rate", str(args.error_rate),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("PORT "):
+        process.kill()
+        raise RuntimeError(f"The mock server failed to start: {line!r}")
+    return process, f"http://127.0.0.1:{int(line.split()[1])}"
+
+
+def compare(results, baseline, tolerance):
+    """The regressions of `results` compared to `baseline` (both lists of
+    results of `measure()`).
+    """
+    baseline = {result["mode"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["mode"])
+        if previous is None:
+            continue
+        if result["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(f"{result['mode']}: throughput {previous['throughput']:.1f} -> {result['throughput']:.1f} calls/s")
+        if result["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{result['mode']}: p99 latency {previous['p99_ms']:.2f} -> {result['p99_ms']:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES, help="Modes to run")
+    parser.add_argument("--requests", type=int, default=200, help="Number of requests per mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="Threads (or tasks) of the concurrent modes")
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds the server delays each response by")
+    parser.add_argument("--records", type=int, default=500, help="Number of records in each response")
+    parser.add_argument("--limit", type=int, default=500, help="Number of klines per window of the batching mode")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of responses that are 429s")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Skip measuring the peak memory")
+    parser.add_argument("--output", help="Write the json results to this file instead of stdout")
+    parser.add_argument("--compare", help="json results of a previous run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Fraction of change allowed by --compare")
+    args = parser.parse_args()
+
+    modes = [mode for mode in args.modes if mode != "async" or aiohttp is not None]
+    if len(modes) < len(args.modes):
+        print("Skipping the async mode, as aiohttp is not installed", file=sys.stderr)
+
+    process, base_url = start_server(args)
+    try:
+        results = []
+        print(f"{'mode':<12}{'calls/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'cpu ms':>10}{'peak MB':>10}", file=sys.stderr)
+        for mode in modes:
+            result = measure(mode, base_url, args)
+            results.append(result)
+            peak = "-" if result["peak_memory_bytes"] is None else f"{result['peak_memory_bytes'] / 1e6:.2f}"
+            print(f"{mode:<12}{result['throughput']:>10.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['cpu_ms_per_call']:>10.3f}{peak:>10}", file=sys.stderr)
+    finally:
+        process.terminate()
+        process.wait()
+
+    output = dict(
+        created=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        config={key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        results=results,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Benchmark of the batch timestamp conversions of `sosi_api.utils.dt`, against
+calling the scalar functions once per value.
+
+Usage:
+    python benchmarks/bench_dt.py [--n 1000000] [--repeat 3]
+"""
+import argparse
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from sosi_api.utils import dt
+
+
+def best_time(func, repeat):
+    """The fastest of `repeat` runs of `func()`, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100000, help="Number of timestamps (eg kline open times)")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each case, keeping the fastest")
+    args = parser.parse_args()
+
+    # Open times of 1 minute klines
+    timestamps = [1640995200000 + 60000 * i for i in range(args.n)]
+    datetimes = dt.timestamps_to_datetimes(timestamps)
+    strs = dt.timestamps_to_datetime_strs(timestamps)
+    cases = [
+        ("datetime (scalar loop)", lambda: [dt.timestamp_to_datetime(ts) for ts in timestamps]),
+        ("datetime (batch, list)", lambda: dt.timestamps_to_datetimes(timestamps)),
+        ("str (scalar loop)", lambda: [dt.timestamp_to_datetime_str(ts) for ts in timestamps]),
+        ("str (batch, list)", lambda: dt.timestamps_to_datetime_strs(timestamps)),
+        ("timestamp (scalar loop)", lambda: [dt.convert_timearg_as_timestamp(d) for d in datetimes]),
+        ("timestamp (batch, list)", lambda: dt.convert_timeargs_as_timestamps(datetimes)),
+        ("parse str (scalar loop)", lambda: [dt.datetime_str_to_timestamp(s) for s in strs]),
+        ("parse str (batch, list)", lambda: dt.convert_timeargs_as_timestamps(strs)),
+    ]
+    if numpy is not None:
+        array = numpy.asarray(timestamps, dtype="int64")
+        dt64 = dt.timestamps_to_datetime64(array)
+        cases += [
+            ("datetime (batch, numpy)", lambda: dt.timestamps_to_datetimes(array)),
+            ("datetime64 (batch, numpy)", lambda: dt.timestamps_to_datetime64(array)),
+            ("str (batch, numpy)", lambda: dt.timestamps_to_datetime_strs(array)),
+            ("timestamp (batch, numpy)", lambda: dt.datetimes_to_timestamps(dt64)),
+        ]
+
+    print(f"{args.n} values, best of {args.repeat}")
+    print(f"{'case':<28}{'seconds':>10}{'values/s':>14}")
+    for name, func in cases:
+        seconds = best_time(func, args.repeat)
+        print(f"{name:<28}{seconds:>10.4f}{args.n / seconds:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Microbenchmark of the per-call overhead of the client, comparing
+`BaseClient.request()` with a `PreparedEndpoint`.
+
+Requests go to a transport that returns the same prebuilt response without
+any I/O, so that only the work done by the client is measured. The cost of
+decoding the response, and of calling the transport directly, are measured
+too, as the floor that neither can go below.
+
+Usage:
+    python benchmarks/bench_endpoints.py [--calls 20000] [--repeat 5]
+"""
+import argparse
+import json
+import sys
+import timeit
+import warnings
+
+from sosi_api import BaseClient
+from sosi_api.endpoints import Endpoint
+from sosi_api.response import Response
+from sosi_api.transports import BaseTransport
+
+KLINES_ENDPOINT = "/api/v3/klines"
+BODY = json.dumps([[1640995200000, "46216.93", "46271.08", "46208.37", "46250.00", "40.89"]]).encode("utf-8")
+
+
+class NullTransport(BaseTransport):
+    """Answers every request with the same response, without any I/O."""
+
+    def __init__(self):
+        self.response = Response(status_code=200, headers={"Content-Type": "application/json"}, content=BODY, url="http://localhost" + KLINES_ENDPOINT)
+
+    def send(self, method, url, params=None, json=None, headers=None, timeout=None, stream=False):
+        return self.response
+
+
+class BenchClient(BaseClient):
+    klines = Endpoint(KLINES_ENDPOINT, params=dict(interval="1m", limit=1000), weight=2)
+
+
+def make_client():
+    return BenchClient(
+        "http://localhost",
+        headers={"X-MBX-APIKEY": "key", "User-Agent": "bench"},
+        max_requests_per_min=None,
+        transport=NullTransport(),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000, help="Calls per timing")
+    parser.add_argument("--repeat", type=int, default=5, help="Timings per case, of which the fastest is kept")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    client = make_client()
+    transport = client.transport
+    klines = client.klines
+    url = client.base_url + KLINES_ENDPOINT
+    params = dict(symbol="BTCUSDT", interval="1m", limit=1000)
+
+    cases = {
+        "transport.send() only": lambda: transport.send("GET", url, params=params, json={}, headers=client.headers),
+        "decode only": lambda: client._process_response(transport.response, response_kind="json"),
+        "request(url_params=...)": lambda: client.request(endpoint=KLINES_ENDPOINT, url_params=params, weight=2),
+        "request(params=...) (deprecated)": lambda: client.request(endpoint=KLINES_ENDPOINT, params=params, weight=2),
+        "prepared endpoint": lambda: klines(symbol="BTCUSDT"),
+    }
+    results = {}
+    for name, func in cases.items():
+        seconds = min(timeit.repeat(func, number=args.calls, repeat=args.repeat))
+        results[name] = seconds / args.calls * 1e6
+
+    # The floor is sending the request and decoding the response
+    floor = results["transport.send() only"] + results["decode only"]
+    print(f"{'case':<36}{'us/call':>10}{'overhead us':>14}", file=sys.stderr)
+    for name, micros in results.items():
+        overhead = "-" if name in ("transport.send() only", "decode only") else f"{micros - floor:.2f}"
+        print(f"{name:<36}{micros:>10.2f}{overhead:>14}", file=sys.stderr)
+    reduction = 1 - (results["prepared endpoint"] - floor) / (results["request(url_params=...)"] - floor)
+    print(f"Per-call overhead reduced by {reduction:.0%}", file=sys.stderr)
+    print(json.dumps(dict(calls=args.calls, us_per_call=results, overhead_reduction=reduction), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Benchmark of the memory use of `RecordStore` against keeping the decoded json
+records (lists of strings, as returned by the API), and of selecting a range
+of time with `between()` against scanning the records.
+
+Usage:
+    python benchmarks/bench_record_store.py [--n 500000] [--page-size 1000]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from sosi_api.utils.columnar import Schema
+from sosi_api.utils.record_store import RecordStore
+
+KLINE_SCHEMA = Schema([
+    ("open_time", "timestamp_ms"), ("open", "float"), ("high", "float"),
+    ("low", "float"), ("close", "float"), ("volume", "float"),
+    ("close_time", "timestamp_ms"), ("quote_volume", "float"), ("trades", "int"),
+    ("taker_base_volume", "float"), ("taker_quote_volume", "float"), (None, "str"),
+])
+
+
+def make_page_bodies(n, page_size):
+    """json bodies of pages of 1 minute klines, like the API returns them."""
+    rng = random.Random(0)
+    price = 46000.0
+    bodies = []
+    for first in range(0, n, page_size):
+        klines = []
+        for i in range(first, min(first + page_size, n)):
+            price += rng.uniform(-20, 20)
+            t = 1640995200000 + 60000 * i
+            klines.append([
+                t, f"{price:.2f}", f"{price + 10:.2f}", f"{price - 10:.2f}", f"{price + 1:.2f}",
+                f"{rng.uniform(0, 50):.5f}", t + 59999, f"{rng.uniform(0, 2e6):.5f}", rng.randint(0, 2000),
+                f"{rng.uniform(0, 25):.5f}", f"{rng.uniform(0, 1e6):.5f}", "0",
+            ])
+        bodies.append(json.dumps(klines))
+    return bodies
+
+
+def measure(build):
+    """`(result, traced bytes, seconds)` of `build()`."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, seconds
+
+
+def build_lists(bodies):
+    records = []
+    for body in bodies:
+        records.extend(json.loads(body))
+    return records
+
+
+def build_store(bodies):
+    store = RecordStore(KLINE_SCHEMA)
+    for body in bodies:
+        store.extend(json.loads(body))
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=500000, help="Number of klines")
+    parser.add_argument("--page-size", type=int, default=1000, help="Number of klines per page")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of one hour ranges selected")
+    args = parser.parse_args()
+
+    bodies = make_page_bodies(args.n, args.page_size)
+    records, list_bytes, list_seconds = measure(lambda: build_lists(bodies))
+    store, store_bytes, store_seconds = measure(lambda: build_store(bodies))
+    del bodies
+
+    rng = random.Random(1)
+    starts = [1640995200000 + 60000 * rng.randrange(args.n) for _ in range(args.queries)]
+    queries = [(t1, t1 + 60 * 60000 - 1) for t1 in starts]
+    start = time.perf_counter()
+    scanned = [[r for r in records if t1 <= r[0] <= t2] for t1, t2 in queries[:10]]
+    scan_seconds = (time.perf_counter() - start) / len(scanned)
+    start = time.perf_counter()
+    selected = [store.between(t1, t2) for t1, t2 in queries]
+    between_seconds = (time.perf_counter() - start) / len(selected)
+    if [len(rows) for rows in scanned] != [len(view) for view in selected[:10]]:
+        raise AssertionError("between() selected different records than the scan")
+
+    results = dict(
+        n=args.n,
+        list_bytes_per_record=list_bytes / args.n,
+        store_bytes_per_record=store_bytes / args.n,
+        memory_ratio=list_bytes / store_bytes,
+        list_build_seconds=list_seconds,
+        store_build_seconds=store_seconds,
+        scan_us_per_query=scan_seconds * 1e6,
+        between_us_per_query=between_seconds * 1e6,
+    )
+    print(f"{'':<24}{'bytes/record':>14}{'build s':>10}{'range query us':>16}", file=sys.stderr)
+    print(f"{'lists of strings':<24}{results['list_bytes_per_record']:>14.0f}{list_seconds:>10.2f}{results['scan_us_per_query']:>16.1f}", file=sys.stderr)
+    print(f"{'RecordStore':<24}{results['store_bytes_per_record']:>14.0f}{store_seconds:>10.2f}{results['between_us_per_query']:>16.1f}", file=sys.stderr)
+    print(f"Memory reduced {results['memory_ratio']:.1f}x", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Local stand-in for a REST API, for benchmarking the clients without
+depending on (or being rate limited by) a real server.
+
+Endpoints:
+    /api/v3/ping        An empty json object.
+    /api/v3/data        An array of `--records` records.
+    /api/v3/klines      1 minute klines between `startTime` and `endTime`
+                        (inclusive, in milliseconds), up to `limit` of them.
+
+Every response is delayed by `--latency` seconds, and a `--error-rate`
+fraction of them are `429 Too Many Requests`, with a `Retry-After` of 0.
+
+Usage:
+    python benchmarks/mock_server.py [--port 0] [--latency 0.005] [--records 500] [--error-rate 0]
+
+The server prints the port it listens on (eg "PORT 53124") once it is ready.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+KLINE_INTERVAL_MS = 60 * 1000
+
+
+def make_kline(open_time):
+    return [
+        open_time, "46216.93000000", "46271.08000000", "46208.37000000", "46250.00000000",
+        "40.89652000", open_time + KLINE_INTERVAL_MS - 1, "1890962.49910560", 1187,
+        "20.57498000", "951422.93591950", "0",
+    ]
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    records = 500
+    error_rate = 0.0
+    random = random.Random(0)
+    random_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        content = json.dumps(body, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        # Read any body, so that the connection can be reused
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate:
+            with self.random_lock:
+                rejected = self.random.random() < self.error_rate
+            if rejected:
+                self.send_json(429, {"code": -1003, "msg": "Too many requests."}, headers={"Retry-After": "0"})
+                return
+
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        if url.path == "/api/v3/ping":
+            self.send_json(200, {})
+        elif url.path == "/api/v3/data":
+            records = int(params.get("records", self.records))
+            self.send_json(200, [make_kline(i * KLINE_INTERVAL_MS) for i in range(records)])
+        elif url.path == "/api/v3/klines":
+            start = int(params.get("startTime", 0))
+            end = int(params.get("endTime", start + 1000 * KLINE_INTERVAL_MS))
+            limit = int(params.get("limit", 500))
+            # First open time at or after `start`
+            first = -(-start // KLINE_INTERVAL_MS) * KLINE_INTERVAL_MS
+            open_times = range(first, end + 1, KLINE_INTERVAL_MS)[:limit]
+            self.send_json(200, [make_kline(open_time) for open_time in open_times])
+        else:
+            self.send_json(404, {"code": -1, "msg": "Not found."})
+
+    do_POST = do_GET
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for many concurrent connections (the default is 5)
+    request_queue_size = 1024
+
+
+def make_server(port=0, latency=0.0, records=500, error_rate=0.0, seed=0):
+    handler = type("Handler", (MockAPIHandler,), dict(
+        latency=latency,
+        records=records,
+        error_rate=error_rate,
+        random=random.Random(seed),
+        random_lock=threading.Lock(),
+    ))
+    return MockAPIServer(("127.0.0.1", port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on. 0 picks a free one")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to delay each response by")
+    parser.add_argument("--records", type=int, default=500, help="Number of records returned by /api/v3/data")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of responses that are 429s")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the 429 injection")
+    args = parser.parse_args()
+
+    server = make_server(port=args.port, latency=args.latency, records=args.records, error_rate=args.error_rate, seed=args.seed)
+    print(f"PORT {server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
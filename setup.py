@@ -28,6 +28,15 @@ setuptools.setup(
         'requests',
     ],
     extras_require={
+        'async': [
+            'aiohttp',
+        ],
+        'http2': [
+            'httpx[http2]',
+        ],
+        'parquet': [
+            'pyarrow',
+        ],
         'dev': [
             'pip-tools',
             'pylint',
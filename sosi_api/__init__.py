@@ -2,3 +2,4 @@ import pkg_resources
 __version__ = pkg_resources.get_distribution("sosi_api").version
 
 from .client import BaseClient
+from .async_client import AsyncBaseClient
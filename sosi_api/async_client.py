@@ -0,0 +1,408 @@
+"""
+Asyncio counterpart of `BaseClient`, for keeping many requests in flight at
+once from a single thread.
+
+Requires the optional `aiohttp` dependency:
+
+    pip install sosi-api[async]
+"""
+import asyncio
+import copy
+import datetime
+import inspect
+import logging
+import time
+import urllib.parse
+import warnings
+
+try:
+    import aiohttp
+    import yarl
+except ImportError:
+    aiohttp = None
+
+import requests
+
+from . import exceptions
+from .client import BaseClient, RequestResult
+from .response import Response
+from .utils.json_decoders import get_json_loads
+from .utils.metrics import Metrics, record_response
+from .utils.rate_limiters import SlidingWindowLimiter
+from .utils.retry import CircuitBreaker, RetryPolicy
+from .utils.status_handlers import DEFAULT_STATUS_HANDLERS
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBaseClient:
+    def __init__(self, base_url=None, headers=None, max_requests_per_min=60, response_kind="json", status_handlers=None, pool_maxsize=100, pool_maxsize_per_host=0, timeout=None, rate_limiter=None, endpoint_weights=None, retry_policy=None, circuit_breaker=None, json_decoder=None, signer=None, clock=None, metrics=None, endpoint_priorities=None):
+        """
+        Args:
+            base_url (str): The base url of the API.
+            headers (dict): The headers to be sent with each request.
+            max_requests_per_min (int): The maximum number of requests per
+                minute. Set to `None` to disable rate limiting. Ignored if a
+                `rate_limiter` is provided.
+            response_kind (str): The kind of response to return. eg "json" or "text"
+            status_handlers (dict):
+                A dictionary of response status codes and functions to handle
+                them. Same as for `BaseClient`, except that the functions can
+                also be coroutine functions:
+                    async func(response, msg=None, **kwargs)
+            pool_maxsize (int): The maximum number of connections open at the
+                same time, across all hosts. `0` for no limit.
+            pool_maxsize_per_host (int): The maximum number of connections open
+                at the same time to a single host. `0` for no limit.
+            timeout (float or tuple): Timeout in seconds applied to every
+                request. Either a single value for the whole request, or a
+                `(connect, read)` tuple. Defaults to `None`, which waits
+                forever.
+            rate_limiter (BaseRateLimiter): A rate limiter from
+                `sosi_api.utils.rate_limiters` to use instead of the one
+                created from `max_requests_per_min`. It can be shared with
+                other clients, including non-async ones.
+            endpoint_weights (dict): The rate limit weight of each endpoint,
+                keyed by endpoint. Endpoints that are not listed have a weight
+                of 1.
+            retry_policy (RetryPolicy): How to retry failed requests. Same as
+                for `BaseClient`, but the waits do not block the event loop.
+            circuit_breaker (CircuitBreaker): Same as for `BaseClient`.
+            json_decoder (str or callable): Same as for `BaseClient`.
+            signer (Signer): Same as for `BaseClient`.
+            endpoint_priorities (dict): Same as for `BaseClient`.
+            clock (ClockOffsetTracker): Same as for `BaseClient`.
+            metrics (RequestHooks): Same as for `BaseClient`.
+
+        Note:
+            The connection pool is created on the first request, inside the
+            running event loop. Close it with `await client.close()`, or use
+            the client as an async context manager:
+
+                >>> async with AsyncBaseClient("http://example.com") as client:
+                ...     await client.request(endpoint="/json")
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncBaseClient requires `aiohttp`. Install it with `pip install sosi-api[async]`")
+        self.base_url = "" if base_url is None else base_url
+        if headers is None:
+            self.headers = {}
+        else:
+            self.headers = copy.deepcopy(headers)
+        self.response_kind = response_kind
+        self.json_loads = get_json_loads(json_decoder)
+        self.signer = signer
+        self.clock = clock
+        self._clock_lock = None
+        self.metrics = Metrics() if metrics is True else metrics
+        if (self.metrics is not None) and (clock is not None):
+            self.metrics.add_gauge("clock_offset_ms", lambda: clock.offset_ms if clock.samples else None)
+            self.metrics.add_gauge("clock_error_ms", lambda: clock.error_ms)
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.pool_maxsize_per_host = pool_maxsize_per_host
+        self._session = None
+
+        if rate_limiter is not None:
+            self.rate_limiter = rate_limiter
+        elif max_requests_per_min is not None:
+            self.rate_limiter = SlidingWindowLimiter(max_tokens=max_requests_per_min, period=60.0)
+        else:
+            self.rate_limiter = None
+        self.endpoint_weights = {} if endpoint_weights is None else dict(endpoint_weights)
+        self.endpoint_priorities = {} if endpoint_priorities is None else dict(endpoint_priorities)
+        self.retry_policy = RetryPolicy() if retry_policy is True else retry_policy
+        self.circuit_breaker = CircuitBreaker() if circuit_breaker is True else circuit_breaker
+
+        self._status_handlers = DEFAULT_STATUS_HANDLERS
+        if status_handlers is not None:
+            self.add_status_handlers(status_handlers)
+
+    add_status_handlers = BaseClient.add_status_handlers
+    _extract_message = BaseClient._extract_message
+    _iter_stream = BaseClient._iter_stream
+
+    def _client_timeout(self):
+        if self.timeout is None:
+            return aiohttp.ClientTimeout(total=None)
+        elif isinstance(self.timeout, (tuple, list)):
+            connect, read = self.timeout
+            return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+        return aiohttp.ClientTimeout(total=self.timeout)
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_maxsize, limit_per_host=self.pool_maxsize_per_host)
+            trace_configs = None if self.metrics is None else [_connect_trace_config()]
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._client_timeout(), trace_configs=trace_configs)
+        return self._session
+
+    async def close(self):
+        """Close all the open connections held by this client."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def request(self, url=None, endpoint=None, params=None, body_params=None, url_params=None, headers=None, kind="get", response_kind=None, weight=None, schema=None, signed=False, priority=None):
+        """Same as `BaseClient.request()`, but must be awaited."""
+        if params is not None:
+            warnings.warn("`params` is deprecated, use `body_params` or `url_params` instead", DeprecationWarning, stacklevel=2)
+            if kind.lower() == "get":
+                url_params = params
+            elif kind.lower() in ["post", "put", "delete"]:
+                body_params = params
+
+        if self.metrics is None:
+            return await self._request(url=url, endpoint=endpoint, body_params=body_params, url_params=url_params, headers=headers, kind=kind, response_kind=response_kind, weight=weight, schema=schema, signed=signed, priority=priority)
+        start = time.perf_counter()
+        try:
+            return await self._request(url=url, endpoint=endpoint, body_params=body_params, url_params=url_params, headers=headers, kind=kind, response_kind=response_kind, weight=weight, schema=schema, signed=signed, priority=priority)
+        finally:
+            full_url = (self.base_url + str(endpoint)) if url is None else url
+            self.metrics.observe("total", urllib.parse.urlsplit(full_url).path, time.perf_counter() - start)
+
+    async def _request(self, url=None, endpoint=None, body_params=None, url_params=None, headers=None, kind="get", response_kind=None, weight=None, schema=None, signed=False, priority=None):
+        if (url is None) and (endpoint is None):
+            raise ValueError("Either `url` or `endpoint` must be provided")
+        if url is None:
+            url = self.base_url + str(endpoint)
+
+        body_params = copy.deepcopy(body_params) if body_params is not None else {}
+        url_params = copy.deepcopy(url_params) if url_params is not None else {}
+
+        if headers is None:
+            headers = {}
+        if signed:
+            if self.signer is None:
+                raise ValueError("Signed requests require the client to have a `signer`")
+            if body_params:
+                # Only the query string is signed
+                raise ValueError("Signed requests must send their parameters as `url_params`, not `body_params`")
+            headers = {**self.headers, **self.signer.headers, **headers}
+        else:
+            headers = {**self.headers, **headers}
+
+        if weight is None:
+            weight = self.endpoint_weights.get(endpoint, 1)
+        if priority is None:
+            priority = self.endpoint_priorities.get(endpoint)
+        method = kind.upper()
+        split_url = urllib.parse.urlsplit(url)
+        host = split_url.netloc
+        metrics = self.metrics
+        attempt = 0
+        while True:
+            if signed and (self.clock is not None) and self.clock.needs_refresh():
+                if self._clock_lock is None:
+                    self._clock_lock = asyncio.Lock()
+                async with self._clock_lock:
+                    # Unless another task has just refreshed it
+                    if self.clock.needs_refresh():
+                        await self.sync_clock()
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_request(host)
+            queued_at = time.perf_counter()
+            if self.rate_limiter is not None:
+                try:
+                    await self.rate_limiter.acquire_async(weight, priority=priority)
+                except BaseException:
+                    # eg a `BackpressureError`, or a cancelled task. The
+                    # request was never sent
+                    if self.circuit_breaker is not None:
+                        self.circuit_breaker.release(host)
+                    raise
+            if metrics is not None:
+                metrics.observe("queue", split_url.path, time.perf_counter() - queued_at)
+
+            timings = {}
+            try:
+                sent_at = time.perf_counter()
+                sent_ms = time.time() * 1000
+                if signed:
+                    timestamp = None if self.clock is None else self.clock.now_ms()
+                    response = await self._send(url=self.signer.sign_url(url, url_params, timestamp=timestamp), body_params=body_params, headers=headers, kind=kind, encoded=True, timings=timings)
+                else:
+                    response = await self._send(url=url, body_params=body_params, url_params=url_params, headers=headers, kind=kind, timings=timings)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure(host)
+                if metrics is not None:
+                    metrics.increment("errors", split_url.path)
+                wait = None if self.retry_policy is None else self.retry_policy.get_wait(method, attempt, exception=_as_requests_exception(e))
+                if wait is None:
+                    raise
+                logger.debug("Retrying %s %s in %.3fs after %r", method, url, wait, e)
+                if metrics is not None:
+                    metrics.increment("retries", split_url.path)
+                await asyncio.sleep(wait)
+                attempt += 1
+                continue
+            except aiohttp.ClientError:
+                # Any other failure to get a response, eg a ClientPayloadError
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure(host)
+                if metrics is not None:
+                    metrics.increment("errors", split_url.path)
+                raise
+            except BaseException:
+                # eg a cancelled task
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.release(host)
+                raise
+
+            if metrics is not None:
+                record_response(metrics, split_url.path, response, time.perf_counter() - sent_at, connect=timings.get("connect", 0.0))
+            if (self.clock is not None) and (self.clock.time_endpoint is None):
+                self.clock.add_date_header(response, sent_ms, time.time() * 1000)
+            if self.rate_limiter is not None:
+                self.rate_limiter.update(response)
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_response(host, response)
+            wait = None if (self.retry_policy is None or response.ok) else self.retry_policy.get_wait(method, attempt, response=response)
+            if wait is None:
+                return await self._process_response(response, response_kind=response_kind, schema=schema)
+            logger.debug("Retrying %s %s in %.3fs after a %s response", method, url, wait, response.status_code)
+            if metrics is not None:
+                metrics.increment("retries", split_url.path)
+            await asyncio.sleep(wait)
+            attempt += 1
+
+    async def sync_clock(self):
+        """Same as `BaseClient.sync_clock()`, but must be awaited."""
+        if self.clock is None or self.clock.time_endpoint is None:
+            raise ValueError("Syncing the clock requires the client to have a `clock` with a `time_endpoint`")
+        endpoint = self.clock.time_endpoint
+        url = endpoint if "://" in endpoint else self.base_url + endpoint
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async(self.endpoint_weights.get(endpoint, 1), priority=self.endpoint_priorities.get(endpoint))
+        sent_ms = time.time() * 1000
+        response = await self._send(url=url, headers=self.headers)
+        received_ms = time.time() * 1000
+        if self.rate_limiter is not None:
+            self.rate_limiter.update(response)
+        msg = await self._process_response(response, response_kind="json")
+        self.clock.add_time_response(msg, sent_ms, received_ms)
+        return self.clock.offset_ms
+
+    async def _send(self, url, body_params=None, url_params=None, headers=None, kind="get", encoded=False, timings=None):
+        """Send a single request, and return the response, with its body
+        already read. If `encoded` is `True`, the query string of `url` is
+        sent exactly as it is (eg because it was signed). The time spent
+        opening a new connection is stored in `timings["connect"]`.
+        """
+        session = self._get_session()
+        if encoded:
+            url = yarl.URL(url, encoded=True)
+        start = time.perf_counter()
+        async with session.request(kind.upper(), url, params=url_params, json=body_params, headers=headers, trace_request_ctx=timings) as resp:
+            elapsed = datetime.timedelta(seconds=time.perf_counter() - start)
+            content = await resp.read()
+            return Response(
+                status_code=resp.status,
+                headers=resp.headers,
+                content=content,
+                url=str(resp.url),
+                reason=resp.reason,
+                encoding=resp.charset,
+                elapsed=elapsed,
+            )
+
+    async def _process_response(self, response, response_kind=None, schema=None):
+        """Same as `BaseClient._process_response()`, except that the status
+        handlers can be coroutine functions.
+        """
+        response_kind = self.response_kind if response_kind is None else response_kind
+        start = time.perf_counter()
+        msg = self._extract_message(response=response, response_kind=response_kind, schema=schema)
+        if self.metrics is not None:
+            self.metrics.observe("decode", urllib.parse.urlsplit(response.url).path, time.perf_counter() - start)
+        if response.ok:
+            return msg
+        else:
+            # CATCH EXCEPTIONS - using one of the status handlers
+            status_code = response.status_code
+            response_function = self._status_handlers.get(int(status_code))
+            if response_function == "pass":
+                # Return as if nothing bad happened
+                return msg
+            elif response_function is not None:
+                start = time.perf_counter()
+                try:
+                    result = response_function(response=response, msg=msg)
+                    if inspect.isawaitable(result):
+                        result = await result
+                    return result
+                finally:
+                    if self.metrics is not None:
+                        self.metrics.observe("handle", urllib.parse.urlsplit(response.url).path, time.perf_counter() - start)
+            else:
+                logger.error("Unhandled %s response from %s: %s", status_code, response.url, msg)
+                response.raise_for_status()
+
+
+    async def _request_spec(self, index, spec, semaphore):
+        async with semaphore:
+            try:
+                return RequestResult(index=index, spec=spec, result=await self.request(**spec), error=None)
+            except Exception as e:
+                return RequestResult(index=index, spec=spec, result=None, error=e)
+
+    async def request_many(self, specs, max_concurrency=100):
+        """Same as `BaseClient.request_many()`, but must be awaited, and the
+        requests are coroutines rather than threads.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        return await asyncio.gather(*[self._request_spec(index, spec, semaphore) for index, spec in enumerate(specs)])
+
+    async def request_many_as_completed(self, specs, max_concurrency=100):
+        """Same as `BaseClient.request_many_as_completed()`, but an async
+        generator:
+
+            >>> async for result in client.request_many_as_completed(specs):
+            ...     print(result.index, result.result)
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        tasks = [asyncio.ensure_future(self._request_spec(index, spec, semaphore)) for index, spec in enumerate(specs)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def _connect_trace_config():
+    """aiohttp tracing of the time spent opening new connections, which is
+    stored in the `trace_request_ctx` dict of the request.
+    """
+    async def on_start(session, context, params):
+        context.connect_start = time.perf_counter()
+
+    async def on_end(session, context, params):
+        if context.trace_request_ctx is not None:
+            context.trace_request_ctx["connect"] = time.perf_counter() - context.connect_start
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(on_start)
+    trace_config.on_connection_create_end.append(on_end)
+    return trace_config
+
+
+def _as_requests_exception(exception):
+    """Map an aiohttp exception to the equivalent `requests` exception, so
+    that it can be classified by a `RetryPolicy`.
+    """
+    if isinstance(exception, aiohttp.ClientConnectorError):
+        return exceptions.ConnectError(str(exception))
+    elif isinstance(exception, getattr(aiohttp, "ConnectionTimeoutError", ())):
+        # aiohttp >= 3.10
+        return requests.ConnectTimeout(str(exception))
+    elif isinstance(exception, asyncio.TimeoutError):
+        return requests.ReadTimeout(str(exception))
+    return requests.ConnectionError(str(exception))
@@ -0,0 +1,236 @@
+"""
+Backfills of long historical time ranges for many symbols, sharded across
+worker processes, so that decoding and post-processing the records is not
+held back by the GIL.
+
+Each shard is one time window of one symbol. The workers fetch their shards
+with a `BaseClient` of their own, all sharing one rate budget through a
+`FileTokenBucket`, and the results are streamed back in order.
+"""
+import collections
+import concurrent.futures
+import datetime
+import heapq
+import itertools
+import os
+import tempfile
+
+from .client import BaseClient
+from .utils.pagination import record_timestamp, resolve_time_range, split_time_range
+from .utils.rate_limiters import FileTokenBucket
+from .utils.window_store import WindowStore
+
+# One time window of one symbol
+Shard = collections.namedtuple("Shard", ["symbol", "start", "end"])
+
+# The records of a shard
+ShardResult = collections.namedtuple("ShardResult", ["symbol", "start", "end", "records"])
+
+# The client of the current worker process
+_worker_client = None
+
+
+def _init_worker(client_class, client_kwargs, window_store_kwargs):
+    global _worker_client
+    if window_store_kwargs is not None:
+        # Each worker opens its own connection to the database
+        client_kwargs = dict(client_kwargs, window_store=WindowStore(**window_store_kwargs))
+    _worker_client = client_class(**client_kwargs)
+
+
+def _fetch_shard(shard, request_kwargs, symbol_key, transform):
+    params = dict(request_kwargs.get("params") or {})
+    if shard.symbol is not None:
+        params[symbol_key] = shard.symbol
+    records = _worker_client._fetch_time_window((shard.start, shard.end), **{**request_kwargs, "params": params})
+    if transform is not None:
+        records = transform(records)
+    return ShardResult(shard.symbol, shard.start, shard.end, records)
+
+
+class Backfill:
+    def __init__(self, base_url=None, endpoint=None, symbols=None, t1=None, t2=None, params=None, kind="get", window_delta=None, limit=1000, time_key=0, symbol_key="symbol", start_key="startTime", end_key="endTime", limit_key="limit", response_kind=None, schema=None, priority=None, transform=None, order="symbol", processes=None, max_pending=None, rate_limiter=None, max_requests_per_min=1200, window_store=None, client_class=BaseClient, client_kwargs=None):
+        """Fetch the records of a time range for many symbols, with a pool of
+        worker processes. Iterate over it to run it.
+
+        The time range is split into windows the same way as
+        `BaseClient._time_range_batched_request()`, and each window of each
+        symbol is a shard, fetched (following pages as needed) and then
+        passed through `transform` by one of the workers. At most
+        `max_pending` shards are in flight or waiting to be yielded at a
+        time, so memory use stays bounded however long the range is.
+
+        All the workers share `rate_limiter`, which must work across
+        processes, eg a `FileTokenBucket`. Give other programs on the same
+        host a `FileTokenBucket` with the same path to share the budget with
+        them too.
+
+        Args:
+            base_url (str): The base url of the API.
+            endpoint (str): The endpoint to query, eg "/api/v3/klines".
+            symbols (list of str): The symbols to fetch, each sent as the
+                `symbol_key` parameter. `None` for a single shard per window,
+                without a symbol.
+            t1: Start of the time range. A timestamp in milliseconds, a
+                datetime, or a datetime string.
+            t2: End of the time range. Same formats as `t1`.
+            params (dict): Other parameters to send with each request.
+            kind (str): The kind of request, eg "get".
+            window_delta (datetime.timedelta): Size of each window. Defaults to
+                90 days.
+            limit (int): The maximum number of records the API returns per
+                request.
+            time_key: How to get the timestamp (in milliseconds) out of a
+                record, eg `0` for klines.
+            symbol_key (str): Name of the parameter for the symbol.
+            start_key (str): Name of the parameter for the start of a window.
+            end_key (str): Name of the parameter for the end of a window.
+            limit_key (str): Name of the parameter for the limit.
+            response_kind (str): The kind of response of each request, eg
+                "columnar" to decode the records in the workers.
+            schema (Schema): The schema of the records, for the "columnar" and
+                "numpy" response kinds.
+            priority (str): The priority class of the requests, if the
+                `rate_limiter` is a `PriorityScheduler`.
+            transform (callable): `func(records)` run by the workers on the
+                records of each shard, whose return value is yielded instead.
+                It must be picklable, ie defined at the top level of a module.
+            order (str): The order of the shards:
+                - "symbol": All the windows of the first symbol, then all the
+                    windows of the second symbol, etc.
+                - "time": All the symbols of the first window, then all the
+                    symbols of the second window, etc. `iter_records()` then
+                    merges the records of the symbols in time order.
+            processes (int): The number of worker processes. Defaults to the
+                number of CPUs.
+            max_pending (int): The maximum number of shards in flight or
+                waiting to be yielded. Defaults to 4 per process.
+            rate_limiter (BaseRateLimiter): The rate limiter shared by all the
+                workers. Defaults to a `FileTokenBucket` in a temporary file,
+                allowing `max_requests_per_min`, which is removed once the
+                iteration is over.
+            max_requests_per_min (int): The budget of the default
+                `rate_limiter`.
+            window_store (str or WindowStore): The path of a `WindowStore`
+                database (or a `WindowStore`, whose path and settings are
+                used), to only fetch the windows that are not already stored.
+                Each worker opens the database itself, since a connection
+                cannot be shared between processes.
+            client_class (type): The class of the clients of the workers, eg a
+                subclass of `BaseClient` for a specific API.
+            client_kwargs (dict): Other arguments of the clients of the
+                workers (eg `headers`, `retry_policy`).
+
+        Example:
+            >>> backfill = Backfill(
+            ...     "https://api.binance.com",
+            ...     endpoint="/api/v3/klines",
+            ...     symbols=["BTCUSDT", "ETHUSDT"],
+            ...     params=dict(interval="1m"),
+            ...     t1="2021-01-01 00:00:00 UTC",
+            ...     t2="2022-01-01 00:00:00 UTC",
+            ...     window_delta=datetime.timedelta(days=1),
+            ...     order="time",
+            ...     rate_limiter=FileTokenBucket.from_requests_per_min("/tmp/binance.bucket", 1200),
+            ... )
+            >>> for symbol, kline in backfill.iter_records():
+            ...     process(symbol, kline)
+        """
+        if order not in ("symbol", "time"):
+            raise ValueError(f"`order` must be one of ['symbol', 'time'], received {order}")
+        if window_delta is None:
+            window_delta = datetime.timedelta(days=90)
+        self.t1, self.t2 = resolve_time_range(t1=t1, t2=t2, window_delta=window_delta)
+        if self.t1 is None:
+            raise ValueError("A backfill requires at least one of `t1` and `t2`")
+        client_kwargs = dict(client_kwargs or {})
+        if window_store is None:
+            window_store = client_kwargs.pop("window_store", None)
+        if isinstance(window_store, WindowStore):
+            window_store = dict(path=window_store.path, max_bytes=window_store.max_bytes, max_age=window_store.max_age, settle_time=window_store.settle_time)
+        elif window_store is not None:
+            window_store = dict(path=window_store)
+        self.window_store_kwargs = window_store
+        self.windows = split_time_range(self.t1, self.t2, window_delta, align=window_store is not None)
+        self.symbols = [None] if symbols is None else list(symbols)
+        self.request_kwargs = dict(
+            endpoint=endpoint, params=params, kind=kind, window_delta=window_delta, limit=limit,
+            time_key=time_key, start_key=start_key, end_key=end_key, limit_key=limit_key,
+            response_kind=response_kind, schema=schema, priority=priority,
+        )
+        self.time_key = time_key
+        self.symbol_key = symbol_key
+        self.transform = transform
+        self.order = order
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.max_pending = 4 * self.processes if max_pending is None else max_pending
+
+        self.rate_limiter = rate_limiter
+        self.max_requests_per_min = max_requests_per_min
+        self.client_class = client_class
+        self.client_kwargs = dict(client_kwargs, base_url=base_url)
+
+    def shards(self):
+        """The shards, in the order their results are yielded."""
+        if self.order == "symbol":
+            return [Shard(symbol, start, end) for symbol in self.symbols for start, end in self.windows]
+        return [Shard(symbol, start, end) for start, end in self.windows for symbol in self.symbols]
+
+    def __iter__(self):
+        """Generator of the `ShardResult` of each shard, in the order of
+        `shards()`. Results that complete early wait for the ones before them.
+        """
+        shards = iter(self.shards())
+        rate_limiter = self.rate_limiter
+        limiter_path = None
+        if rate_limiter is None:
+            fd, limiter_path = tempfile.mkstemp(prefix="sosi_api_", suffix=".bucket")
+            os.close(fd)
+            rate_limiter = FileTokenBucket.from_requests_per_min(limiter_path, self.max_requests_per_min)
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.processes,
+            initializer=_init_worker,
+            initargs=(self.client_class, dict(self.client_kwargs, rate_limiter=rate_limiter), self.window_store_kwargs),
+        )
+        pending = collections.deque()
+
+        def submit(shard):
+            pending.append(executor.submit(_fetch_shard, shard, self.request_kwargs, self.symbol_key, self.transform))
+
+        try:
+            for shard in itertools.islice(shards, self.max_pending):
+                submit(shard)
+            while pending:
+                result = pending.popleft().result()
+                # Keep the workers busy while the caller processes the result
+                shard = next(shards, None)
+                if shard is not None:
+                    submit(shard)
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            if limiter_path is not None:
+                rate_limiter.close()
+                os.remove(limiter_path)
+
+    def iter_records(self):
+        """Generator of `(symbol, record)` for every record, in the order of
+        the shards. With `order="time"`, the records of all the symbols are
+        merged in order of time (then in the order of `symbols`).
+        """
+        if self.order == "symbol":
+            for result in self:
+                for record in result.records:
+                    yield result.symbol, record
+            return
+
+        def keyed_records(i, result):
+            for j, record in enumerate(result.records):
+                yield record_timestamp(record, self.time_key), i, j, result.symbol, record
+
+        for _, results in itertools.groupby(self, key=lambda result: result.start):
+            streams = [keyed_records(i, result) for i, result in enumerate(results)]
+            for _, _, _, symbol, record in heapq.merge(*streams):
+                yield symbol, record
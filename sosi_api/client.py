@@ -54,28 +54,51 @@ When the order count exceeds the limit, you will receive a 429 error without the
 Rejected/unsuccessful orders are not guaranteed to have X-MBX-ORDER-COUNT-** headers in the response.
 The order rate limit is counted against each account.
 """
+import collections
+import concurrent.futures
 import copy
-# import datetime
-# import time
+import datetime
+import functools
+import json
+import logging
+import threading
+import time
+import urllib.parse
+import warnings
 
 # import decouple
 import requests
 
-# from .utils.dt import DATETIME_FORMAT, convert_timearg_as_datetime
+from .utils.cache import make_request_key
+from .utils.columnar import concat_pages, is_columnar
+from .utils.json_decoders import DecodeError, get_json_loads, iter_json_array
+from .transports import RequestsTransport
+from .utils.metrics import Metrics, pop_connect_time, record_response
+from .utils.pagination import prefetch_iter, record_timestamp, resolve_time_range, split_time_range
+from .utils.rate_limiters import SlidingWindowLimiter
+from .utils.retry import IDEMPOTENT_METHODS, CircuitBreaker, RetryPolicy
+from .utils.singleflight import SingleFlight
 from .utils.status_handlers import handle_too_many_requests, DEFAULT_STATUS_HANDLERS
 
 # env = decouple.AutoConfig(search_path="./.env")
-# from .utils.signatures import sign_params, sign_message
+
+logger = logging.getLogger(__name__)
 
 
 class BaseClient:
-    def __init__(self, base_url=None, headers=None, max_requests_per_min=60, response_kind="json", status_handlers=None):
+    def __init__(self, base_url=None, headers=None, max_requests_per_min=60, response_kind="json", status_handlers=None, pool_connections=10, pool_maxsize=10, pool_block=False, timeout=None, rate_limiter=None, endpoint_weights=None, retry_policy=None, circuit_breaker=None, cache=None, window_store=None, coalesce_requests=False, json_decoder=None, signer=None, clock=None, metrics=None, transport=None, endpoint_priorities=None):
         """
         Args:
             base_url (str): The base url of the API.
             headers (dict): The headers to be sent with each request.
             max_requests_per_min (int): The maximum number of requests per minute.
+                This is enforced by a sliding window rate limiter, which allows
+                the whole budget to be used in bursts, but never more than
+                `max_requests_per_min` requests within any 60 second window.
+                Set to `None` to disable rate limiting. Ignored if a
+                `rate_limiter` is provided.
             response_kind (str): The kind of response to return. eg "json" or "text"
+                (or "raw", "columnar", "numpy", "stream", see `_extract_message()`)
             status_handlers (dict): 
                 A dictionary of response status codes and functions to handle them.
                 Each function must have the following argument structure:
@@ -85,19 +108,139 @@ class BaseClient:
                 you should leave this field blank, and use the 
                 `client.add_status_handlers()` method once the client is 
                 instantiated.
+            pool_connections (int): The number of distinct hosts to keep
+                connection pools for.
+            pool_maxsize (int): The maximum number of keep-alive connections
+                to keep open per host. Set this to at least the number of
+                threads that will be making requests with this client.
+            pool_block (bool): If `True`, then a thread will wait for a free
+                connection once `pool_maxsize` connections to a host are in
+                use, rather than opening a new throwaway connection.
+                The `pool_*` arguments are ignored if a `transport` is given.
+            timeout (float or tuple): Timeout in seconds applied to every
+                request. Either a single value, or a `(connect, read)` tuple.
+                Defaults to `None`, which waits forever.
+            rate_limiter (BaseRateLimiter): A rate limiter from
+                `sosi_api.utils.rate_limiters` to use instead of the one
+                created from `max_requests_per_min`. Pass the same rate limiter
+                instance to several clients to make them share one budget (eg
+                when they use the same API key or IP address).
+            endpoint_weights (dict): The rate limit weight of each endpoint,
+                keyed by endpoint (eg `{"/api/v3/exchangeInfo": 10}`). Each
+                request takes as many tokens from the rate limiter as the
+                weight of its endpoint. Endpoints that are not listed have a
+                weight of 1.
+            retry_policy (RetryPolicy): How to retry requests that fail with a
+                retryable status (eg 429, 418, 5XX) or a connection error. Pass
+                `True` to use the default `RetryPolicy()`. Defaults to `None`,
+                which never retries. Once the retries are used up, the response
+                goes through the status handlers as usual.
+            circuit_breaker (CircuitBreaker): Stops sending requests to a host
+                after repeated failures, raising a `CircuitOpenError` instead,
+                until the host had time to recover. Pass `True` to use the
+                default `CircuitBreaker()`. Defaults to `None`.
+            cache (ResponseCache): An in-memory cache for the messages of GET
+                responses, from `sosi_api.utils.cache`. Only the endpoints
+                given a time to live by the cache are cached. Defaults to
+                `None`, which does not cache anything.
+            window_store (WindowStore): A persistent store of the records of
+                closed time windows, from `sosi_api.utils.window_store`. Used
+                by time-ranged requests (`_time_range_batched_request()` and
+                `iter_pages()`) to only fetch the windows that are not already
+                stored. The time range is then split into windows starting on
+                multiples of `window_delta` since the epoch, so that the
+                stored windows are found again when `t1` shifts. Defaults to
+                `None`.
+            coalesce_requests (bool): If `True`, then when several threads make
+                the same idempotent request (same method, url, url parameters
+                and headers) at the same time, only one of them is sent, and
+                the others wait for it and get a copy of its result. The
+                number of requests saved is counted by
+                `client.singleflight.deduplicated`.
+            json_decoder (str or callable): The JSON library used to decode
+                "json" responses: "orjson", "ujson", "json", or a `loads()`
+                function. Defaults to the fastest library installed.
+            signer (Signer): A `sosi_api.utils.signatures.Signer` used to sign
+                the requests made with `signed=True`.
+            clock (ClockOffsetTracker): A `sosi_api.utils.clock.ClockOffsetTracker`
+                that estimates the offset of the server's clock, which is
+                used to timestamp signed requests.
+            metrics (RequestHooks): Hooks called with the duration of each
+                phase of every request, and with counters of events, eg a
+                `sosi_api.utils.metrics.Metrics` (or `True` to create one).
+                Defaults to `None`, for no instrumentation.
+            transport (BaseTransport): How the requests are sent, eg a
+                `Urllib3Transport` or `HTTP2Transport` from
+                `sosi_api.transports`. Defaults to a `RequestsTransport` (a
+                `requests.Session`).
+            endpoint_priorities (dict): The priority class of each endpoint,
+                keyed by endpoint (eg `{"/api/v3/order": "critical"}`), for a
+                `rate_limiter` that is a
+                `sosi_api.utils.scheduler.PriorityScheduler`. Endpoints that
+                are not listed get the scheduler's default priority.
+
+        Note:
+            The client keeps its connections open between requests. Call
+            `client.close()` when you are done with it, or use it as a
+            context manager:
+
+                >>> with BaseClient("http://example.com") as client:
+                ...     client.request(endpoint="/json")
         """
         self.base_url = "" if base_url is None else base_url
-        self.request_interval = 1.0 / (max_requests_per_min / 60.0) # time to wait between requests
+        if rate_limiter is not None:
+            self.rate_limiter = rate_limiter
+        elif max_requests_per_min is not None:
+            self.rate_limiter = SlidingWindowLimiter(max_tokens=max_requests_per_min, period=60.0)
+        else:
+            self.rate_limiter = None
+        self.endpoint_weights = {} if endpoint_weights is None else dict(endpoint_weights)
+        self.endpoint_priorities = {} if endpoint_priorities is None else dict(endpoint_priorities)
+        self.retry_policy = RetryPolicy() if retry_policy is True else retry_policy
+        self.circuit_breaker = CircuitBreaker() if circuit_breaker is True else circuit_breaker
+        self.cache = cache
+        self.window_store = window_store
+        self.singleflight = SingleFlight() if coalesce_requests else None
+        self.request_interval = 0.0 if max_requests_per_min is None else 1.0 / (max_requests_per_min / 60.0) # time to wait between requests
         if headers is None:
             self.headers = {}
         else:
             self.headers = copy.deepcopy(headers)
         self.response_kind = response_kind
+        self.json_loads = get_json_loads(json_decoder)
+        self.signer = signer
+        self.clock = clock
+        self._clock_lock = threading.Lock()
+        self.metrics = Metrics() if metrics is True else metrics
+        if (self.metrics is not None) and (clock is not None):
+            self.metrics.add_gauge("clock_offset_ms", lambda: clock.offset_ms if clock.samples else None)
+            self.metrics.add_gauge("clock_error_ms", lambda: clock.error_ms)
+        self.timeout = timeout
+        if transport is None:
+            transport = RequestsTransport(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.transport = transport
 
         self._status_handlers = DEFAULT_STATUS_HANDLERS
         if status_handlers is not None:
             self.add_status_handlers(status_handlers)
 
+    @property
+    def session(self):
+        """The `requests.Session` of the default transport (`None` for other
+        transports).
+        """
+        return getattr(self.transport, "session", None)
+
+    def close(self):
+        """Close all the open connections held by this client."""
+        self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def add_status_handlers(self, status_handlers):
         """Add aditional response status handler functions to handle different
         kinds of response errors.
@@ -140,20 +283,41 @@ class BaseClient:
         """
         self._status_handlers = {**self._status_handlers, **status_handlers}
 
-    def request(self, url=None, endpoint=None, params=None, body_params=None, url_params=None, headers=None, kind="get", response_kind=None):
+    def request(self, url=None, endpoint=None, params=None, body_params=None, url_params=None, headers=None, kind="get", response_kind=None, weight=None, schema=None, signed=False, priority=None):
         """Args:
             body_params: parameters to pass as part of the body.
+            weight: the rate limit weight of this request. Defaults to the
+                weight of the endpoint given in `endpoint_weights`, or 1.
+            schema: a `sosi_api.utils.columnar.Schema` describing the fields
+                of each record, required by the "columnar" and "numpy"
+                response kinds.
+            signed: whether to sign the request with the client's `signer`.
+                The url parameters are sent in the query string, along with
+                the timestamp and signature, which are renewed on each retry.
+                Signed requests cannot have `body_params`, which would not be
+                covered by the signature, and are never cached or coalesced.
+            priority: the priority class of this request (eg "critical" or
+                "bulk"), if the client's `rate_limiter` is a
+                `PriorityScheduler`. Defaults to the priority of the endpoint
+                given in `endpoint_priorities`, or the scheduler's default.
         """
         if params is not None:
-            print(f"WARNING: `params` is deprecated, use `body_params` or url_params instead")
+            warnings.warn("`params` is deprecated, use `body_params` or `url_params` instead", DeprecationWarning, stacklevel=2)
             if kind.lower() == "get":
                 url_params = params
             elif kind.lower() in ["post", "put", "delete"]:
                 body_params = params
 
-        return self._request(url=url, endpoint=endpoint, body_params=body_params, url_params=url_params, headers=headers, kind=kind, response_kind=response_kind)
+        if self.metrics is None:
+            return self._request(url=url, endpoint=endpoint, body_params=body_params, url_params=url_params, headers=headers, kind=kind, response_kind=response_kind, weight=weight, schema=schema, signed=signed, priority=priority)
+        start = time.perf_counter()
+        try:
+            return self._request(url=url, endpoint=endpoint, body_params=body_params, url_params=url_params, headers=headers, kind=kind, response_kind=response_kind, weight=weight, schema=schema, signed=signed, priority=priority)
+        finally:
+            full_url = (self.base_url + str(endpoint)) if url is None else url
+            self.metrics.observe("total", urllib.parse.urlsplit(full_url).path, time.perf_counter() - start)
 
-    def _request(self, url=None, endpoint=None, body_params=None, url_params=None, headers=None, kind="get", response_kind=None):
+    def _request(self, url=None, endpoint=None, body_params=None, url_params=None, headers=None, kind="get", response_kind=None, weight=None, schema=None, signed=False, priority=None):
         if (url is None) and (endpoint is None):
             raise ValueError("Either `url` or `endpoint` must be provided")
         if url is None:
@@ -164,44 +328,258 @@ class BaseClient:
 
         if headers is None:
             headers = {}
-        headers = {**self.headers, **headers}
+        if signed:
+            if self.signer is None:
+                raise ValueError("Signed requests require the client to have a `signer`")
+            if body_params:
+                # Only the query string is signed
+                raise ValueError("Signed requests must send their parameters as `url_params`, not `body_params`")
+            headers = {**self.headers, **self.signer.headers, **headers}
+        else:
+            headers = {**self.headers, **headers}
 
-        if kind.lower() == "get":
-            response = requests.get(url, params=url_params, json=body_params, headers=headers)
-        elif kind.lower() == "post":
-            response =  requests.post(url, params=url_params, json=body_params, headers=headers)
-        return self._process_response(response, response_kind=response_kind)
-    
-    def _extract_message(self, response, response_kind=None):
+        if weight is None:
+            weight = self.endpoint_weights.get(endpoint, 1)
+        if priority is None:
+            priority = self.endpoint_priorities.get(endpoint)
+        response_kind = self.response_kind if response_kind is None else response_kind
+        return self._perform(url=url, endpoint=endpoint, method=kind.upper(), body_params=body_params, url_params=url_params, headers=headers, response_kind=response_kind.lower(), weight=weight, schema=schema, signed=signed, priority=priority)
+
+    def _perform(self, url, endpoint, method, body_params, url_params, headers, response_kind, weight=1, schema=None, signed=False, priority=None, split_url=None):
+        """Make a request whose arguments have already been resolved: the
+        full `url`, the `method` in upper case, the `response_kind` in lower
+        case, and the `headers` merged with the client's. Goes through the
+        cache and request coalescing, then sends the request. Used by
+        `_request()`, and directly by prepared endpoints (see
+        `sosi_api.endpoints`), which resolve their arguments only once.
+
+        Args:
+            split_url: `urllib.parse.urlsplit(url)`, if it is already known.
+        """
+        reusable = (not signed) and (response_kind not in ("raw", "stream"))
+
+        # CHECK THE CACHE
+        cache_key = None
+        cache_entry = None
+        stream = response_kind == "stream"
+        if (self.cache is not None) and (method == "GET") and reusable:
+            ttl = self.cache.ttl_for(endpoint=endpoint, url=url)
+            if ttl > 0:
+                cache_key = self.cache.key(method, url, url_params=url_params, headers=headers) + (response_kind, schema)
+                cache_entry = self.cache.get(cache_key)
+                if cache_entry is not None:
+                    if cache_entry.fresh:
+                        self.cache.record_hit()
+                        if self.metrics is not None:
+                            self.metrics.increment("cache_hits", urllib.parse.urlsplit(url).path)
+                        return copy.deepcopy(cache_entry.msg)
+                    headers = {**headers, **cache_entry.validation_headers()}
+
+        def fetch():
+            response = self._send_with_retries(url=url, body_params=body_params, url_params=url_params, headers=headers, kind=method, weight=weight, stream=stream, signed=signed, priority=priority, split_url=split_url)
+            if cache_key is None:
+                return self._process_response(response, response_kind=response_kind, schema=schema)
+            if (response.status_code == 304) and (cache_entry is not None):
+                self.cache.refresh(cache_key, ttl)
+                if self.metrics is not None:
+                    self.metrics.increment("cache_revalidations", urllib.parse.urlsplit(url).path)
+                return copy.deepcopy(cache_entry.msg)
+            self.cache.record_miss()
+            if self.metrics is not None:
+                self.metrics.increment("cache_misses", urllib.parse.urlsplit(url).path)
+            msg = self._process_response(response, response_kind=response_kind, schema=schema)
+            if response.ok:
+                self.cache.set(cache_key, copy.deepcopy(msg), ttl, etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+            return msg
+
+        # COALESCE IDENTICAL REQUESTS THAT ARE ALREADY IN FLIGHT
+        if (self.singleflight is not None) and (method in IDEMPOTENT_METHODS) and reusable:
+            # The body is part of the key, so that eg two PUTs of different
+            # values are both sent
+            body_key = json.dumps(body_params, sort_keys=True, default=str) if body_params else None
+            flight_key = make_request_key(method, url, url_params=url_params, headers=headers, vary_headers=tuple(headers)) + (body_key, response_kind, schema)
+            return self.singleflight.do(flight_key, fetch)
+        return fetch()
+
+    def _send_with_retries(self, url, body_params=None, url_params=None, headers=None, kind="get", weight=1, stream=False, signed=False, priority=None, split_url=None):
+        """Send a request, retrying it according to the retry policy, and
+        return the final response object. Signed requests are signed right
+        before each attempt, so that their timestamp is fresh.
+        """
+        method = kind.upper()
+        if split_url is None:
+            split_url = urllib.parse.urlsplit(url)
+        host = split_url.netloc
+        metrics = self.metrics
+        attempt = 0
+        while True:
+            if signed and (self.clock is not None) and self.clock.needs_refresh():
+                with self._clock_lock:
+                    # Unless another thread has just refreshed it
+                    if self.clock.needs_refresh():
+                        self.sync_clock()
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_request(host)
+            queued_at = time.perf_counter()
+            if self.rate_limiter is not None:
+                try:
+                    self.rate_limiter.acquire(weight, priority=priority)
+                except BaseException:
+                    # eg a `BackpressureError`. The request was never sent
+                    if self.circuit_breaker is not None:
+                        self.circuit_breaker.release(host)
+                    raise
+            if metrics is not None:
+                metrics.observe("queue", split_url.path, time.perf_counter() - queued_at)
+                pop_connect_time()
+
+            try:
+                sent_at = time.perf_counter()
+                sent_ms = time.time() * 1000
+                if signed:
+                    timestamp = None if self.clock is None else self.clock.now_ms()
+                    response = self._send(url=self.signer.sign_url(url, url_params, timestamp=timestamp), body_params=body_params, headers=headers, kind=kind, stream=stream)
+                else:
+                    response = self._send(url=url, body_params=body_params, url_params=url_params, headers=headers, kind=kind, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure(host)
+                if metrics is not None:
+                    metrics.increment("errors", split_url.path)
+                wait = None if self.retry_policy is None else self.retry_policy.get_wait(method, attempt, exception=e)
+                if wait is None:
+                    raise
+                logger.debug("Retrying %s %s in %.3fs after %r", method, url, wait, e)
+                if metrics is not None:
+                    metrics.increment("retries", split_url.path)
+                time.sleep(wait)
+                attempt += 1
+                continue
+            except requests.RequestException:
+                # Any other failure to get a response, eg a ChunkedEncodingError
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure(host)
+                if metrics is not None:
+                    metrics.increment("errors", split_url.path)
+                raise
+            except BaseException:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.release(host)
+                raise
+
+            if metrics is not None:
+                record_response(metrics, split_url.path, response, time.perf_counter() - sent_at, connect=pop_connect_time(), stream=stream)
+            if (self.clock is not None) and (self.clock.time_endpoint is None):
+                self.clock.add_date_header(response, sent_ms, time.time() * 1000)
+            if self.rate_limiter is not None:
+                self.rate_limiter.update(response)
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_response(host, response)
+            wait = None if (self.retry_policy is None or response.ok) else self.retry_policy.get_wait(method, attempt, response=response)
+            if wait is None:
+                return response
+            logger.debug("Retrying %s %s in %.3fs after a %s response", method, url, wait, response.status_code)
+            if metrics is not None:
+                metrics.increment("retries", split_url.path)
+            response.close()
+            time.sleep(wait)
+            attempt += 1
+
+    def sync_clock(self):
+        """Refresh the estimate of the server's clock offset, from the time
+        endpoint of the client's `clock`. Returns the offset in milliseconds.
+        """
+        if self.clock is None or self.clock.time_endpoint is None:
+            raise ValueError("Syncing the clock requires the client to have a `clock` with a `time_endpoint`")
+        endpoint = self.clock.time_endpoint
+        url = endpoint if "://" in endpoint else self.base_url + endpoint
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self.endpoint_weights.get(endpoint, 1), priority=self.endpoint_priorities.get(endpoint))
+        sent_ms = time.time() * 1000
+        response = self._send(url=url, headers=self.headers)
+        received_ms = time.time() * 1000
+        if self.rate_limiter is not None:
+            self.rate_limiter.update(response)
+        msg = self._process_response(response, response_kind="json")
+        self.clock.add_time_response(msg, sent_ms, received_ms)
+        return self.clock.offset_ms
+
+    def _send(self, url, body_params=None, url_params=None, headers=None, kind="get", stream=False):
+        """Send a single request, and return the response object. If `stream`
+        is `True`, the body is only downloaded as it is read.
+        """
+        return self.transport.send(kind.upper(), url, params=url_params, json=body_params, headers=headers, timeout=self.timeout, stream=stream)
+
+    def _extract_message(self, response, response_kind=None, schema=None):
         """Extract the contents of the response. This can be overrriden if you want a custom parsing
         of the message, or if you want to also include some metadata.
+
+        The "columnar" and "numpy" response kinds decode an array of records
+        (eg klines) into typed columns described by `schema`, returning a
+        `Columns` object or a NumPy structured array respectively.
+
+        The "stream" response kind returns a generator that parses and yields
+        each element of the top level JSON array as it is downloaded. If the
+        body turns out to be malformed part way through, a `DecodeError` is
+        yielded as the last item.
+
+        Error responses of these kinds are extracted as "json" instead. If the
+        body cannot be decoded, a `DecodeError` is returned.
         """
         response_kind = self.response_kind if response_kind is None else response_kind
+        response_kind = response_kind.lower()
+        if response_kind in ("columnar", "numpy") and schema is None:
+            raise ValueError(f"A `schema` is required for the '{response_kind}' response kind")
+        if response_kind in ("columnar", "numpy", "stream") and not response.ok:
+            response_kind = "json"
         try:
-            if response_kind.lower() == "raw":
+            if response_kind == "raw":
                 msg = response
-            elif response_kind.lower() == "json":
-                msg = response.json()
-            elif response_kind.lower() == "text":
+            elif response_kind == "json":
+                msg = self.json_loads(response.content)
+            elif response_kind == "text":
                 msg = response.text
+            elif response_kind == "columnar":
+                msg = schema.decode(self.json_loads(response.content))
+            elif response_kind == "numpy":
+                msg = schema.decode_numpy(self.json_loads(response.content))
+            elif response_kind == "stream":
+                msg = self._iter_stream(response)
             else:
                 msg = response
-        except:
-            print("Failed to extract the message, falling back to either text or response object"
-                  "itself")
+        except Exception as e:
             try:
-                msg = response.text
-            except:
-                msg = response
+                text = response.text
+            except Exception:
+                text = None
+            msg = DecodeError(response_kind, e, text=text, status_code=response.status_code)
+            logger.warning("Could not decode the response from %s as %s: %r", response.url, response_kind, e)
         return msg
 
-    def _process_response(self, response, response_kind=None):
+    def _iter_stream(self, response, chunk_size=64 * 1024):
+        """Generator of the elements of the top level JSON array of a response
+        that is still being downloaded, followed by a `DecodeError` if the
+        body is malformed.
+        """
+        try:
+            yield from iter_json_array(response.iter_content(chunk_size=chunk_size), encoding=response.encoding or "utf-8")
+        except ValueError as e:
+            # Also raised for bytes that are not valid in the encoding
+            logger.warning("Could not decode the response from %s as stream: %r", response.url, e)
+            yield DecodeError("stream", e, status_code=response.status_code)
+        finally:
+            response.close()
+
+    def _process_response(self, response, response_kind=None, schema=None):
         """Attempt to extract the response message from the response object if
         it was a succesful response, otherwise handle using one of the response
         status handlers.
         """
         response_kind = self.response_kind if response_kind is None else response_kind
-        msg = self._extract_message(response=response, response_kind=response_kind)
+        start = time.perf_counter()
+        msg = self._extract_message(response=response, response_kind=response_kind, schema=schema)
+        if self.metrics is not None:
+            self.metrics.observe("decode", urllib.parse.urlsplit(response.url).path, time.perf_counter() - start)
         if response.ok:
             return msg
         else:
@@ -210,69 +588,373 @@ class BaseClient:
             #       response_kind is "raw"
             status_code = response.status_code
             response_function = self._status_handlers.get(int(status_code))
-            if response_function is not None:
-                response_function(response=response, msg=msg)
-            elif response_function == "pass":
+            if response_function == "pass":
                 # Return as if nothing bad happened
                 return msg
+            elif response_function is not None:
+                start = time.perf_counter()
+                try:
+                    return response_function(response=response, msg=msg)
+                finally:
+                    if self.metrics is not None:
+                        self.metrics.observe("handle", urllib.parse.urlsplit(response.url).path, time.perf_counter() - start)
             else:
-                print(f"ERROR: with this response message {msg}")
+                logger.error("Unhandled %s response from %s: %s", status_code, response.url, msg)
                 response.raise_for_status()
 
-    def _time_range_batched_request(self, url, params=None, kind="get", t1=None, t2=None, window_delta=None, limit=1000):
-        raise NotImplementedError("This method is not implemented yet")
-        # """Process a query in batches"""
-        # no_timerange = False
-        # if params is None:
-        #     params = {}
-
-        # # PROCESS THE TIME RANGE
-        # if window_delta is None:
-        #     window_delta = datetime.timedelta(days=90)
-        # assert isinstance(window_delta, datetime.timedelta), f"`window_delta` should be a `datetime.timedelta`, received a {type(window_delta)}"
-        # if (t1 is None) and (t2 is None):
-        #     no_timerange = True
-        # elif t1 is None:
-        #     t2 = convert_timearg_as_datetime(t2)
-        #     t1 = t2 - window_delta
-        # elif t2 is None:
-        #     t1 = convert_timearg_as_datetime(t1)
-        #     t2 = t1 + window_delta
-        # else:
-        #     t1 = convert_timearg_as_datetime(t1)
-        #     t2 = convert_timearg_as_datetime(t2)
-
-        # responses = []
-        # def extend_responses(response):
-        #     if isinstance(response, list):
-        #         responses.extend(response)
-        #     else:
-        #         responses.append(response)
-
-        # _params = copy.deepcopy(params)
-        # if no_timerange:
-        #     response = self.request(url=url, params=_params, kind=kind, limit=limit)
-        #     extend_responses(response)
-        # else:
-        #     # BREAK TIME RANGE UP INTO 90 DAY BATCHES
-        #     t1s = []
-        #     t2s = []
-        #     _t1  = t1
-        #     while _t1 < t2:
-        #         _t2 = min(_t1 + window_delta, t2)
-        #         t1s.append(_t1)
-        #         t2s.append(_t2)
-        #         _t1 = _t2
-
-        #     # RUN QUERY IN BATCHES
-        #     for _t1, _t2 in zip(t1s, t2s):
-        #         print(f"BATCH: {_t1} to {_t2}")
-        #         _params["startTime"] = int(_t1.timestamp() * 1000)
-        #         _params["endTime"] = int(_t2.timestamp() * 1000)
-        #         response = self.request(url=url, params=_params, kind=kind, limit=limit)
-        #         extend_responses(response)
-        #         sleep_period = self.request_interval
-        #         time.sleep(sleep_period)
-
-        # return responses
+    def _params_request(self, url=None, endpoint=None, params=None, kind="get", **kwargs):
+        """Make a request, sending `params` as url parameters for GET requests
+        and as body parameters for any other kind of request.
+        """
+        if kind.lower() == "get":
+            return self.request(url=url, endpoint=endpoint, url_params=params, kind=kind, **kwargs)
+        return self.request(url=url, endpoint=endpoint, body_params=params, kind=kind, **kwargs)
+
+    def _iter_cursor_pages(self, url=None, endpoint=None, params=None, kind="get", limit=1000, limit_key="limit", cursor_key=None, cursor=None, next_cursor=None, response_kind=None, schema=None, priority=None):
+        """Generator of pages of results, following a cursor from one page to
+        the next. Stops once a page comes back with fewer than `limit` records,
+        or `next_cursor` returns `None`.
 
+        Args:
+            cursor_key (str): Name of the parameter to send the cursor as.
+            cursor: The cursor for the first page. `None` to not send one.
+            next_cursor (callable): `func(page, cursor)` that returns the
+                cursor for the page that comes after `page`.
+        """
+        params = {} if params is None else dict(params)
+        while True:
+            page_params = dict(params)
+            if cursor is not None:
+                page_params[cursor_key] = cursor
+            if limit is not None:
+                page_params[limit_key] = limit
+            page = self._params_request(url=url, endpoint=endpoint, params=page_params, kind=kind, response_kind=response_kind, schema=schema, priority=priority)
+            yield page
+            if not is_page(page) or (limit is None) or (len(page) < limit) or (len(page) == 0):
+                return
+            cursor = next_cursor(page, cursor)
+            if cursor is None:
+                return
+
+    def _iter_window_pages(self, url=None, endpoint=None, params=None, kind="get", start=None, end=None, limit=1000, time_key=0, start_key="startTime", end_key="endTime", limit_key="limit", response_kind=None, schema=None, priority=None):
+        """Generator of the pages of results within a single time window. If a
+        page comes back with `limit` records, then the next page is requested
+        starting just after the time of the last record, until the window is
+        exhausted.
+        """
+        def next_start(page, cursor):
+            cursor = record_timestamp(page[-1], time_key) + 1
+            return cursor if cursor <= end else None
+
+        params = {} if params is None else dict(params)
+        params[end_key] = end
+        return self._iter_cursor_pages(url=url, endpoint=endpoint, params=params, kind=kind, limit=limit, limit_key=limit_key, cursor_key=start_key, cursor=start, next_cursor=next_start, response_kind=response_kind, schema=schema, priority=priority)
+
+    def _iter_stored_window_pages(self, start=None, end=None, window_delta=None, **kwargs):
+        """Same as `_iter_window_pages()`, except that windows already in the
+        client's window store are read from it rather than fetched, and closed
+        windows that are fetched get added to it.
+
+        Windows are stored whole, starting on multiples of `window_delta`
+        since the epoch, so that they are found again when the start of the
+        time range shifts (eg for a rolling range). The records of a shorter
+        window are read out of the whole window containing it.
+        """
+        store = self.window_store
+        response_kind = kwargs.get("response_kind")
+        response_kind = self.response_kind if response_kind is None else response_kind
+        window_start, window_end = start, end
+        if window_delta is not None:
+            delta = int(window_delta.total_seconds() * 1000)
+            window_start = start - start % delta
+            window_end = window_start + delta - 1
+        if (store is None) or (response_kind.lower() != "json") or (end > window_end) or not store.is_closed(window_end):
+            yield from self._iter_window_pages(start=start, end=end, **kwargs)
+            return
+
+        url = kwargs.get("url")
+        url = self.base_url + str(kwargs.get("endpoint")) if url is None else url
+        request = store.request_key(kwargs.get("kind", "get"), url, kwargs.get("params"))
+        whole = (start == window_start) and (end == window_end)
+        records = store.get(request, window_start, window_end)
+        if records is None:
+            records = []
+            storable = True
+            for page in self._iter_window_pages(start=window_start, end=window_end, **kwargs):
+                storable = storable and isinstance(page, list)
+                if storable:
+                    records.extend(page)
+                if whole:
+                    yield page
+            if not storable:
+                if not whole:
+                    yield from self._iter_window_pages(start=start, end=end, **kwargs)
+                return
+            store.put(request, window_start, window_end, records)
+            if whole:
+                return
+        if not whole:
+            time_key = kwargs.get("time_key", 0)
+            records = [record for record in records if start <= record_timestamp(record, time_key) <= end]
+        yield records
+
+    def _fetch_time_window(self, window, **kwargs):
+        start, end = window
+        return combine_pages(self._iter_stored_window_pages(start=start, end=end, **kwargs))
+
+    def _time_range_batched_request(self, url=None, params=None, kind="get", t1=None, t2=None, window_delta=None, limit=1000, endpoint=None, max_workers=4, time_key=0, start_key="startTime", end_key="endTime", limit_key="limit", response_kind=None, schema=None, priority=None):
+        """Process a query over a time range in batches.
+
+        The time range `[t1, t2]` is split up into windows of `window_delta`,
+        which are fetched concurrently by a pool of `max_workers` threads. All
+        requests still go through the client's rate limiter, so the workers
+        share the client's rate budget. Whenever a request returns `limit`
+        records, the rest of its window is fetched in subsequent pages.
+
+        Args:
+            url (str): The full url to query. Either this or `endpoint` must be
+                provided.
+            params (dict): The parameters to send with each request (as url
+                parameters for GET requests, body parameters otherwise).
+            kind (str): The kind of request, eg "get".
+            t1: Start of the time range. A timestamp in milliseconds, a
+                datetime, or a datetime string.
+            t2: End of the time range. Same formats as `t1`. If only one of
+                `t1` and `t2` is given, the other is set `window_delta` away.
+                If neither is given, a single request is made.
+            window_delta (datetime.timedelta): Size of each window. Defaults to
+                90 days.
+            limit (int): The maximum number of records the API returns per
+                request. Sent as the `limit_key` parameter.
+            endpoint (str): The endpoint to query, appended to the base url.
+            max_workers (int): The maximum number of windows fetched at the
+                same time.
+            time_key: How to get the timestamp (in milliseconds) out of a
+                record, used to request the next page. Either an index (eg `0`
+                for klines), a dict key (eg "time" for trades), or a function.
+            start_key (str): Name of the parameter for the start of a window.
+            end_key (str): Name of the parameter for the end of a window.
+            limit_key (str): Name of the parameter for the limit.
+            response_kind (str): The kind of response of each request. With
+                the "columnar" and "numpy" kinds, the pages are concatenated
+                into a single `Columns` object or NumPy array.
+            schema (Schema): The schema of the records, for the "columnar" and
+                "numpy" response kinds.
+            priority (str): The priority class of each request, eg "bulk".
+
+        Returns:
+            list: The records from all the windows, in ascending time order.
+        """
+        if window_delta is None:
+            window_delta = datetime.timedelta(days=90)
+        t1, t2 = resolve_time_range(t1=t1, t2=t2, window_delta=window_delta)
+
+        if t1 is None:
+            params = {} if params is None else dict(params)
+            if limit is not None:
+                params[limit_key] = limit
+            return combine_pages([self._params_request(url=url, endpoint=endpoint, params=params, kind=kind, response_kind=response_kind, schema=schema, priority=priority)])
+
+        windows = split_time_range(t1, t2, window_delta, align=self.window_store is not None)
+        fetch_window = functools.partial(
+            self._fetch_time_window,
+            url=url, endpoint=endpoint, params=params, kind=kind, window_delta=window_delta, limit=limit,
+            time_key=time_key, start_key=start_key, end_key=end_key, limit_key=limit_key,
+            response_kind=response_kind, schema=schema, priority=priority,
+        )
+        max_workers = max(1, min(max_workers, len(windows)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # `map()` yields the results in the same order as the windows
+            return combine_pages(executor.map(fetch_window, windows))
+
+
+    def iter_pages(self, url=None, endpoint=None, params=None, kind="get", pagination="time", limit=1000, t1=None, t2=None, window_delta=None, cursor=None, cursor_key=None, record_key=None, end_key="endTime", limit_key="limit", prefetch=True, response_kind=None, schema=None, priority=None):
+        """Generator that yields each page of results of a paginated endpoint
+        as soon as it arrives, rather than collecting all of them in memory.
+
+        While the caller is processing one page, the next page is already being
+        fetched in a background thread (unless `prefetch=False`). At most two
+        pages are held in memory at a time, however large the range is.
+
+        Args:
+            url (str): The full url to query. Either this or `endpoint` must be
+                provided.
+            endpoint (str): The endpoint to query, appended to the base url.
+            params (dict): The parameters to send with each request (as url
+                parameters for GET requests, body parameters otherwise).
+            kind (str): The kind of request, eg "get".
+            pagination (str): How to get from one page to the next:
+                - "time": Send the time just after the last record as the
+                    start of the next page (eg klines, aggTrades).
+                - "id": Send the id just after the last record as the id to
+                    start the next page from (eg historicalTrades).
+                - "offset": Send the number of records received so far as the
+                    offset of the next page.
+            limit (int): The maximum number of records the API returns per
+                page. Sent as the `limit_key` parameter. Pagination stops once
+                a page comes back with fewer records.
+            t1: Start of the time range, for "time" pagination. A timestamp in
+                milliseconds, a datetime, or a datetime string.
+            t2: End of the time range, for "time" pagination. If either `t1`
+                or `t2` is given, then the range is split into windows of
+                `window_delta` the same way as `_time_range_batched_request()`.
+            window_delta (datetime.timedelta): Size of each time window.
+                Defaults to 90 days.
+            cursor: The cursor to start from, for "id" and "offset" pagination.
+            cursor_key (str): Name of the parameter the cursor is sent as.
+                Defaults to "startTime", "fromId" or "offset" depending on
+                `pagination`.
+            record_key: How to get the cursor value out of a record. Either an
+                index, a dict key, or a function. Defaults to `0` for "time"
+                pagination (eg the open time of a kline), and "id" for "id"
+                pagination.
+            end_key (str): Name of the parameter for the end of a time window.
+            limit_key (str): Name of the parameter for the limit.
+            prefetch (bool): Whether to fetch the next page in the background.
+            response_kind (str): The kind of response of each page.
+            schema (Schema): The schema of the records, for the "columnar" and
+                "numpy" response kinds.
+            priority (str): The priority class of each request, eg "bulk".
+
+        Example:
+            >>> for page in client.iter_pages(endpoint="/api/v3/klines", params=dict(symbol="BTCUSDT", interval="1m"), t1="2021-01-01 00:00:00 UTC", t2="2021-12-31 00:00:00 UTC"):
+            ...     process(page)
+        """
+        if pagination == "time":
+            cursor_key = "startTime" if cursor_key is None else cursor_key
+            record_key = 0 if record_key is None else record_key
+        elif pagination == "id":
+            cursor_key = "fromId" if cursor_key is None else cursor_key
+            record_key = "id" if record_key is None else record_key
+        elif pagination == "offset":
+            cursor_key = "offset" if cursor_key is None else cursor_key
+            cursor = 0 if cursor is None else cursor
+        else:
+            legal_paginations = ["time", "id", "offset"]
+            raise ValueError(f"`pagination` must be one of {legal_paginations}, received {pagination}")
+
+        request_kwargs = dict(url=url, endpoint=endpoint, params=params, kind=kind, limit=limit, limit_key=limit_key, response_kind=response_kind, schema=schema, priority=priority)
+        if pagination == "time" and ((t1 is not None) or (t2 is not None)):
+            if window_delta is None:
+                window_delta = datetime.timedelta(days=90)
+            t1, t2 = resolve_time_range(t1=t1, t2=t2, window_delta=window_delta)
+            pages = (
+                page
+                for start, end in split_time_range(t1, t2, window_delta, align=self.window_store is not None)
+                for page in self._iter_stored_window_pages(start=start, end=end, window_delta=window_delta, time_key=record_key, start_key=cursor_key, end_key=end_key, **request_kwargs)
+            )
+        else:
+            if pagination == "offset":
+                next_cursor = lambda page, cursor: cursor + len(page)
+            else:
+                next_cursor = lambda page, cursor: record_timestamp(page[-1], record_key) + 1
+            pages = self._iter_cursor_pages(cursor_key=cursor_key, cursor=cursor, next_cursor=next_cursor, **request_kwargs)
+
+        if prefetch:
+            pages = prefetch_iter(pages)
+        yield from pages
+
+    def iter_records(self, *args, **kwargs):
+        """Generator that yields the individual records from each page of
+        results, as the pages arrive. Takes the same arguments as
+        `iter_pages()`.
+        """
+        for page in self.iter_pages(*args, **kwargs):
+            if is_page(page):
+                yield from page
+            else:
+                yield page
+
+
+    def _request_spec(self, index, spec):
+        """Make the request described by `spec`, capturing any exception."""
+        try:
+            return RequestResult(index=index, spec=spec, result=self.request(**spec), error=None)
+        except Exception as e:
+            return RequestResult(index=index, spec=spec, result=None, error=e)
+
+    def request_many(self, specs, max_concurrency=8):
+        """Make many requests concurrently, and return their results in the
+        same order as `specs`.
+
+        The requests are made by a pool of `max_concurrency` threads, all
+        sharing the client's rate limiter. A request that fails (eg because a
+        status handler raised an exception) does not stop the other ones; its
+        exception is captured in the `error` of its result instead.
+
+        Args:
+            specs (list of dict): The keyword arguments of each request, as
+                they would be passed to `request()`. Eg:
+                    [dict(endpoint="/api/v3/ticker/price", url_params=dict(symbol="BTCUSDT")),
+                     dict(endpoint="/api/v3/order", body_params=dict(...), kind="post")]
+            max_concurrency (int): The maximum number of requests in flight at
+                the same time.
+
+        Returns:
+            list of RequestResult: With the `index` and `spec` of each request,
+            and either its `result`, or the `error` it raised.
+        """
+        results = [None] * len(specs)
+        for result in self.request_many_as_completed(specs, max_concurrency=max_concurrency):
+            results[result.index] = result
+        return results
+
+    def request_many_as_completed(self, specs, max_concurrency=8):
+        """Same as `request_many()`, but a generator that yields the result of
+        each request as soon as it completes, in order of completion. If the
+        generator is closed early (eg by a `break`), the requests that have
+        not started yet are not made.
+        """
+        specs = list(specs)
+        if len(specs) == 0:
+            return
+        max_workers = max(1, min(max_concurrency, len(specs)))
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        futures = []
+        try:
+            futures = [executor.submit(self._request_spec, index, spec) for index, spec in enumerate(specs)]
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+        finally:
+            # Only waits for the requests already in flight
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+
+class RequestResult(collections.namedtuple("RequestResult", ["index", "spec", "result", "error"])):
+    """The outcome of one of the requests made by `request_many()`."""
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def extend_records(records, response):
+    """Add the records in a response to the `records` list."""
+    if isinstance(response, list):
+        records.extend(response)
+    else:
+        records.append(response)
+
+
+def is_page(response):
+    """Whether a response is a page of records (as opposed to eg an object)."""
+    return isinstance(response, list) or is_columnar(response)
+
+
+def combine_pages(pages):
+    """Combine pages of records into one. Columnar pages are concatenated into
+    a single columnar page, any other pages into a list of records.
+    """
+    pages = list(pages)
+    if pages and all(is_columnar(page) for page in pages):
+        return concat_pages(pages)
+    records = []
+    for page in pages:
+        if is_columnar(page):
+            records.extend(page)
+        else:
+            extend_records(records, page)
+    return records
@@ -0,0 +1,160 @@
+"""
+Endpoints declared once, and resolved against a client once, so that each
+call only has to add what varies (eg the symbol).
+
+`BaseClient.request()` resolves all of its arguments on every call: it joins
+the base url and the endpoint, merges the headers, deep copies the
+parameters, and looks up the weight and priority of the endpoint. A
+`PreparedEndpoint` does all of that when it is created, and sends each call
+straight to the cache, coalescing and retry logic of the client.
+"""
+import time
+import urllib.parse
+
+
+class Endpoint:
+    def __init__(self, path, kind="get", params=None, headers=None, response_kind=None, weight=None, schema=None, signed=False, priority=None, params_in=None):
+        """Declaration of an endpoint of an API. Either declare it as an
+        attribute of a `BaseClient` subclass, where it becomes a
+        `PreparedEndpoint` of each instance the first time it is accessed, or
+        prepare it for a client with `bind()`.
+
+        Args:
+            path (str): The endpoint, appended to the base url of the client
+                (eg "/api/v3/klines"), or a full url.
+            kind (str): The HTTP method, eg "get" or "delete".
+            params (dict): Default parameters, sent with every call unless the
+                call overrides them.
+            headers (dict): Headers sent with every call, on top of the
+                client's headers.
+            response_kind (str): The kind of response, eg "columnar". Defaults
+                to the client's `response_kind`.
+            weight (float): The rate limit weight of each call. Defaults to the
+                weight of the endpoint in the client's `endpoint_weights`, or 1.
+            schema (Schema): The schema of the records, for the "columnar" and
+                "numpy" response kinds.
+            signed (bool): Whether to sign the calls with the client's
+                `signer`.
+            priority (str): The priority class of the calls. Defaults to the
+                priority in the client's `endpoint_priorities`.
+            params_in (str): Where to send the parameters: "url" (the query
+                string), or "body" (as json). Defaults to "url" for GET and
+                signed requests, and "body" otherwise. Signed requests can
+                only send them in the url.
+
+        Example:
+            >>> class Binance(BaseClient):
+            ...     klines = Endpoint("/api/v3/klines", params=dict(interval="1m", limit=1000), weight=2)
+            ...     order = Endpoint("/api/v3/order", kind="post", signed=True, priority="critical")
+            >>> client = Binance("https://api.binance.com", signer=signer)
+            >>> client.klines(symbol="BTCUSDT", startTime=1640995200000)
+            >>> client.order(symbol="BTCUSDT", side="BUY", type="MARKET", quantity="0.001")
+        """
+        if params_in not in (None, "url", "body"):
+            raise ValueError(f"`params_in` must be one of ['url', 'body'], received {params_in}")
+        self.path = path
+        self.kind = kind
+        self.params = {} if params is None else dict(params)
+        self.headers = {} if headers is None else dict(headers)
+        self.response_kind = response_kind
+        self.weight = weight
+        self.schema = schema
+        self.signed = signed
+        self.priority = priority
+        self.params_in = params_in
+        self.name = None
+
+    def __repr__(self):
+        return f"Endpoint({self.kind.upper()} {self.path})"
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, client, owner=None):
+        if client is None:
+            return self
+        prepared = self.bind(client)
+        # Store it on the instance, which takes precedence over this
+        # (non-data) descriptor, so that it is only prepared once
+        if self.name is not None:
+            client.__dict__[self.name] = prepared
+        return prepared
+
+    def bind(self, client):
+        """Prepare the endpoint for `client`. Prepare it again if the base url,
+        headers or signer of the client change.
+        """
+        return PreparedEndpoint(client, self)
+
+
+class PreparedEndpoint:
+    __slots__ = ("client", "endpoint", "url", "split_url", "method", "headers", "params", "params_in_url", "response_kind", "weight", "priority")
+
+    def __init__(self, client, endpoint):
+        """An `Endpoint` bound to a `BaseClient`, with all of its arguments
+        resolved. Call it with the parameters that vary from call to call.
+        """
+        if not hasattr(client, "_perform"):
+            raise TypeError(f"Prepared endpoints require a `BaseClient`, received a {type(client).__name__}")
+        path = endpoint.path
+        self.client = client
+        self.endpoint = endpoint
+        self.url = path if "://" in path else client.base_url + path
+        self.split_url = urllib.parse.urlsplit(self.url)
+        self.method = endpoint.kind.upper()
+
+        headers = dict(client.headers)
+        if endpoint.signed:
+            if client.signer is None:
+                raise ValueError("Signed endpoints require the client to have a `signer`")
+            headers.update(client.signer.headers)
+        headers.update(endpoint.headers)
+        self.headers = headers
+        self.params = endpoint.params
+
+        params_in = endpoint.params_in
+        if params_in is None:
+            params_in = "url" if (self.method == "GET" or endpoint.signed) else "body"
+        elif endpoint.signed and params_in == "body":
+            # Only the query string is signed
+            raise ValueError("Signed endpoints must send their parameters in the url")
+        self.params_in_url = params_in == "url"
+        response_kind = client.response_kind if endpoint.response_kind is None else endpoint.response_kind
+        self.response_kind = response_kind.lower()
+        self.weight = client.endpoint_weights.get(path, 1) if endpoint.weight is None else endpoint.weight
+        self.priority = client.endpoint_priorities.get(path) if endpoint.priority is None else endpoint.priority
+
+    def __repr__(self):
+        return f"<PreparedEndpoint {self.method} {self.url}>"
+
+    def __call__(self, params=None, headers=None, **kwargs):
+        """Make a request to the endpoint, and return its message.
+
+        Args:
+            params (dict): Parameters of this call, on top of the endpoint's
+                default `params`. Not copied, and never modified.
+            headers (dict): Headers of this call, on top of the prepared ones.
+            **kwargs: More parameters of this call, eg `symbol="BTCUSDT"`.
+        """
+        if params:
+            params = {**self.params, **params, **kwargs}
+        else:
+            params = {**self.params, **kwargs}
+        if headers:
+            headers = {**self.headers, **headers}
+        else:
+            headers = self.headers
+        if self.params_in_url:
+            url_params, body_params = params, {}
+        else:
+            url_params, body_params = {}, params
+
+        client = self.client
+        endpoint = self.endpoint
+        if client.metrics is None:
+            return client._perform(self.url, endpoint.path, self.method, body_params, url_params, headers, self.response_kind, self.weight, endpoint.schema, endpoint.signed, self.priority, self.split_url)
+        start = time.perf_counter()
+        try:
+            return client._perform(self.url, endpoint.path, self.method, body_params, url_params, headers, self.response_kind, self.weight, endpoint.schema, endpoint.signed, self.priority, self.split_url)
+        finally:
+            client.metrics.observe("total", self.split_url.path, time.perf_counter() - start)
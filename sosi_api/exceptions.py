@@ -2,3 +2,18 @@ import requests
 
 class TooManyRequests(requests.HTTPError):
     pass
+
+class IPBanned(TooManyRequests):
+    pass
+
+class StatusUnknown(requests.HTTPError):
+    pass
+
+class ConnectError(requests.ConnectionError):
+    pass
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+class BackpressureError(requests.RequestException):
+    pass
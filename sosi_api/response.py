@@ -0,0 +1,97 @@
+"""
+A buffered response object with the same interface as `requests.Response`, for
+responses that were not received through the `requests` library. This lets the
+same status handlers and message extraction work with any HTTP backend.
+"""
+import datetime
+import json
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class Response:
+    def __init__(self, status_code, headers=None, content=b"", url=None, reason=None, encoding=None, elapsed=None, stream=None, on_close=None):
+        """
+        Args:
+            status_code (int): The HTTP status code, eg `200`.
+            headers (dict): The response headers.
+            content (bytes): The body of the response.
+            url (str): The final url of the response.
+            reason (str): The textual reason of the status code, eg "OK".
+            encoding (str): The encoding used to decode `content` to `text`.
+                Defaults to the charset in the content type header, or utf-8.
+            elapsed (datetime.timedelta): Time between sending the request and
+                receiving the response headers.
+            stream (callable): For a body that has not been received yet,
+                instead of `content`. A function `stream(chunk_size)` that
+                returns an iterator over the chunks of the body.
+            on_close (callable): Function called by `close()`, eg to release
+                the connection back to its pool.
+        """
+        self.status_code = int(status_code)
+        self.headers = CaseInsensitiveDict(headers or {})
+        self._content = None if stream is not None else content
+        self._stream = stream
+        self._on_close = on_close
+        self.url = url
+        self.reason = "" if reason is None else reason
+        self.encoding = encoding
+        self.elapsed = datetime.timedelta(0) if elapsed is None else elapsed
+
+    def __repr__(self):
+        return f"<Response [{self.status_code}]>"
+
+    @property
+    def content(self):
+        if self._content is None:
+            if self._stream is None:
+                raise RuntimeError("The content for this response was already consumed")
+            stream, self._stream = self._stream, None
+            self._content = b"".join(stream(64 * 1024))
+            self.close()
+        return self._content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        encoding = self.encoding
+        if encoding is None:
+            content_type = self.headers.get("Content-Type", "")
+            encoding = "utf-8"
+            for param in content_type.split(";")[1:]:
+                key, _, value = param.strip().partition("=")
+                if key.lower() == "charset" and value:
+                    encoding = value.strip("\"'")
+        return self.content.decode(encoding, errors="replace")
+
+    def json(self, **kwargs):
+        return json.loads(self.content, **kwargs)
+
+    def iter_content(self, chunk_size=1):
+        """Iterate over the body in chunks of `chunk_size` bytes."""
+        if self._content is None and self._stream is not None:
+            stream, self._stream = self._stream, None
+            return stream(chunk_size or 64 * 1024)
+        return self._iter_buffered(chunk_size)
+
+    def _iter_buffered(self, chunk_size):
+        if chunk_size is None:
+            chunk_size = len(self.content) or 1
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            on_close()
+
+    def raise_for_status(self):
+        """Raise a `requests.HTTPError` if the status code is an error."""
+        if 400 <= self.status_code < 500:
+            raise requests.HTTPError(f"{self.status_code} Client Error: {self.reason} for url: {self.url}", response=self)
+        elif 500 <= self.status_code < 600:
+            raise requests.HTTPError(f"{self.status_code} Server Error: {self.reason} for url: {self.url}", response=self)
@@ -0,0 +1,381 @@
+"""
+Sinks that write the records of large pulls to files as they arrive, in
+bounded batches, and can resume an interrupted pull where it stopped.
+
+A sink writes each stream of records (eg the klines of one symbol) to its
+own file in a directory, and keeps a checkpoint file in that directory with
+the high-water mark (the largest timestamp, or id) of the records written to
+each stream, and how much of the stream's file they take up. A restarted
+job, or a daily incremental sync, only fetches the records after the
+high-water mark, and anything written after the last checkpoint (eg half a
+batch, when a crash happened) is discarded.
+
+- `NDJSONSink`: One json record per line.
+- `CSVSink`: Comma separated values, with a header.
+- `ParquetSink`: One Parquet file per batch. Requires `pip install pyarrow`.
+"""
+import csv
+import datetime
+import glob
+import io
+import json
+import os
+import time
+
+from .utils.dt import convert_timearg_as_timestamp
+from .utils.pagination import record_timestamp
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def _fsync_directory(path):
+    """Make the creation, renaming or removal of the files in the directory
+    `path` durable.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Checkpoint:
+    def __init__(self, path):
+        """The state of each stream of a sink, saved atomically to a json file
+        after every change, so that it is never left half written.
+
+        Args:
+            path (str): Path of the json file. Loaded if it exists.
+        """
+        self.path = path
+        self.streams = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.streams = json.load(f)
+
+    def get(self, stream):
+        """The state of `stream`: a dict with its `high_water` mark, the
+        `offset` up to which its file is valid, the number of `records`
+        written, and the names of its `columns`. `None` if nothing was written
+        to it yet.
+        """
+        return self.streams.get(stream)
+
+    def high_water(self, stream):
+        state = self.streams.get(stream)
+        return None if state is None else state["high_water"]
+
+    def update(self, stream, high_water, offset, records, columns=None):
+        self.streams[stream] = dict(
+            high_water=high_water,
+            offset=offset,
+            records=records,
+            columns=columns,
+            updated_at=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        )
+        self.save()
+
+    def reset(self, stream):
+        """Forget the state of `stream`, so that it is written from scratch."""
+        self.streams.pop(stream, None)
+        self.save()
+
+    def save(self):
+        # Write to a temporary file, then rename it over the checkpoint, which
+        # replaces it atomically
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.streams, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        _fsync_directory(os.path.dirname(os.path.abspath(self.path)))
+
+
+class BaseSink:
+    extension = None
+    # Whether the format has named columns
+    named_columns = True
+
+    def __init__(self, directory, time_key=0, columns=None, batch_size=10000, checkpoint_name="_checkpoint.json"):
+        """Writes streams of records to files in `directory`, in batches of
+        `batch_size` records. The checkpoint is updated after each batch, once
+        the batch is safely on disk.
+
+        Args:
+            directory (str): Directory of the files. Created if it does not
+                exist.
+            time_key: How to get the high-water mark (a timestamp in
+                milliseconds, or an id) out of a record. Either an index (eg
+                `0` for klines), a dict key (eg "id" for trades), or a
+                function.
+            columns (list of str): Names of the fields of array records (eg
+                klines), or the keys of dict records to write, for the formats
+                with named columns. Defaults to the keys of the first dict
+                record written to each stream, or the positions of array
+                records. The columns of each stream are saved in the
+                checkpoint, and kept for the whole stream.
+            batch_size (int): The number of records held in memory per stream
+                before they are written.
+            checkpoint_name (str): File name of the checkpoint in `directory`.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.time_key = time_key
+        self.columns = None if columns is None else list(columns)
+        self.batch_size = batch_size
+        self.checkpoint = Checkpoint(os.path.join(directory, checkpoint_name))
+        self._buffers = {}
+        # The streams whose uncommitted data was discarded
+        self._recovered = set()
+
+    def path(self, stream):
+        """Path of the file (or directory) of `stream`."""
+        if (not stream) or (os.sep in stream) or stream.startswith("."):
+            raise ValueError(f"`stream` must be a valid file name, received {stream!r}")
+        return os.path.join(self.directory, f"{stream}.{self.extension}")
+
+    def high_water(self, stream):
+        """The largest timestamp (or id) written to `stream`, or `None`."""
+        return self.checkpoint.high_water(stream)
+
+    def write(self, stream, records):
+        """Add records to `stream`. They are written once `batch_size` of them
+        are buffered, or on `flush()`.
+
+        Args:
+            stream (str): Name of the stream, eg a symbol. Used as file name.
+            records: A page of records, in ascending order of `time_key`.
+                Either a list of records, or a `Columns` object.
+        """
+        if stream not in self._recovered:
+            self._recover(stream)
+        buffer = self._buffers.setdefault(stream, [])
+        buffer.extend(records)
+        while len(buffer) >= self.batch_size:
+            self._write_batch(stream, buffer[:self.batch_size])
+            del buffer[:self.batch_size]
+
+    def flush(self, stream=None):
+        """Write the buffered records of `stream`, or of all the streams."""
+        streams = list(self._buffers) if stream is None else [stream]
+        for name in streams:
+            buffer = self._buffers.get(name)
+            if buffer:
+                self._write_batch(name, buffer)
+                buffer.clear()
+
+    def _recover(self, stream):
+        """Discard anything written to `stream` after its last checkpoint (eg
+        half a batch, when a crash happened).
+        """
+        state = self.checkpoint.get(stream)
+        self._truncate(stream, 0 if state is None else state["offset"])
+        self._recovered.add(stream)
+
+    def _write_batch(self, stream, records):
+        state = self.checkpoint.get(stream)
+        offset = 0 if state is None else state["offset"]
+        written = 0 if state is None else state["records"]
+        columns = None if state is None else state.get("columns")
+        if (columns is None) and self.named_columns:
+            columns = self._column_names(records[0])
+        offset = self._write_records(stream, records, offset, columns)
+        high_water = record_timestamp(records[-1], self.time_key)
+        if (state is not None) and (state["high_water"] is not None):
+            high_water = max(high_water, state["high_water"])
+        self.checkpoint.update(stream, high_water=high_water, offset=offset, records=written + len(records), columns=columns)
+
+    def _truncate(self, stream, offset):
+        """Durably discard the part of the stream's file after `offset`."""
+        raise NotImplementedError
+
+    def _write_records(self, stream, records, offset, columns):
+        """Durably write `records` after the valid part (`offset`) of the
+        stream's file. Returns the new offset.
+        """
+        raise NotImplementedError
+
+    def _column_names(self, record):
+        if self.columns is not None:
+            return self.columns
+        if isinstance(record, dict):
+            return list(record)
+        return [str(i) for i in range(len(record))]
+
+    def sync(self, client, stream, t1=None, t2=None, pagination="time", cursor=None, **kwargs):
+        """Fetch the records of a paginated endpoint with `client.iter_pages()`
+        and write them to `stream`, starting just after its high-water mark
+        if it has one, so that a restarted (or repeated, eg daily) sync only
+        fetches the records it does not have yet.
+
+        Args:
+            client (BaseClient): The client to fetch the records with.
+            stream (str): Name of the stream.
+            t1: Start of the time range, for "time" pagination, if the stream
+                is empty.
+            t2: End of the time range. Defaults to now. For records that may
+                still change (eg the current kline), pass the end of the last
+                closed interval instead.
+            pagination (str): "time" or "id" (see `BaseClient.iter_pages()`).
+            cursor: The id to start from, for "id" pagination, if the stream
+                is empty.
+            **kwargs: Other arguments of `client.iter_pages()`, eg `endpoint`,
+                `params` and `limit`.
+
+        Returns:
+            int: The number of records written.
+        """
+        if stream not in self._recovered:
+            self._recover(stream)
+        high_water = self.high_water(stream)
+        if pagination == "time":
+            t1 = t1 if high_water is None else high_water + 1
+            t2 = int(time.time() * 1000) if t2 is None else convert_timearg_as_timestamp(t2, unit="ms")
+            if (t1 is not None) and (convert_timearg_as_timestamp(t1, unit="ms") > t2):
+                return 0
+            pages = client.iter_pages(pagination="time", t1=t1, t2=t2, record_key=self.time_key, **kwargs)
+        elif pagination == "id":
+            cursor = cursor if high_water is None else high_water + 1
+            pages = client.iter_pages(pagination="id", cursor=cursor, record_key=self.time_key, **kwargs)
+        else:
+            raise ValueError(f"`pagination` must be one of ['time', 'id'], received {pagination}")
+
+        count = 0
+        for page in pages:
+            self.write(stream, page)
+            count += len(page)
+        self.flush(stream)
+        return count
+
+    def close(self):
+        """Write the buffered records of all the streams."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _FileSink(BaseSink):
+    """Sink whose streams are single files that batches are appended to. The
+    offset in the checkpoint is the size of the valid part of the file.
+    """
+
+    def _encode(self, records, columns, header):
+        """The bytes of `records`, preceded by a header if `header`."""
+        raise NotImplementedError
+
+    def _truncate(self, stream, offset):
+        path = self.path(stream)
+        if os.path.exists(path) and os.path.getsize(path) > offset:
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+                os.fsync(f.fileno())
+
+    def _write_records(self, stream, records, offset, columns):
+        path = self.path(stream)
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            # Drop anything written after the last checkpoint
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(self._encode(records, columns, header=(offset == 0)))
+            f.flush()
+            os.fsync(f.fileno())
+            end = f.tell()
+        if offset == 0:
+            _fsync_directory(self.directory)
+        return end
+
+
+class NDJSONSink(_FileSink):
+    """Writes each record as a json document on its own line.
+
+    Example:
+        >>> with NDJSONSink("exports/klines", time_key=0) as sink:
+        ...     sink.sync(client, "BTCUSDT", endpoint="/api/v3/klines", params=dict(symbol="BTCUSDT", interval="1m"), t1="2021-01-01 00:00:00 UTC", limit=1000)
+    """
+    extension = "ndjson"
+    named_columns = False
+
+    def _encode(self, records, columns, header):
+        lines = [json.dumps(record, separators=(",", ":"), default=str) for record in records]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class CSVSink(_FileSink):
+    """Writes the records as comma separated values, with a header row of the
+    column names. Dict records with keys that are not columns of the stream
+    raise a `ValueError`, and missing keys are left empty.
+    """
+    extension = "csv"
+
+    def _encode(self, records, columns, header):
+        out = io.StringIO()
+        if isinstance(records[0], dict):
+            writer = csv.DictWriter(out, fieldnames=columns, extrasaction="raise")
+            if header:
+                writer.writeheader()
+        else:
+            writer = csv.writer(out)
+            if header:
+                writer.writerow(columns)
+        writer.writerows(records)
+        return out.getvalue().encode("utf-8")
+
+
+class ParquetSink(BaseSink):
+    extension = "parquet"
+
+    def __init__(self, directory, time_key=0, columns=None, batch_size=100000, checkpoint_name="_checkpoint.json", compression="snappy"):
+        """Writes each batch of records of a stream as a Parquet file, in the
+        stream's directory (eg `BTCUSDT.parquet/part-000000.parquet`), which
+        can be read as a single dataset with `pyarrow.parquet.read_table()`.
+        The offset in the checkpoint is the number of batch files.
+
+        Args:
+            compression (str): The compression codec of the files.
+
+        See `BaseSink` for the other arguments.
+        """
+        if pyarrow is None:
+            raise ImportError("ParquetSink requires `pyarrow`. Install it with `pip install pyarrow`")
+        super().__init__(directory, time_key=time_key, columns=columns, batch_size=batch_size, checkpoint_name=checkpoint_name)
+        self.compression = compression
+
+    def _table(self, records, columns):
+        if isinstance(records[0], dict):
+            return pyarrow.table({name: [record.get(name) for record in records] for name in columns})
+        return pyarrow.table({name: list(values) for name, values in zip(columns, zip(*records))})
+
+    def _truncate(self, stream, offset):
+        # Drop the batches (and partial files) written after the last checkpoint
+        directory = self.path(stream)
+        removed = False
+        for path in glob.glob(os.path.join(directory, "part-*")):
+            name = os.path.basename(path)
+            if name.endswith(".tmp") or int(name[len("part-"):].split(".")[0]) >= offset:
+                os.remove(path)
+                removed = True
+        if removed:
+            _fsync_directory(directory)
+
+    def _write_records(self, stream, records, offset, columns):
+        directory = self.path(stream)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+            _fsync_directory(self.directory)
+        self._truncate(stream, offset)
+        path = os.path.join(directory, f"part-{offset:06d}.parquet")
+        pyarrow.parquet.write_table(self._table(records, columns), f"{path}.tmp", compression=self.compression)
+        with open(f"{path}.tmp", "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+        _fsync_directory(directory)
+        return offset + 1
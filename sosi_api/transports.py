@@ -0,0 +1,313 @@
+"""
+Transports send the HTTP requests of a `BaseClient`. They all return
+responses with the interface of `requests.Response`, and raise the
+`requests` exceptions (eg `requests.ConnectionError`), so that the rest of
+the client works the same with any of them.
+
+- `RequestsTransport`: A `requests.Session` (the default).
+- `Urllib3Transport`: A bare `urllib3.PoolManager`, with less overhead per
+  request than `requests`.
+- `HTTP2Transport`: An `httpx` client that multiplexes concurrent requests
+  over a single HTTP/2 connection, when the server supports it. Requires
+  `pip install sosi-api[http2]`.
+- `InMemoryTransport`: Answers requests from registered routes, without any
+  network, for tests.
+"""
+import collections
+import datetime
+import json as jsonlib
+import threading
+import time
+import urllib.parse
+
+import requests
+import urllib3
+
+from . import exceptions
+from .response import Response
+from .utils.metrics import TIMED_POOL_CLASSES, TimedHTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class BaseTransport:
+    def send(self, method, url, params=None, json=None, headers=None, timeout=None, stream=False):
+        """Send a request, and return its response.
+
+        Args:
+            method (str): The HTTP method, eg "GET" or "DELETE".
+            url (str): The url, without the url parameters.
+            params (dict): The url parameters.
+            json: Object to send as the json body. `None` for no body.
+            headers (dict): The request headers.
+            timeout (float or tuple): Timeout in seconds. Either a single
+                value, or a `(connect, read)` tuple. `None` to wait forever.
+            stream (bool): Whether to only read the body as it is iterated
+                over with `response.iter_content()`.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Close all the open connections."""
+
+
+def _encode_url(url, params):
+    if not params:
+        return url
+    separator = "&" if "?" in url else "?"
+    return url + separator + urllib.parse.urlencode(params, doseq=True)
+
+
+def _encode_json(json, headers):
+    headers = {} if headers is None else dict(headers)
+    if json is None:
+        return None, headers
+    if not any(name.lower() == "content-type" for name in headers):
+        headers["Content-Type"] = "application/json"
+    return jsonlib.dumps(json).encode("utf-8"), headers
+
+
+class RequestsTransport(BaseTransport):
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False):
+        """Sends the requests through a `requests.Session`, which keeps a pool
+        of keep-alive connections per host.
+
+        Args:
+            pool_connections (int): The number of hosts to keep pools for.
+            pool_maxsize (int): The maximum number of connections kept open
+                per host.
+            pool_block (bool): Whether to wait for a free connection when the
+                pool is full, rather than opening (and then discarding) an
+                extra one.
+        """
+        session = requests.Session()
+        adapter = TimedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        self.session = session
+
+    def send(self, method, url, params=None, json=None, headers=None, timeout=None, stream=False):
+        return self.session.request(method, url, params=params, json=json, headers=headers, timeout=timeout, stream=stream)
+
+    def close(self):
+        self.session.close()
+
+
+class Urllib3Transport(BaseTransport):
+    def __init__(self, num_pools=10, maxsize=10, block=False, max_redirects=5):
+        """Sends the requests with a `urllib3.PoolManager`, skipping the
+        overhead of `requests` (sessions, cookies, hooks, etc).
+
+        Args:
+            num_pools (int): The number of hosts to keep pools for.
+            maxsize (int): The maximum number of connections kept open per
+                host.
+            block (bool): Whether to wait for a free connection when the pool
+                is full.
+            max_redirects (int): The maximum number of redirects to follow.
+        """
+        self.pool_manager = urllib3.PoolManager(num_pools=num_pools, maxsize=maxsize, block=block)
+        self.pool_manager.pool_classes_by_scheme = dict(TIMED_POOL_CLASSES)
+        # Retries are done by the client, so only follow redirects
+        self.retries = urllib3.Retry(total=None, connect=0, read=0, redirect=max_redirects, status=0, other=0, raise_on_redirect=False)
+
+    def send(self, method, url, params=None, json=None, headers=None, timeout=None, stream=False):
+        url = _encode_url(url, params)
+        body, headers = _encode_json(json, headers)
+        if isinstance(timeout, (tuple, list)):
+            timeout = urllib3.Timeout(connect=timeout[0], read=timeout[1])
+        elif timeout is not None:
+            timeout = urllib3.Timeout(total=timeout)
+        start = time.perf_counter()
+        try:
+            raw = self.pool_manager.request(method, url, body=body, headers=headers, timeout=timeout, retries=self.retries, preload_content=False)
+        except urllib3.exceptions.HTTPError as e:
+            raise _as_requests_exception(e) from e
+        elapsed = datetime.timedelta(seconds=time.perf_counter() - start)
+
+        response_url = raw.geturl() or url
+        if "://" not in response_url:
+            response_url = urllib.parse.urljoin(url, response_url)
+        kwargs = dict(status_code=raw.status, headers=dict(raw.headers), url=response_url, reason=raw.reason, elapsed=elapsed)
+        if stream:
+            return Response(stream=lambda chunk_size: _read_urllib3_chunks(raw, chunk_size), on_close=raw.release_conn, **kwargs)
+        try:
+            content = raw.read()
+        except urllib3.exceptions.HTTPError as e:
+            raise _as_requests_exception(e) from e
+        finally:
+            raw.release_conn()
+        return Response(content=content, **kwargs)
+
+    def close(self):
+        self.pool_manager.clear()
+
+
+def _read_urllib3_chunks(raw, chunk_size):
+    try:
+        yield from raw.stream(chunk_size)
+    except urllib3.exceptions.HTTPError as e:
+        raise _as_requests_exception(e) from e
+    finally:
+        raw.release_conn()
+
+
+def _as_requests_exception(exception):
+    """Map a urllib3 exception to the equivalent `requests` exception, so
+    that it can be classified by a `RetryPolicy`.
+    """
+    reason = getattr(exception, "reason", None) or exception
+    if isinstance(reason, urllib3.exceptions.NewConnectionError):
+        return exceptions.ConnectError(str(exception))
+    elif isinstance(reason, urllib3.exceptions.ConnectTimeoutError):
+        return requests.ConnectTimeout(str(exception))
+    elif isinstance(reason, urllib3.exceptions.ReadTimeoutError):
+        return requests.ReadTimeout(str(exception))
+    elif isinstance(reason, urllib3.exceptions.SSLError):
+        return requests.exceptions.SSLError(str(exception))
+    return requests.ConnectionError(str(exception))
+
+
+class HTTP2Transport(BaseTransport):
+    def __init__(self, max_connections=10, max_keepalive_connections=None, http2=True):
+        """Sends the requests with an `httpx.Client`. With HTTP/2, concurrent
+        requests to the same host (eg from `request_many()`) are multiplexed
+        as streams of a single connection, instead of each needing its own.
+        Servers that do not support HTTP/2 are spoken to over HTTP/1.1.
+
+        Args:
+            max_connections (int): The maximum number of connections open at
+                the same time, across all hosts.
+            max_keepalive_connections (int): The maximum number of idle
+                connections kept open. Defaults to `max_connections`.
+            http2 (bool): Whether to negotiate HTTP/2.
+        """
+        if httpx is None:
+            raise ImportError("HTTP2Transport requires `httpx`. Install it with `pip install sosi-api[http2]`")
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+        self.client = httpx.Client(http2=http2, limits=limits, follow_redirects=True)
+
+    def send(self, method, url, params=None, json=None, headers=None, timeout=None, stream=False):
+        if isinstance(timeout, (tuple, list)):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        else:
+            timeout = httpx.Timeout(timeout)
+        request = self.client.build_request(method, url, params=params, json=json, headers=headers, timeout=timeout)
+        start = time.perf_counter()
+        try:
+            raw = self.client.send(request, stream=True)
+        except httpx.TransportError as e:
+            raise _httpx_as_requests_exception(e) from e
+        elapsed = datetime.timedelta(seconds=time.perf_counter() - start)
+
+        kwargs = dict(status_code=raw.status_code, headers=dict(raw.headers), url=str(raw.url), reason=raw.reason_phrase, elapsed=elapsed)
+        if stream:
+            return Response(stream=lambda chunk_size: _read_httpx_chunks(raw, chunk_size), on_close=raw.close, **kwargs)
+        try:
+            content = raw.read()
+        except httpx.TransportError as e:
+            raise _httpx_as_requests_exception(e) from e
+        finally:
+            raw.close()
+        return Response(content=content, **kwargs)
+
+    def close(self):
+        self.client.close()
+
+
+def _read_httpx_chunks(raw, chunk_size):
+    try:
+        yield from raw.iter_bytes(chunk_size)
+    except httpx.TransportError as e:
+        raise _httpx_as_requests_exception(e) from e
+    finally:
+        raw.close()
+
+
+def _httpx_as_requests_exception(exception):
+    if isinstance(exception, httpx.ConnectTimeout):
+        return requests.ConnectTimeout(str(exception))
+    elif isinstance(exception, httpx.ConnectError):
+        return exceptions.ConnectError(str(exception))
+    elif isinstance(exception, httpx.TimeoutException):
+        return requests.ReadTimeout(str(exception))
+    return requests.ConnectionError(str(exception))
+
+
+# A request received by an `InMemoryTransport`
+TransportRequest = collections.namedtuple("TransportRequest", ["method", "url", "params", "json", "headers"])
+
+
+class InMemoryTransport(BaseTransport):
+    def __init__(self, handler=None):
+        """Answers requests from registered routes, without any network, eg
+        to test code built on a client.
+
+        Args:
+            handler (callable): `func(request)` that answers the requests that
+                do not match a route (see `add_route()`). Defaults to `None`,
+                which answers them with a 404.
+
+        Example:
+            >>> transport = InMemoryTransport()
+            >>> transport.add_route("GET", "/api/v3/time", json={"serverTime": 1640995200000})
+            >>> client = BaseClient("http://example.com", transport=transport)
+            >>> client.request(endpoint="/api/v3/time")
+            {'serverTime': 1640995200000}
+            >>> transport.requests[0].url
+            'http://example.com/api/v3/time'
+        """
+        self.handler = handler
+        self.routes = {}
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def add_route(self, method, path, json=None, status=200, headers=None, content=None, handler=None):
+        """Answer the requests with `method` to `path` (or a full url).
+
+        Args:
+            method (str): The HTTP method, eg "GET".
+            path (str): The path of the url, eg "/api/v3/time", or a full url.
+            json: Object to send as the json body of the response.
+            status (int): The status code of the response.
+            headers (dict): The response headers.
+            content (bytes): The body of the response, instead of `json`.
+            handler (callable): `func(request)` that creates the response for
+                each request, instead of a fixed response. It receives a
+                `TransportRequest`, and returns either a `Response`, a
+                `(status, json)` tuple, or a `(status, json, headers)` tuple.
+        """
+        if handler is None:
+            def handler(request):
+                return make_response(request, status=status, json=json, headers=headers, content=content)
+        self.routes[(method.upper(), path)] = handler
+
+    def send(self, method, url, params=None, json=None, headers=None, timeout=None, stream=False):
+        request = TransportRequest(method.upper(), url, dict(params or {}), json, dict(headers or {}))
+        with self._lock:
+            self.requests.append(request)
+        handler = self.routes.get((request.method, url)) or self.routes.get((request.method, urllib.parse.urlsplit(url).path)) or self.handler
+        if handler is None:
+            return make_response(request, status=404, json={"msg": "Not found."})
+        response = handler(request)
+        if isinstance(response, tuple):
+            response = make_response(request, *response)
+        return response
+
+    def clear(self):
+        """Forget the requests received so far."""
+        with self._lock:
+            self.requests.clear()
+
+
+def make_response(request, status=200, json=None, headers=None, content=None):
+    """Create the `Response` to a `TransportRequest`."""
+    headers = {} if headers is None else dict(headers)
+    if content is None:
+        content = b"" if json is None else jsonlib.dumps(json).encode("utf-8")
+        if json is not None:
+            headers.setdefault("Content-Type", "application/json")
+    return Response(status_code=status, headers=headers, content=content, url=_encode_url(request.url, request.params))
@@ -0,0 +1,144 @@
+"""
+In-memory cache of the responses to GET requests.
+"""
+import collections
+import threading
+import time
+
+
+def make_request_key(method, url, url_params=None, headers=None, vary_headers=()):
+    """Create a hashable key that identifies a request.
+
+    Args:
+        method (str): The method of the request, eg "GET".
+        url (str): The full url of the request.
+        url_params (dict): The url parameters of the request. The order of the
+            parameters does not affect the key.
+        headers (dict): The headers of the request.
+        vary_headers (iterable): The names of the headers that can change the
+            response (eg an API key header). All other headers are ignored.
+    """
+    params = tuple(sorted((str(k), str(v)) for k, v in (url_params or {}).items()))
+    if vary_headers:
+        lower_headers = {str(k).lower(): v for k, v in (headers or {}).items()}
+        headers = tuple((name.lower(), lower_headers.get(name.lower())) for name in vary_headers)
+    else:
+        headers = ()
+    return (method.upper(), url, params, headers)
+
+
+class CacheEntry:
+    __slots__ = ("msg", "expires_at", "etag", "last_modified")
+
+    def __init__(self, msg, expires_at, etag=None, last_modified=None):
+        self.msg = msg
+        self.expires_at = expires_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def fresh(self):
+        return time.monotonic() < self.expires_at
+
+    def validation_headers(self):
+        """Headers for a conditional request, that asks the server to only
+        send the body if it changed since this entry was stored.
+        """
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    def __init__(self, maxsize=256, ttl=0, endpoint_ttls=None, vary_headers=()):
+        """Thread-safe, size bounded, least recently used cache of the
+        extracted messages of GET responses.
+
+        Entries expire after a time to live (TTL). Expired entries are kept
+        around, so that if the server sent an `ETag` or `Last-Modified` header,
+        the next request can ask the server whether the entry is still valid
+        (sending `If-None-Match` / `If-Modified-Since`), and reuse the cached
+        message if the server responds with `304 Not Modified`.
+
+        Args:
+            maxsize (int): The maximum number of entries. The least recently
+                used entry is evicted once this is exceeded.
+            ttl (float): The default time to live of entries, in seconds. `0`
+                means that only the endpoints in `endpoint_ttls` are cached.
+            endpoint_ttls (dict): Time to live of specific endpoints (or full
+                urls), in seconds. Eg `{"/api/v3/exchangeInfo": 60}`.
+            vary_headers (iterable): Names of the request headers that are part
+                of the cache key, such as authentication headers.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.endpoint_ttls = {} if endpoint_ttls is None else dict(endpoint_ttls)
+        self.vary_headers = tuple(vary_headers)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def ttl_for(self, endpoint=None, url=None):
+        """The time to live, in seconds, of responses from an endpoint/url."""
+        if endpoint is not None and endpoint in self.endpoint_ttls:
+            return self.endpoint_ttls[endpoint]
+        return self.endpoint_ttls.get(url, self.ttl)
+
+    def key(self, method, url, url_params=None, headers=None):
+        return make_request_key(method, url, url_params=url_params, headers=headers, vary_headers=self.vary_headers)
+
+    def get(self, key):
+        """Get the entry for `key` (fresh or not), or `None`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, msg, ttl, etag=None, last_modified=None):
+        with self._lock:
+            self._entries[key] = CacheEntry(msg, time.monotonic() + ttl, etag=etag, last_modified=last_modified)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def refresh(self, key, ttl):
+        """Extend the life of an entry the server confirmed is still valid."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires_at = time.monotonic() + ttl
+                self.revalidations += 1
+            return entry
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters of how the cache has been used."""
+        with self._lock:
+            total = self.hits + self.misses + self.revalidations
+            return dict(
+                size=len(self._entries),
+                hits=self.hits,
+                misses=self.misses,
+                revalidations=self.revalidations,
+                hit_rate=(self.hits / total) if total else 0.0,
+            )
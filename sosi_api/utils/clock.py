@@ -0,0 +1,115 @@
+"""
+Estimation of the offset between the local clock and the server's clock, so
+that signed requests can be stamped with the server's time.
+"""
+import email.utils
+import threading
+import time
+
+
+class ClockOffsetTracker:
+    def __init__(self, time_endpoint=None, time_key="serverTime", refresh_interval=60.0, smoothing=0.3):
+        """Keeps an estimate of how far the server's clock is ahead of the
+        local clock (`offset_ms`), and of the error of that estimate
+        (`error_ms`).
+
+        Each sample of the server time is compared with the midpoint of the
+        round trip of the request that fetched it, so half the round trip
+        time (RTT) is the error of the sample. Samples are smoothed with an
+        exponential moving average, in which samples that are less precise
+        than the current estimate (eg from a slow round trip) carry less
+        weight.
+
+        Samples come from either:
+        - A server time endpoint (eg "/api/v3/time"), requested by the client
+          whenever the estimate is older than `refresh_interval`.
+        - Or, if there is no `time_endpoint`, the `Date` header of every
+          response. It only has a resolution of 1 second, so the error is at
+          least 500ms.
+
+        Args:
+            time_endpoint (str): Endpoint (or full url) that returns the server
+                time. Defaults to `None`, to use `Date` headers instead.
+            time_key (str): Key of the server time, as a unix timestamp in
+                milliseconds, in the json response of `time_endpoint`.
+            refresh_interval (float): Seconds after which the offset is
+                refreshed from `time_endpoint`.
+            smoothing (float): Weight (between 0 and 1) of a new sample that
+                is as precise as the current estimate.
+        """
+        self.time_endpoint = time_endpoint
+        self.time_key = time_key
+        self.refresh_interval = refresh_interval
+        self.smoothing = smoothing
+        self.offset_ms = 0.0
+        self.error_ms = None
+        self.rtt_ms = None
+        self.samples = 0
+        self._updated_at = None
+        self._lock = threading.Lock()
+
+    def now_ms(self) -> int:
+        """The current time on the server's clock, as a unix timestamp in
+        milliseconds.
+        """
+        return int(time.time() * 1000 + self.offset_ms)
+
+    def needs_refresh(self) -> bool:
+        """Whether the estimate should be refreshed from `time_endpoint`."""
+        if self.time_endpoint is None:
+            return False
+        updated_at = self._updated_at
+        return updated_at is None or time.monotonic() - updated_at > self.refresh_interval
+
+    def add_sample(self, server_ms, sent_ms, received_ms, resolution_ms=0):
+        """Add a sample of the server time.
+
+        Args:
+            server_ms (float): The server time reported in the response, as a
+                unix timestamp in milliseconds.
+            sent_ms (float): Local time the request was sent at.
+            received_ms (float): Local time the response was received at.
+            resolution_ms (float): The resolution of `server_ms`, eg 1000 for
+                a time truncated to the second. The middle of that interval is
+                used, and half of it is added to the error.
+        """
+        rtt = max(received_ms - sent_ms, 0.0)
+        offset = server_ms + resolution_ms / 2 - (sent_ms + received_ms) / 2
+        error = (rtt + resolution_ms) / 2
+        with self._lock:
+            if self.samples == 0:
+                weight = 1.0
+            else:
+                # Down-weight samples that are less precise than the estimate
+                weight = self.smoothing * min(1.0, ((self.error_ms + 1.0) / (error + 1.0)) ** 2)
+            self.offset_ms += weight * (offset - self.offset_ms)
+            self.error_ms = error if self.samples == 0 else self.error_ms + weight * (error - self.error_ms)
+            self.rtt_ms = rtt
+            self.samples += 1
+            self._updated_at = time.monotonic()
+
+    def add_time_response(self, msg, sent_ms, received_ms):
+        """Add a sample from the (json) response of `time_endpoint`."""
+        self.add_sample(float(msg[self.time_key]), sent_ms, received_ms)
+
+    def add_date_header(self, response, sent_ms, received_ms):
+        """Add a sample from the `Date` header of a response, if it has one."""
+        date = response.headers.get("Date")
+        if date is None:
+            return
+        try:
+            server_time = email.utils.parsedate_to_datetime(date)
+        except (TypeError, ValueError):
+            return
+        self.add_sample(server_time.timestamp() * 1000, sent_ms, received_ms, resolution_ms=1000)
+
+    def stats(self):
+        """The current estimate, eg to export as metrics."""
+        updated_at = self._updated_at
+        return dict(
+            offset_ms=self.offset_ms,
+            error_ms=self.error_ms,
+            rtt_ms=self.rtt_ms,
+            samples=self.samples,
+            age=None if updated_at is None else time.monotonic() - updated_at,
+        )
@@ -0,0 +1,222 @@
+"""
+Decoding of array-of-arrays (eg klines) or array-of-objects (eg trades)
+payloads straight into typed columns, rather than nested lists of strings.
+
+NumPy is an optional dependency, only needed for the "numpy" response kind.
+"""
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Column type -> typecode of the `array.array` holding it (`None` for a list)
+COLUMN_TYPECODES = {
+    "int": "q",
+    "float": "d",
+    "timestamp_ms": "q",
+    "str": None,
+}
+
+# Column type -> numpy dtype
+NUMPY_DTYPES = {
+    "int": "int64",
+    "float": "float64",
+    "timestamp_ms": "datetime64[ms]",
+    "str": "object",
+}
+
+
+class Schema:
+    def __init__(self, columns):
+        """The names and types of the fields of each record.
+
+        Args:
+            columns (list of tuples): `(name, type)` of each field, in the same
+                order as they appear in array records. For object records, the
+                names are the keys of the fields. The type is one of:
+                - "int": Integers (or strings of integers).
+                - "float": Floats (or strings of floats, eg prices).
+                - "timestamp_ms": Unix timestamps in milliseconds.
+                - "str": Anything else, kept as is.
+                Fields of array records can be skipped by giving them a name
+                of `None`.
+
+        Example:
+            >>> KLINE_SCHEMA = Schema([
+            ...     ("open_time", "timestamp_ms"), ("open", "float"),
+            ...     ("high", "float"), ("low", "float"), ("close", "float"),
+            ...     ("volume", "float"), ("close_time", "timestamp_ms"),
+            ... ])
+        """
+        self._spec = [(name, kind) for name, kind in columns]
+        self.columns = []
+        for position, (name, kind) in enumerate(self._spec):
+            if kind not in COLUMN_TYPECODES:
+                legal_kinds = list(COLUMN_TYPECODES.keys())
+                raise ValueError(f"Column types must be one of {legal_kinds}, received {kind} for column {name}")
+            if name is not None:
+                self.columns.append((position, name, kind))
+        self.names = [name for _, name, _ in self.columns]
+        self.types = {name: kind for _, name, kind in self.columns}
+        # Where each field is in the rows, by name and by position in the
+        # records returned by the API
+        indices = {name: i for i, name in enumerate(self.names)}
+        indices.update({position: i for i, (position, _, _) in enumerate(self.columns)})
+        self.row_class = type("Row", (Row,), {"__slots__": (), "_fields": tuple(self.names), "_indices": indices})
+
+    def __repr__(self):
+        return f"Schema({[(name, kind) for _, name, kind in self.columns]})"
+
+    def __reduce__(self):
+        # The row class is created again, rather than pickled
+        return (Schema, (self._spec,))
+
+    def _raw_columns(self, records):
+        """Transpose records into a tuple of values per column."""
+        if len(records) == 0:
+            return {name: () for name in self.names}
+        if isinstance(records[0], dict):
+            return {name: tuple(record[name] for record in records) for name in self.names}
+        transposed = list(zip(*records))
+        return {name: transposed[position] for position, name, _ in self.columns}
+
+    def decode(self, records):
+        """Decode a list of records into a `Columns` object, where each
+        numeric column is an `array.array` of machine values.
+        """
+        raw = self._raw_columns(records)
+        columns = {}
+        for name in self.names:
+            typecode = COLUMN_TYPECODES[self.types[name]]
+            values = raw[name]
+            if typecode is None:
+                columns[name] = list(values)
+            elif typecode == "d":
+                columns[name] = array.array(typecode, map(float, values))
+            else:
+                columns[name] = array.array(typecode, map(int, values))
+        return Columns(self, columns)
+
+    def numpy_dtype(self):
+        return numpy.dtype([(name, NUMPY_DTYPES[self.types[name]]) for name in self.names])
+
+    def decode_numpy(self, records):
+        """Decode a list of records into a NumPy structured array."""
+        if numpy is None:
+            raise ImportError("The 'numpy' response kind requires `numpy`. Install it with `pip install numpy`")
+        raw = self._raw_columns(records)
+        out = numpy.empty(len(records), dtype=self.numpy_dtype())
+        for name in self.names:
+            kind = self.types[name]
+            if kind == "str":
+                out[name] = raw[name]
+            elif kind == "timestamp_ms":
+                out[name] = numpy.asarray(raw[name]).astype("int64").astype("datetime64[ms]")
+            else:
+                # Parsing the strings as numbers is done in C by numpy
+                out[name] = numpy.asarray(raw[name]).astype(NUMPY_DTYPES[kind])
+        return out
+
+
+class Row(tuple):
+    """A record of a `Columns` page: a tuple of the values of the fields of
+    the schema, which can also be indexed the same way as the record returned
+    by the API, ie by field name (eg `row["id"]`), or by the position of the
+    field in array records (eg `row[4]` for the close price of a kline), even
+    when the schema skips some of the fields.
+    """
+    __slots__ = ()
+    _fields = ()
+    _indices = {}
+
+    def __getitem__(self, key):
+        if key.__class__ is slice:
+            return tuple.__getitem__(self, key)
+        index = self._indices.get(key)
+        if index is None:
+            if isinstance(key, int):
+                if key < 0:
+                    return tuple.__getitem__(self, key)
+                raise IndexError(f"The schema has no field at position {key}")
+            raise KeyError(key)
+        return tuple.__getitem__(self, index)
+
+    def __reduce__(self):
+        # Pickled as a plain tuple
+        return (tuple, (tuple(self),))
+
+
+class Columns:
+    __slots__ = ("schema", "columns")
+
+    def __init__(self, schema, columns):
+        """A page of records stored as one typed column per field.
+
+        Columns are accessed by name (`page["open"]`), and records by
+        position (`page[-1]`, as a `Row`).
+        """
+        self.schema = schema
+        self.columns = columns
+
+    def __repr__(self):
+        return f"<Columns [{len(self)} rows x {len(self.columns)} columns]>"
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(self.columns[self.schema.names[0]])
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.columns[key]
+        return self.schema.row_class(self.columns[name][key] for name in self.schema.names)
+
+    def __iter__(self):
+        return map(self.schema.row_class, zip(*(self.columns[name] for name in self.schema.names)))
+
+    def keys(self):
+        return list(self.schema.names)
+
+    def extend(self, other):
+        """Append the rows of another `Columns` with the same schema."""
+        for name in self.schema.names:
+            self.columns[name].extend(other.columns[name])
+
+    def to_numpy(self):
+        """Convert to a NumPy structured array."""
+        if numpy is None:
+            raise ImportError("`to_numpy()` requires `numpy`. Install it with `pip install numpy`")
+        out = numpy.empty(len(self), dtype=self.schema.numpy_dtype())
+        for name in self.schema.names:
+            kind = self.schema.types[name]
+            if kind == "timestamp_ms":
+                out[name] = numpy.frombuffer(self.columns[name], dtype="int64").astype("datetime64[ms]")
+            elif kind == "str":
+                out[name] = self.columns[name]
+            else:
+                out[name] = numpy.frombuffer(self.columns[name], dtype=NUMPY_DTYPES[kind])
+        return out
+
+
+def is_columnar(page):
+    """Whether `page` was decoded by a "columnar" or "numpy" response kind."""
+    return isinstance(page, Columns) or (numpy is not None and isinstance(page, numpy.ndarray))
+
+
+def concat_pages(pages):
+    """Concatenate columnar pages (all `Columns`, or all NumPy arrays) into a
+    single one.
+    """
+    pages = list(pages)
+    if (numpy is not None) and pages and isinstance(pages[0], numpy.ndarray):
+        return numpy.concatenate(pages)
+    out = None
+    for page in pages:
+        if out is None:
+            # Copy the first page, so that the pages are left untouched
+            out = Columns(page.schema, {name: column[:] for name, column in page.columns.items()})
+        else:
+            out.extend(page)
+    return out
@@ -14,10 +14,77 @@ WARNING: Converting datetime string to datetime object (or timestamp) could
                                         returns a timezone-unaware datetime.
 """
 import datetime
+import functools
+import logging
+import re
+import string
+
 import dateutil
+import dateutil.parser
+import dateutil.tz
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
 
 DESIRED_TIMEZONE = "UTC"
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S %Z"
+UNIT_MULTIPLIERS = {"ms": 1000, "s": 1}
+
+_UTC_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Splits '2021-12-05 12:50:00 UTC' into the datetime and the timezone name
+_EMBEDDED_TZ_PATTERN = re.compile(r"(.*[\d])([\D]*$)")
+
+# The common ISO 8601 shapes, without a timezone, eg '2021-12-05',
+# '2021-12-05 12:50', '2021-12-05T12:50:00' or '2021-12-05 12:50:00.123'
+_ISO_DATETIME_PATTERN = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})"
+    r"(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?)?$"
+)
+
+
+@functools.lru_cache(maxsize=256)
+def get_tzinfo(tz:str):
+    """Same as `dateutil.tz.gettz(tz)`, but remembers the timezones it has
+    already resolved.
+    """
+    return dateutil.tz.gettz(tz)
+
+
+def _datetime_to_timestamp(dt, multiplier):
+    """The unix timestamp of a datetime, in seconds (`multiplier` of 1) or
+    milliseconds (1000), rounded down. Computed with exact integer arithmetic,
+    rather than through the float of `dt.timestamp()`, which can be off by
+    one. Timezone-unaware datetimes are assumed to be in local time, like
+    `datetime.timestamp()` does.
+    """
+    if dt.tzinfo is None:
+        dt = dt.astimezone()
+    return (dt - _UTC_EPOCH) // datetime.timedelta(seconds=1 / multiplier)
+
+
+def _parse_timezone_unaware(datetime_str:str)->datetime.datetime:
+    """Parse a datetime string with no timezone into a timezone-unaware
+    datetime. The common ISO 8601 shapes are parsed directly, and anything
+    else by `dateutil.parser.parse()`.
+    """
+    match = _ISO_DATETIME_PATTERN.match(datetime_str)
+    if match is not None:
+        year, month, day, hour, minute, second, fraction = match.groups()
+        try:
+            return datetime.datetime(
+                int(year), int(month), int(day),
+                int(hour or 0), int(minute or 0), int(second or 0),
+                int(fraction.ljust(6, "0")) if fraction else 0,
+            )
+        except ValueError:
+            # Out of range values. Let dateutil raise its own error
+            pass
+    return dateutil.parser.parse(datetime_str)
 
 def set_timezone(
     dt:datetime.datetime,
@@ -30,7 +97,7 @@ def set_timezone(
         timezone (str, optional): The timezone to set the datetime object to. Eg
             "UTC", or "Australia/Melbourne". Defaults to "UTC".
     """
-    tzinfo = dateutil.tz.gettz(tz)
+    tzinfo = get_tzinfo(tz)
     dt = dt.replace(tzinfo=tzinfo)
     return dt
 
@@ -65,7 +132,7 @@ def timestamp_to_datetime(
     if tz is None:
         dt = datetime.datetime.fromtimestamp(timestamp)
     else:
-        tzinfo = dateutil.tz.gettz(tz)
+        tzinfo = get_tzinfo(tz)
         dt = datetime.datetime.fromtimestamp(timestamp, tz=tzinfo)
     return dt
 
@@ -110,8 +177,7 @@ def parse_datetime_str(datetime_str:str, tz:str=None)->datetime.datetime:
     """
     # SEPARATE THE TIMZEONE FROM THE DATETIME STRING
     embedded_tz = None
-    pattern = r"(.*[\d])([\D]*$)"
-    match = re.search(pattern, datetime_str)
+    match = _EMBEDDED_TZ_PATTERN.search(datetime_str)
     if match is not None:
         groups = match.groups()
         datetime_str = groups[0].strip()
@@ -123,15 +189,15 @@ def parse_datetime_str(datetime_str:str, tz:str=None)->datetime.datetime:
     
     # DECIDE WHICH TZ TO USE
     tz = tz if tz is not None else embedded_tz
-    tzinfo = None if tz is None else dateutil.tz.gettz(tz)
+    tzinfo = None if tz is None else get_tzinfo(tz)
     if tzinfo is None: 
         if tz is None:
-            print(f"WARNING: No timezone specified. Setting to timezone-unaware.")
+            logger.warning("No timezone specified. Setting to timezone-unaware.")
         else:
-           print(f"WARNING: Could not parse timezone '{tz}'. Setting to timezone-unaware.")
+            logger.warning("Could not parse timezone '%s'. Setting to timezone-unaware.", tz)
 
     # PARSE THE DATETIME STRING - and assign timezone
-    dt = dateutil.parser.parse(datetime_str)
+    dt = _parse_timezone_unaware(datetime_str)
     dt = dt.replace(tzinfo=tzinfo)
     return dt
 
@@ -155,7 +221,6 @@ def datetime_str_to_timestamp(datetime_str, tz=None, unit="ms"):
             the string. Otherwise, it sets it to timezone-unaware datetime.
     """
     dt = parse_datetime_str(datetime_str, tz=tz)
-    print(dt)
 
     # CONVERT TO TIMESTAMP
     unit = unit.lower().strip()
@@ -165,12 +230,11 @@ def datetime_str_to_timestamp(datetime_str, tz=None, unit="ms"):
         multiplier = 1
     else:
         raise ValueError(f"`unit` must be one of ['ms', 's'], received {unit}.")
-    ts = int(dt.timestamp() * multiplier)
-    return ts
+    return _datetime_to_timestamp(dt, multiplier)
 
 
 def convert_timearg_as_datetime(t):
-    tz = dateutil.tz.gettz(DESIRED_TIMEZONE)
+    tz = get_tzinfo(DESIRED_TIMEZONE)
     if isinstance(t, datetime.datetime):
         dt = t
         if dt.tzinfo is not None:
@@ -178,7 +242,7 @@ def convert_timearg_as_datetime(t):
         else:
             dt = dt.astimezone(tz)
     elif isinstance(t, str):
-        dt = dateutil.parser.parse(t)
+        dt = _parse_timezone_unaware(t)
         dt = dt.replace(tzinfo=tz)
     else:
         ts = float(t)
@@ -197,7 +261,7 @@ def convert_timearg_as_timestamp(t, unit="ms", tz="UTC"):
             multiplier = 1
         else:
             raise ValueError(f"`unit` must be one of ['ms', 's'], received {unit}.")
-        ts = int(t.timestamp() * multiplier)
+        ts = _datetime_to_timestamp(t, multiplier)
     elif isinstance(t, str):
         ts = datetime_str_to_timestamp(t, tz=tz, unit=unit)
     else:
@@ -205,6 +269,200 @@ def convert_timearg_as_timestamp(t, unit="ms", tz="UTC"):
     return ts
 
 
+# ##############################################################################
+#                      Batch conversions
+#                      Convert whole columns of values (lists or numpy arrays)
+#                      at once, resolving the timezone only once.
+# ##############################################################################
+# Formats that numpy can produce directly from its ISO 8601 strings, in UTC.
+# Format -> (numpy unit, suffix)
+_NUMPY_UTC_FORMATS = {
+    "%Y-%m-%d %H:%M:%S %Z": ("s", " UTC"),
+    "%Y-%m-%d %H:%M:%S": ("s", ""),
+    "%Y-%m-%d %H:%M": ("m", ""),
+    "%Y-%m-%d": ("D", ""),
+}
+
+
+# Trailing characters of datetime strings that are a timezone name, eg " UTC"
+_TZ_NAME_CHARS = string.ascii_letters + " "
+
+
+def _get_unit_multiplier(unit):
+    multiplier = UNIT_MULTIPLIERS.get(unit.lower().strip())
+    if multiplier is None:
+        raise ValueError(f"`unit` must be one of {list(UNIT_MULTIPLIERS.keys())}, received {unit}.")
+    return multiplier
+
+
+def _is_numpy_array(values):
+    return numpy is not None and isinstance(values, numpy.ndarray)
+
+
+def _is_utc(tz):
+    return tz is not None and tz.upper() == "UTC"
+
+
+def _parse_utc_datetime_strs(strs, multiplier):
+    """Parse datetime strings in the shapes of `_NUMPY_UTC_FORMATS` as UTC,
+    ignoring any timezone name after them, in a single vectorized operation
+    by numpy. Returns an int64 array of timestamps, or `None` if any of the
+    strings has another shape.
+    """
+    strs = numpy.char.rstrip(numpy.asarray(strs, dtype=str), _TZ_NAME_CHARS)
+    if not numpy.isin(numpy.char.str_len(strs), (10, 16, 19)).all():
+        return None
+    # numpy also reads other shapes of the same lengths, eg '1640995200' as
+    # a year, which `parse_datetime_str()` rejects
+    if not all(map(_ISO_DATETIME_PATTERN.match, strs.tolist())):
+        return None
+    try:
+        ms = strs.astype("datetime64[ms]").astype("int64")
+    except ValueError:
+        return None
+    return ms if multiplier == 1000 else ms // 1000
+
+
+def timestamps_to_datetime64(timestamps, unit="ms"):
+    """Convert unix timestamps to a numpy `datetime64[ms]` array (which is
+    always in UTC). Requires numpy.
+
+    Args:
+        timestamps (list or numpy array): The unix timestamps to convert.
+        unit (str, optional): The unit of the timestamps. Can be "ms" or "s".
+    """
+    if numpy is None:
+        raise ImportError("`timestamps_to_datetime64()` requires `numpy`. Install it with `pip install numpy`")
+    multiplier = _get_unit_multiplier(unit)
+    timestamps = numpy.asarray(timestamps)
+    if numpy.issubdtype(timestamps.dtype, numpy.datetime64):
+        return timestamps.astype("datetime64[ms]")
+    if multiplier == 1000:
+        ms = timestamps.astype("int64")
+    else:
+        ms = numpy.round(timestamps.astype("float64") * 1000).astype("int64")
+    return ms.astype("datetime64[ms]")
+
+
+def timestamps_to_datetimes(timestamps, tz="UTC", unit="ms"):
+    """Batch version of `timestamp_to_datetime()`. Converts a list (or numpy
+    array) of unix timestamps to a list of datetime objects.
+
+    Args:
+        timestamps (list or numpy array): The unix timestamps to convert.
+        tz (str, optional): The timezone to use, eg "UTC", or
+            "Australia/Melbourne". `None` for timezone-unaware local times.
+            Defaults to "UTC".
+        unit (str, optional): The unit of the timestamps. Can be "ms" or "s".
+    """
+    divisor = float(_get_unit_multiplier(unit))
+    if tz is None:
+        tzinfo = None
+    elif _is_utc(tz):
+        # Much faster than the zoneinfo file returned by `gettz("UTC")`
+        tzinfo = dateutil.tz.UTC
+    else:
+        tzinfo = get_tzinfo(tz)
+    if _is_numpy_array(timestamps):
+        # Unbox the whole array to python floats at once
+        timestamps = (timestamps.astype("float64") / divisor).tolist()
+        divisor = 1.0
+    fromtimestamp = datetime.datetime.fromtimestamp
+    return [fromtimestamp(float(ts) / divisor, tzinfo) for ts in timestamps]
+
+
+def timestamps_to_datetime_strs(timestamps, tz="UTC", unit="ms", format=DATETIME_FORMAT):
+    """Batch version of `timestamp_to_datetime_str()`. Converts a list (or
+    numpy array) of unix timestamps to a list of datetime strings.
+
+    For UTC, and a format such as "%Y-%m-%d %H:%M:%S %Z", the strings are
+    built by numpy in a single vectorized operation when it is installed.
+
+    Args:
+        timestamps (list or numpy array): The unix timestamps to convert.
+        tz (str, optional): The timezone to use, eg "UTC", or
+            "Australia/Melbourne". Defaults to "UTC".
+        unit (str, optional): The unit of the timestamps. Can be "ms" or "s".
+        format (str, optional): The format to use for the datetime strings.
+    """
+    if numpy is not None and _is_utc(tz) and format in _NUMPY_UTC_FORMATS:
+        numpy_unit, suffix = _NUMPY_UTC_FORMATS[format]
+        dt64 = timestamps_to_datetime64(timestamps, unit=unit)
+        strs = numpy.datetime_as_string(dt64, unit=numpy_unit)
+        strs = numpy.char.replace(strs, "T", " ")
+        if suffix:
+            strs = numpy.char.add(strs, suffix)
+        return strs.tolist()
+    return [dt.strftime(format) for dt in timestamps_to_datetimes(timestamps, tz=tz, unit=unit)]
+
+
+def datetimes_to_timestamps(datetimes, unit="ms"):
+    """Batch conversion of datetime objects (or a numpy `datetime64` array)
+    to unix timestamps (as ints). Timezone-unaware datetimes are assumed to
+    be in local time, like `datetime.timestamp()` does.
+
+    Args:
+        datetimes (list or numpy array): The datetimes to convert.
+        unit (str, optional): The unit of the timestamps. Can be "ms" or "s".
+
+    Returns:
+        A numpy int64 array if `datetimes` is a numpy array, otherwise a list.
+    """
+    multiplier = _get_unit_multiplier(unit)
+    if _is_numpy_array(datetimes) and numpy.issubdtype(datetimes.dtype, numpy.datetime64):
+        return datetimes.astype("datetime64[ms]" if multiplier == 1000 else "datetime64[s]").astype("int64")
+
+    out = [_datetime_to_timestamp(dt, multiplier) for dt in datetimes]
+    if _is_numpy_array(datetimes):
+        return numpy.asarray(out, dtype="int64")
+    return out
+
+
+def convert_timeargs_as_timestamps(values, unit="ms", tz="UTC"):
+    """Batch version of `convert_timearg_as_timestamp()`. Each value can be a
+    timestamp, a datetime, or a datetime string.
+
+    Args:
+        values (list or numpy array): The values to convert.
+        unit (str, optional): The unit of the timestamps. Can be "ms" or "s".
+        tz (str, optional): The timezone of datetime strings that do not
+            specify one. Defaults to "UTC".
+
+    For UTC, strings such as '2021-12-05 12:50:00 UTC' are parsed by numpy in
+    a single vectorized operation when it is installed.
+
+    Returns:
+        A numpy int64 array if `values` is a numpy array, otherwise a list.
+    """
+    if _is_numpy_array(values):
+        if numpy.issubdtype(values.dtype, numpy.datetime64):
+            return datetimes_to_timestamps(values, unit=unit)
+        if numpy.issubdtype(values.dtype, numpy.number):
+            return values.astype("int64")
+        return numpy.asarray(convert_timeargs_as_timestamps(values.tolist(), unit=unit, tz=tz), dtype="int64")
+
+    multiplier = _get_unit_multiplier(unit)
+    if (numpy is not None) and _is_utc(tz) and isinstance(values, (list, tuple)) and values and all(type(t) is str for t in values):
+        timestamps = _parse_utc_datetime_strs(values, multiplier)
+        if timestamps is not None:
+            return timestamps.tolist()
+    out = []
+    append = out.append
+    for t in values:
+        kind = type(t)
+        if kind is int:
+            append(t)
+        elif kind is float:
+            append(int(t))
+        elif isinstance(t, datetime.datetime):
+            append(_datetime_to_timestamp(t, multiplier))
+        elif isinstance(t, str):
+            append(datetime_str_to_timestamp(t, tz=tz, unit=unit))
+        else:
+            append(int(float(t)))
+    return out
+
+
 # ##############################################################################
 #                      Mapping short tzname to timezone regions
 #                      eg: AEDT -> "Australia/Melbourne"
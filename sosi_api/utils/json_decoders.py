@@ -0,0 +1,176 @@
+"""
+Pluggable JSON decoding.
+
+The fastest JSON library installed is used by default (`orjson`, then `ujson`,
+falling back to the standard library `json`).
+"""
+import codecs
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+JSON_DECODERS = {"json": json.loads}
+if ujson is not None:
+    JSON_DECODERS["ujson"] = ujson.loads
+if orjson is not None:
+    JSON_DECODERS["orjson"] = orjson.loads
+
+
+def get_json_loads(decoder=None):
+    """Get a function that decodes a JSON `str` or `bytes` into python
+    objects.
+
+    Args:
+        decoder (str or callable): Name of the JSON library to use ("orjson",
+            "ujson" or "json"), or a `loads()` function. Defaults to `None`,
+            which uses the fastest library installed.
+    """
+    if callable(decoder):
+        return decoder
+    if decoder is None:
+        for name in ["orjson", "ujson", "json"]:
+            if name in JSON_DECODERS:
+                return JSON_DECODERS[name]
+    loads = JSON_DECODERS.get(decoder)
+    if loads is None:
+        legal_decoders = list(JSON_DECODERS.keys())
+        raise ValueError(f"`decoder` must be one of the installed JSON libraries {legal_decoders}, or a function, received {decoder}")
+    return loads
+
+
+class DecodeError:
+    __slots__ = ("response_kind", "error", "text", "status_code")
+
+    def __init__(self, response_kind, error, text=None, status_code=None):
+        """Returned as the message of a response whose body could not be
+        decoded as `response_kind`.
+
+        Attributes:
+            response_kind (str): The kind of response that was attempted.
+            error (Exception): The exception raised while decoding.
+            text (str): The body of the response as text, if available.
+            status_code (int): The status code of the response.
+        """
+        self.response_kind = response_kind
+        self.error = error
+        self.text = text
+        self.status_code = status_code
+
+    def __repr__(self):
+        return f"DecodeError(response_kind={self.response_kind!r}, status_code={self.status_code}, error={self.error!r})"
+
+    def __bool__(self):
+        return False
+
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]"
+
+
+def iter_json_array(chunks, encoding="utf-8"):
+    """Incrementally parse a JSON document arriving in chunks of bytes, and
+    yield each element of its top level array as soon as it is complete. Only
+    the current (incomplete) element is held in memory.
+
+    If the top level value is not an array, the whole document is parsed, and
+    yielded as a single item once it has been received.
+
+    Raises:
+        ValueError: If the document is not valid JSON (eg elements not
+            separated by commas), once the parser reaches the error.
+
+    Args:
+        chunks (iterable of bytes): The body of the response, eg from
+            `response.iter_content(chunk_size)`.
+        encoding (str): The encoding of the body.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)(errors="strict")
+    chunks = iter(chunks)
+    buffer = ""
+    index = 0
+    finished = False
+    started = False
+    # Whether the next item of the array is an element (or the "]" of an
+    # empty array), rather than a "," or the closing "]"
+    expect_element = True
+    empty = True
+
+    def read_more():
+        nonlocal buffer, index, finished
+        chunk = next(chunks, None)
+        if chunk is None:
+            buffer = buffer[index:] + text_decoder.decode(b"", final=True)
+            finished = True
+        else:
+            buffer = buffer[index:] + text_decoder.decode(chunk)
+        index = 0
+
+    while True:
+        while index < len(buffer) and buffer[index] in _WHITESPACE:
+            index += 1
+        if index >= len(buffer):
+            if finished:
+                if started:
+                    raise json.JSONDecodeError("Unexpected end of JSON array", buffer, index)
+                return
+            read_more()
+            continue
+
+        if not started:
+            if buffer[index] != "[":
+                # Not an array, so parse the whole document at once
+                while not finished:
+                    read_more()
+                yield decoder.decode(buffer[index:])
+                return
+            started = True
+            index += 1
+            continue
+
+        if not expect_element:
+            if buffer[index] == ",":
+                expect_element = True
+                index += 1
+                continue
+            if buffer[index] == "]":
+                break
+            raise json.JSONDecodeError("Expecting ',' delimiter", buffer, index)
+        if buffer[index] == "]":
+            if empty:
+                break
+            raise json.JSONDecodeError("Expecting value", buffer, index)
+
+        try:
+            element, end = decoder.raw_decode(buffer, index)
+        except json.JSONDecodeError:
+            if finished:
+                raise
+            read_more()
+            continue
+        if (end >= len(buffer) or buffer[end] not in _DELIMITERS) and not finished:
+            # A number that is not followed by a delimiter might continue in
+            # the next chunk (eg "12" of "12.5")
+            read_more()
+            continue
+        index = end
+        expect_element = False
+        empty = False
+        yield element
+
+    # Only whitespace may follow the array
+    index += 1
+    while True:
+        if buffer[index:].strip(_WHITESPACE):
+            raise json.JSONDecodeError("Extra data", buffer, index)
+        if finished:
+            return
+        read_more()
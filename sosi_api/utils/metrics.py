@@ -0,0 +1,289 @@
+"""
+Instrumentation of the lifecycle of requests: latency histograms of each
+phase of a request, and counters, per endpoint, and gauges of the state of
+the client (eg the estimated offset of the server's clock). They can be
+exported as a dict, or in the Prometheus text format.
+"""
+import bisect
+import threading
+import time
+
+import urllib3
+from requests.adapters import HTTPAdapter
+
+# The phases of a request that are timed, in the order they happen
+PHASES = (
+    "queue",        # Waiting for the rate limiter
+    "connect",      # Opening a new connection (TCP and TLS handshakes)
+    "ttfb",         # From sending the request to receiving the headers
+    "download",     # Receiving the body
+    "decode",       # Extracting the message from the body
+    "handle",       # Running the status handler of an error response
+    "total",        # The whole request, including retries and cache lookups
+)
+
+# Upper bounds (in seconds) of the buckets of latency histograms
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class RequestHooks:
+    """Hooks called by the clients around each phase of a request. Subclass
+    it and override the methods to plug in other instrumentation (eg
+    tracing). All methods must be thread-safe, and fast.
+    """
+
+    def observe(self, phase, endpoint, seconds):
+        """Called with the duration of each `phase` of a request to `endpoint`
+        (the path of the url).
+        """
+
+    def increment(self, name, endpoint, amount=1, status=None):
+        """Called to count events, such as "requests", "retries", "errors",
+        "cache_hits", "cache_misses", "cache_revalidations", "bytes_received",
+        and "responses" (with the `status` code of the response).
+        """
+
+    def add_gauge(self, name, func):
+        """Called when the client is created, to register a gauge, eg
+        "clock_offset_ms". `func()` returns its current value, or `None` if
+        it has none yet.
+        """
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # The last count is for values above the largest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self):
+        """The number of values less than or equal to each bucket bound."""
+        total = 0
+        out = []
+        for count in self.counts[:-1]:
+            total += count
+            out.append(total)
+        return out
+
+    def quantile(self, q):
+        """Estimate of the `q` quantile (eg 0.99), as the upper bound of the
+        bucket it falls in.
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics(RequestHooks):
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix="sosi_api"):
+        """Latency histograms of each phase of the requests, and counters of
+        events, per endpoint.
+
+        Args:
+            buckets (tuple of floats): Upper bounds, in seconds, of the buckets
+                of the histograms.
+            prefix (str): Prefix of the names of the Prometheus metrics.
+
+        Example:
+            >>> metrics = Metrics()
+            >>> client = BaseClient("http://httpbin.org", metrics=metrics)
+            >>> client.request(endpoint="/json")
+            >>> metrics.snapshot()["histograms"]["ttfb"]["/json"]["count"]
+            1
+            >>> print(metrics.to_prometheus())
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, phase, endpoint, seconds):
+        key = (phase, endpoint)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, name, endpoint, amount=1, status=None):
+        key = (name, endpoint, status)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def add_gauge(self, name, func):
+        # Read when the metrics are exported, rather than on every change
+        with self._lock:
+            self._gauges[name] = func
+
+    def _gauge_values(self):
+        values = {}
+        for name, func in sorted(self._gauges.items()):
+            value = func()
+            if value is not None:
+                values[name] = value
+        return values
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """The current values of all the metrics, as a dict:
+
+            {
+                "histograms": {phase: {endpoint: {"count", "sum", "mean", "p50", "p90", "p99", "buckets"}}},
+                "counters": {name: {endpoint: value}},
+                "gauges": {name: value},
+            }
+
+        Counters with a status (ie "responses") are keyed by
+        `(endpoint, status)` instead of endpoint.
+        """
+        with self._lock:
+            histograms = {}
+            for (phase, endpoint), histogram in self._histograms.items():
+                histograms.setdefault(phase, {})[endpoint] = dict(
+                    count=histogram.count,
+                    sum=histogram.sum,
+                    mean=histogram.sum / histogram.count,
+                    p50=histogram.quantile(0.5),
+                    p90=histogram.quantile(0.9),
+                    p99=histogram.quantile(0.99),
+                    buckets=dict(zip(histogram.buckets, histogram.cumulative_counts())),
+                )
+            counters = {}
+            for (name, endpoint, status), value in self._counters.items():
+                counters.setdefault(name, {})[endpoint if status is None else (endpoint, status)] = value
+            gauges = self._gauge_values()
+        return dict(histograms=histograms, counters=counters, gauges=gauges)
+
+    def to_prometheus(self):
+        """The current values of all the metrics, in the Prometheus text
+        exposition format.
+        """
+        name = f"{self.prefix}_request_phase_seconds"
+        lines = [
+            f"# HELP {name} Duration of each phase of the requests.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            for (phase, endpoint), histogram in sorted(self._histograms.items()):
+                labels = f'phase="{phase}",endpoint="{_escape_label(endpoint)}"'
+                for bound, count in zip(histogram.buckets, histogram.cumulative_counts()):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+            counter_names = sorted({counter for counter, _, _ in self._counters})
+            for counter in counter_names:
+                name = f"{self.prefix}_{counter}_total"
+                lines.append(f"# TYPE {name} counter")
+                for (other, endpoint, status), value in sorted(self._counters.items(), key=str):
+                    if other != counter:
+                        continue
+                    labels = f'endpoint="{_escape_label(endpoint)}"'
+                    if status is not None:
+                        labels += f',status="{status}"'
+                    lines.append(f"{name}{{{labels}}} {value}")
+
+            for gauge, value in self._gauge_values().items():
+                name = f"{self.prefix}_{gauge}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# ##############################################################################
+#                      Timing of new connections
+# ##############################################################################
+_connect_timer = threading.local()
+
+
+def pop_connect_time():
+    """The time (in seconds) spent opening new connections by the current
+    thread since the last call.
+    """
+    seconds = getattr(_connect_timer, "seconds", 0.0)
+    _connect_timer.seconds = 0.0
+    return seconds
+
+
+class _TimedConnectMixin:
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_timer.seconds = getattr(_connect_timer, "seconds", 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPConnection(_TimedConnectMixin, urllib3.connection.HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectMixin, urllib3.connection.HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+# urllib3 pool classes by scheme, that time their new connections
+TIMED_POOL_CLASSES = {
+    "http": _TimedHTTPConnectionPool,
+    "https": _TimedHTTPSConnectionPool,
+}
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """`HTTPAdapter` that records how long it takes to open new connections
+    (read with `pop_connect_time()`).
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = dict(TIMED_POOL_CLASSES)
+
+
+def record_response(hooks, endpoint, response, seconds, connect=0.0, stream=False):
+    """Report the timings and counters of a response that took `seconds`
+    from sending the request to receiving the whole body (or only the
+    headers, if `stream`), of which `connect` seconds were spent connecting.
+    """
+    elapsed = response.elapsed.total_seconds()
+    if connect:
+        hooks.observe("connect", endpoint, connect)
+    hooks.observe("ttfb", endpoint, max(elapsed - connect, 0.0))
+    hooks.increment("requests", endpoint)
+    hooks.increment("responses", endpoint, status=response.status_code)
+    if not stream:
+        hooks.observe("download", endpoint, max(seconds - elapsed, 0.0))
+        hooks.increment("bytes_received", endpoint, len(response.content))
@@ -0,0 +1,107 @@
+"""
+Helpers for fetching large results in several requests, either by splitting a
+time range into windows, or by following a cursor from one page to the next.
+"""
+import concurrent.futures
+import datetime
+
+from .columnar import numpy
+from .dt import convert_timearg_as_timestamp
+
+
+def split_time_range(t1, t2, window_delta, align=False):
+    """Split the time range `[t1, t2]` into consecutive, non-overlapping
+    windows, each spanning at most `window_delta`.
+
+    Args:
+        t1 (int): Start of the time range, as a timestamp in milliseconds.
+        t2 (int): End of the time range (inclusive), as a timestamp in
+            milliseconds.
+        window_delta (datetime.timedelta): The maximum length of each window.
+        align (bool): Whether to start the windows on whole multiples of
+            `window_delta` since the epoch, so that the same windows are
+            found whatever `t1` is (eg for a `WindowStore`). The first and
+            last windows are then cut short by `t1` and `t2`.
+
+    Returns:
+        list of tuples: `(start, end)` timestamps in milliseconds of each
+        window, where both ends are inclusive. In ascending order.
+    """
+    assert isinstance(window_delta, datetime.timedelta), f"`window_delta` should be a `datetime.timedelta`, received a {type(window_delta)}"
+    delta = int(window_delta.total_seconds() * 1000)
+    if delta <= 0:
+        raise ValueError(f"`window_delta` must be positive, received {window_delta}")
+
+    windows = []
+    start = int(t1)
+    while start <= t2:
+        end = min((start - start % delta if align else start) + delta - 1, int(t2))
+        windows.append((start, end))
+        start = end + 1
+    return windows
+
+
+def resolve_time_range(t1=None, t2=None, window_delta=None):
+    """Convert the `t1` and `t2` time arguments (timestamps in milliseconds,
+    datetimes, or datetime strings) to timestamps in milliseconds. If only one
+    of them is given, the other one is set `window_delta` away from it.
+
+    Returns:
+        tuple: `(t1, t2)` as timestamps in milliseconds, or `(None, None)` if
+        neither was given.
+    """
+    if (t1 is None) and (t2 is None):
+        return None, None
+    delta = int(window_delta.total_seconds() * 1000)
+    if t1 is None:
+        t2 = convert_timearg_as_timestamp(t2, unit="ms")
+        t1 = t2 - delta
+    elif t2 is None:
+        t1 = convert_timearg_as_timestamp(t1, unit="ms")
+        t2 = t1 + delta
+    else:
+        t1 = convert_timearg_as_timestamp(t1, unit="ms")
+        t2 = convert_timearg_as_timestamp(t2, unit="ms")
+    return t1, t2
+
+
+def get_record_value(record, key):
+    """Get a field from a single record returned by an API.
+
+    Args:
+        record: The record, eg a list (such as a kline) or a dict (such as a
+            trade).
+        key: How to get the field. Either an index (for list records), a key
+            (for dict records), or a function that takes the record and
+            returns the field.
+    """
+    if callable(key):
+        return key(record)
+    return record[key]
+
+
+def record_timestamp(record, key):
+    """Get an integer field (eg a timestamp in milliseconds, or an id) from a
+    record, whether it is stored as a number, a string, or a NumPy datetime.
+    """
+    value = get_record_value(record, key)
+    if (numpy is not None) and isinstance(value, numpy.datetime64):
+        return int(value.astype("datetime64[ms]").astype("int64"))
+    return int(value)
+
+
+def prefetch_iter(iterable):
+    """Iterate over `iterable`, while the next item is already being produced
+    in a background thread. Useful for overlapping the network request for the
+    next page of results with the processing of the current one.
+    """
+    iterator = iter(iterable)
+    sentinel = object()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(next, iterator, sentinel)
+        while True:
+            item = future.result()
+            if item is sentinel:
+                return
+            future = executor.submit(next, iterator, sentinel)
+            yield item
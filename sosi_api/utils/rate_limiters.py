@@ -0,0 +1,444 @@
+"""
+Rate limiters, used by the clients to stay within the request budget of an API.
+
+A single rate limiter can be shared by several clients (eg. clients for
+different endpoints of the same API, that count against the same API key or
+IP address), by passing the same instance to each of them:
+
+    >>> limiter = SlidingWindowLimiter(max_tokens=1200, period=60)
+    >>> client1 = BaseClient("https://api.example.com", rate_limiter=limiter)
+    >>> client2 = BaseClient("https://api.example.com", rate_limiter=limiter)
+
+To share a budget between processes, use a `FileTokenBucket`.
+"""
+import asyncio
+import collections
+import contextlib
+import os
+import struct
+import threading
+import time
+
+from .retry import parse_retry_after
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class BaseRateLimiter:
+    """Base class for rate limiters. Subclasses must implement
+    `try_acquire()` and `available()`, and set the `capacity` attribute.
+    They may implement `wait_time()`.
+    """
+    capacity = None
+
+    def available(self):
+        """The number of tokens that could be taken right now."""
+        raise NotImplementedError
+
+    def wait_time(self, tokens=1):
+        """The number of seconds until `tokens` could be taken (without taking
+        them), `0` if they could be taken right now, or `None` if unknown.
+        """
+        return 0.0 if self.available() >= tokens else None
+
+    def try_acquire(self, tokens=1):
+        """Attempt to take `tokens` without blocking.
+
+        Returns:
+            float: `0` if the tokens were taken, otherwise the number of
+            seconds to wait before there will be enough tokens.
+        """
+        raise NotImplementedError
+
+    def acquire(self, tokens=1, priority=None):
+        """Block until `tokens` can be taken, and take them.
+
+        Args:
+            tokens (float): The number of tokens to take.
+            priority (str): The priority class of the request. Ignored, except
+                by a `PriorityScheduler`.
+
+        Returns:
+            float: The total number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, tokens=1, priority=None):
+        """Same as `acquire()`, but waits with `asyncio.sleep()` so that it
+        does not block the event loop. The same limiter can be shared between
+        threaded and asyncio clients.
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def update(self, response):
+        """Hook called with every response received. Does nothing by default,
+        but allows subclasses to adapt to the feedback given by the server.
+        """
+        pass
+
+
+class SlidingWindowLimiter(BaseRateLimiter):
+    def __init__(self, max_tokens, period=60.0):
+        """Thread-safe sliding window rate limiter.
+
+        Allows at most `max_tokens` tokens to be taken within any window of
+        `period` seconds. Unlike a token bucket, this never exceeds the budget
+        of a server that counts requests over a rolling window, while still
+        allowing the whole budget to be used in a single burst.
+
+        Args:
+            max_tokens (float): The number of tokens allowed per window.
+            period (float, optional): The length of the window in seconds.
+                Defaults to 60.
+        """
+        if max_tokens <= 0:
+            raise ValueError(f"`max_tokens` must be greater than 0, received {max_tokens}")
+        self.capacity = float(max_tokens)
+        self.period = float(period)
+        self._log = collections.deque()  # (timestamp, tokens) of each acquisition
+        self._used = 0.0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        cutoff = now - self.period
+        while self._log and self._log[0][0] <= cutoff:
+            _, tokens = self._log.popleft()
+            self._used -= tokens
+
+    def available(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return self.capacity - self._used
+
+    def _wait_time(self, now, tokens):
+        if self._used + tokens <= self.capacity:
+            return 0.0
+        # Wait until enough of the oldest acquisitions leave the window
+        excess = self._used + tokens - self.capacity
+        freed = 0.0
+        for timestamp, logged_tokens in self._log:
+            freed += logged_tokens
+            if freed >= excess:
+                return max(timestamp + self.period - now, 1e-3)
+        return self.period
+
+    def wait_time(self, tokens=1):
+        tokens = min(float(tokens), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            return self._wait_time(now, tokens)
+
+    def try_acquire(self, tokens=1):
+        tokens = min(float(tokens), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            wait = self._wait_time(now, tokens)
+            if wait == 0:
+                self._log.append((now, tokens))
+                self._used += tokens
+            return wait
+
+
+class TokenBucket(BaseRateLimiter):
+    def __init__(self, rate, capacity=None):
+        """Thread-safe token bucket rate limiter.
+
+        The bucket starts full, and refills continuously at `rate` tokens per
+        second, up to a maximum of `capacity` tokens. Every request takes one
+        (or more) tokens out of the bucket, waiting for the bucket to refill if
+        there are not enough tokens. This allows short bursts of up to
+        `capacity` requests, while keeping the long term average at `rate`.
+
+        Args:
+            rate (float): The number of tokens added to the bucket per second.
+            capacity (float, optional): The maximum number of tokens the bucket
+                can hold, ie, the largest burst allowed. Defaults to `None`,
+                which allows a burst of up to one second's worth of tokens.
+        """
+        if rate <= 0:
+            raise ValueError(f"`rate` must be greater than 0, received {rate}")
+        self.rate = float(rate)
+        self.capacity = float(max(rate, 1.0) if capacity is None else capacity)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_requests_per_min(cls, max_requests_per_min, burst=None):
+        """Create a token bucket that allows `max_requests_per_min` requests
+        per minute, in bursts of up to `burst` requests (defaults to the whole
+        per minute budget).
+        """
+        burst = max_requests_per_min if burst is None else burst
+        return cls(rate=max_requests_per_min / 60.0, capacity=burst)
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last_refill = now
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def wait_time(self, tokens=1):
+        tokens = min(float(tokens), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(tokens - self._tokens, 0.0) / self.rate
+
+    def try_acquire(self, tokens=1):
+        tokens = min(float(tokens), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+
+class FileTokenBucket(TokenBucket):
+    # Layout of the state file: the tokens, and the `time.monotonic()` of the
+    # last refill, which is the same clock in every process of a host
+    _STATE = struct.Struct("<dd")
+
+    def __init__(self, path, rate, capacity=None):
+        """Token bucket whose state is kept in a file, and updated under an
+        exclusive file lock, so that all the processes on a host that use the
+        same `path` share a single budget (eg the worker processes of a
+        `sosi_api.backfill.Backfill`). It can be pickled, to pass it to other
+        processes. Only available on Unix.
+
+        Args:
+            path (str): Path of the state file. Created if it does not exist.
+            rate (float): The number of tokens added to the bucket per second.
+            capacity (float, optional): The largest burst allowed. Defaults to
+                one second's worth of tokens.
+        """
+        if fcntl is None:
+            raise ImportError("FileTokenBucket requires `fcntl`, which is only available on Unix")
+        super().__init__(rate=rate, capacity=capacity)
+        self.path = path
+        self._fd = None
+        self._pid = None
+
+    @classmethod
+    def from_requests_per_min(cls, path, max_requests_per_min, burst=None):
+        burst = max_requests_per_min if burst is None else burst
+        return cls(path, rate=max_requests_per_min / 60.0, capacity=burst)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_fd"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _file(self):
+        # File locks belong to a process, so each process opens its own file
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    @contextlib.contextmanager
+    def _shared_state(self):
+        """Load the state of the bucket from the file, and save it back, while
+        holding both the thread lock and the file lock.
+        """
+        with self._lock:
+            fd = self._file()
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                data = os.pread(fd, self._STATE.size, 0)
+                now = time.monotonic()
+                if len(data) == self._STATE.size:
+                    self._tokens, self._last_refill = self._STATE.unpack(data)
+                    if self._last_refill > now:
+                        # Saved before the clock restarted (eg a reboot)
+                        self._last_refill = now
+                else:
+                    self._tokens, self._last_refill = self.capacity, now
+                self._refill(now)
+                yield
+                os.pwrite(fd, self._STATE.pack(self._tokens, self._last_refill), 0)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+
+    def available(self):
+        with self._shared_state():
+            return self._tokens
+
+    def wait_time(self, tokens=1):
+        tokens = min(float(tokens), self.capacity)
+        with self._shared_state():
+            return max(tokens - self._tokens, 0.0) / self.rate
+
+    def try_acquire(self, tokens=1):
+        tokens = min(float(tokens), self.capacity)
+        with self._shared_state():
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def close(self):
+        """Close the state file."""
+        with self._lock:
+            if self._fd is not None and self._pid == os.getpid():
+                os.close(self._fd)
+            self._fd = None
+            self._pid = None
+
+
+INTERVAL_LETTER_SECONDS = {"S": 1, "M": 60, "H": 60 * 60, "D": 24 * 60 * 60}
+
+
+def parse_interval(interval:str) -> float:
+    """Convert an interval string made of an `intervalNum` and an
+    `intervalLetter` (eg "1M", "10S", "1D") to a number of seconds.
+    """
+    interval = interval.strip().upper()
+    num, letter = interval[:-1], interval[-1:]
+    if letter not in INTERVAL_LETTER_SECONDS or not num.isdigit():
+        legal_letters = list(INTERVAL_LETTER_SECONDS.keys())
+        raise ValueError(f"`interval` must be an integer followed by one of {legal_letters}, received {interval}")
+    return int(num) * INTERVAL_LETTER_SECONDS[letter]
+
+
+class AdaptiveWeightLimiter(TokenBucket):
+    def __init__(self, limits, header_prefix="X-MBX-USED-WEIGHT-", target=0.9, capacity=None, increase=None, decrease=0.5, min_rate=None):
+        """Request weight limiter that adapts its pace to the used weight
+        reported by the server in the headers of each response.
+
+        It is a token bucket (where each request takes as many tokens as its
+        weight), whose refill rate is adjusted using AIMD (additive increase,
+        multiplicative decrease):
+
+        - While the used weight reported by the server stays below `target`
+          of the limit, the rate is increased by a small constant step, up to
+          the fastest rate allowed by the limits.
+        - When it goes above `target` of the limit, or a 429/418 response is
+          received, the rate is multiplied by `decrease`.
+
+        The tokens in the bucket are also capped to what the server says is
+        left of its budget, and once the budget is used up (or the server
+        sends a `Retry-After` header), all requests are held until the
+        server's interval resets.
+
+        Args:
+            limits (dict): The weight limits of the server, keyed by interval
+                string (`intervalNum` followed by `intervalLetter`). Eg, for
+                Binance, whose REQUEST_WEIGHT limit is 1200 per minute:
+                `{"1M": 1200}`.
+            header_prefix (str, optional): The prefix of the response headers
+                holding the used weight. The interval string is appended to it
+                to get the full header name, eg "X-MBX-USED-WEIGHT-1M". Use
+                "X-MBX-ORDER-COUNT-" to pace by the ORDERS limiter instead.
+            target (float, optional): Fraction of the limits to aim for.
+                Defaults to 0.9
+            capacity (float, optional): The largest burst of weight allowed.
+                Defaults to 10% of the smallest limit.
+            increase (float, optional): The rate (weight per second) added
+                after every response that was under target. Defaults to 1% of
+                the fastest allowed rate.
+            decrease (float, optional): Factor the rate is multiplied by when
+                going over target. Defaults to 0.5
+            min_rate (float, optional): The rate will never be decreased below
+                this. Defaults to 5% of the fastest allowed rate.
+        """
+        if not limits:
+            raise ValueError("`limits` must contain at least one interval")
+        self.limits = {interval.upper(): float(limit) for interval, limit in limits.items()}
+        self.intervals = {interval: parse_interval(interval) for interval in self.limits}
+        self.header_prefix = header_prefix
+        self.target = target
+        self.max_rate = min(limit / self.intervals[interval] for interval, limit in self.limits.items())
+        self.increase = self.max_rate * 0.01 if increase is None else increase
+        self.decrease = decrease
+        self.min_rate = self.max_rate * 0.05 if min_rate is None else min_rate
+        capacity = 0.1 * min(self.limits.values()) if capacity is None else capacity
+        super().__init__(rate=self.max_rate * target, capacity=max(capacity, 1.0))
+        self._hold_until = 0.0
+        self._last_decrease = 0.0
+
+    def wait_time(self, tokens=1):
+        with self._lock:
+            hold = self._hold_until - time.monotonic()
+        if hold > 0:
+            return hold
+        return super().wait_time(tokens)
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            hold = self._hold_until - time.monotonic()
+        if hold > 0:
+            return hold
+        return super().try_acquire(tokens)
+
+    def _decrease_rate(self, now):
+        # Only back off once per second, so that the burst of responses that
+        # were already in flight when the limit was approached do not
+        # collapse the rate all the way down to `min_rate`.
+        if now - self._last_decrease >= 1.0:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._last_decrease = now
+
+    def _hold(self, now, seconds):
+        self._hold_until = max(self._hold_until, now + seconds)
+
+    def update(self, response):
+        headers = response.headers
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            if response.status_code in (418, 429):
+                self._decrease_rate(now)
+                # Either a number of seconds or an HTTP date. Ignored if
+                # neither
+                retry_after = parse_retry_after(headers.get("Retry-After"))
+                if retry_after is not None:
+                    self._hold(now, retry_after)
+
+            over_target = False
+            for interval, limit in self.limits.items():
+                used = headers.get(self.header_prefix + interval)
+                if used is None:
+                    continue
+                used = float(used)
+                target_weight = limit * self.target
+                # Never hold more tokens than the server has left for us
+                self._tokens = min(self._tokens, target_weight - used)
+                if used >= target_weight:
+                    over_target = True
+                if used >= limit:
+                    # Wait for the server's interval to reset
+                    seconds = self.intervals[interval]
+                    self._hold(now, seconds - (time.time() % seconds))
+
+            if over_target:
+                self._decrease_rate(now)
+            elif response.status_code not in (418, 429):
+                self.rate = min(self.max_rate, self.rate + self.increase)
@@ -0,0 +1,259 @@
+"""
+Compact in-memory store for large result sets of fixed-schema records (eg
+the klines or trades of a long time range).
+
+Rather than millions of small lists or dicts of strings, the records are
+kept as one typed column per field (`array.array` of 8 byte machine values
+for numbers and timestamps), so that a kline takes under a hundred bytes,
+rather than about 750 as a decoded json list of strings. Records are read
+through small row views, and ranges of time are selected by binary search,
+without copying anything.
+"""
+import array
+import bisect
+import itertools
+
+from .columnar import COLUMN_TYPECODES, Columns
+from .dt import convert_timearg_as_timestamp, timestamp_to_datetime
+
+
+class Row:
+    """View of one record of a `RecordStore`. Each store creates a subclass
+    with a property per field, so a row only holds its position.
+    """
+    __slots__ = ("_index",)
+    _fields = ()
+
+    def __init__(self, index):
+        self._index = index
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"Row({values})"
+
+    def to_tuple(self):
+        """The raw values of the record (timestamps as ints)."""
+        raise NotImplementedError
+
+    def to_dict(self):
+        """The values of the record by field name, with timestamps converted
+        to datetimes.
+        """
+        return {name: getattr(self, name) for name in self._fields}
+
+
+def _make_row_class(schema, columns, tz):
+    def make_property(name):
+        column = columns[name]
+        if schema.types[name] == "timestamp_ms":
+            # Only converted when the field is read
+            return property(lambda row: timestamp_to_datetime(column[row._index], tz=tz, unit="ms"))
+        return property(lambda row: column[row._index])
+
+    ordered = [columns[name] for name in schema.names]
+    namespace = {name: make_property(name) for name in schema.names}
+    namespace["__slots__"] = ()
+    namespace["_fields"] = tuple(schema.names)
+    namespace["to_tuple"] = lambda row: tuple(column[row._index] for column in ordered)
+    return type("Row", (Row,), namespace)
+
+
+class RecordStore:
+    def __init__(self, schema, records=None, time_column=None, tz="UTC"):
+        """Typed columns of records, appended to as pages arrive. The records
+        must be in ascending order of `time_column`, which lets `between()`
+        select ranges of time by binary search.
+
+        Args:
+            schema (Schema): The names and types of the fields, from
+                `sosi_api.utils.columnar`.
+            records: Records to start with. A list of records (arrays or
+                objects, as returned by the API) or a `Columns` object.
+            time_column (str): Name of the "timestamp_ms" (or "int", eg a
+                trade id) column the records are sorted by. Defaults to the
+                first "timestamp_ms" column of the schema, if any.
+            tz (str): The timezone of the datetimes that timestamps are
+                converted to when read through a row. `None` for timezone
+                unaware local times.
+
+        Example:
+            >>> store = RecordStore(KLINE_SCHEMA)
+            >>> for page in client.iter_pages(endpoint="/api/v3/klines", params=dict(symbol="BTCUSDT", interval="1m"), t1="2022-01-01 00:00:00 UTC", limit=1000):
+            ...     store.extend(page)
+            >>> day = store.between("2022-01-05 00:00:00 UTC", "2022-01-05 23:59:59 UTC")
+            >>> day[0].open_time.isoformat(), day[0].close
+            ('2022-01-05T00:00:00+00:00', 45899.35)
+        """
+        if time_column is None:
+            time_column = next((name for name in schema.names if schema.types[name] == "timestamp_ms"), None)
+        elif schema.types.get(time_column) not in ("timestamp_ms", "int"):
+            raise ValueError(f"`time_column` must be a 'timestamp_ms' or 'int' column of the schema, received {time_column}")
+        self.schema = schema
+        self.time_column = time_column
+        self.tz = tz
+        self._columns = {}
+        for name in schema.names:
+            typecode = COLUMN_TYPECODES[schema.types[name]]
+            self._columns[name] = [] if typecode is None else array.array(typecode)
+        self._row_class = _make_row_class(schema, self._columns, tz)
+        # Views share the columns of the store they were sliced from, and
+        # only see its rows from `_start` to `_stop`
+        self._base = None
+        self._start = 0
+        self._stop = None
+        if records is not None:
+            self.extend(records)
+
+    def _view(self, start, stop):
+        view = object.__new__(type(self))
+        view.schema = self.schema
+        view.time_column = self.time_column
+        view.tz = self.tz
+        view._columns = self._columns
+        view._row_class = self._row_class
+        view._base = self if self._base is None else self._base
+        view._start = start
+        view._stop = stop
+        return view
+
+    def _bounds(self):
+        if self._stop is not None:
+            return self._start, self._stop
+        return 0, len(self._columns[self.schema.names[0]]) if self.schema.names else 0
+
+    def __repr__(self):
+        return f"<RecordStore [{len(self)} rows x {len(self.schema.names)} columns]>"
+
+    def __len__(self):
+        start, stop = self._bounds()
+        return stop - start
+
+    def __getitem__(self, key):
+        """A `Row` by position, a view of a range of rows by slice (eg
+        `store[-1000:]`), or a copy of a column by name.
+        """
+        if isinstance(key, str):
+            return self.column(key)
+        start, stop = self._bounds()
+        if isinstance(key, slice):
+            first, last, step = key.indices(stop - start)
+            if step != 1:
+                raise ValueError("Slices of a RecordStore must have a step of 1")
+            return self._view(start + first, start + max(first, last))
+        index = key + (stop - start) if key < 0 else key
+        if not 0 <= index < stop - start:
+            raise IndexError("RecordStore index out of range")
+        return self._row_class(start + index)
+
+    def __iter__(self):
+        return map(self._row_class, range(*self._bounds()))
+
+    def keys(self):
+        return list(self.schema.names)
+
+    def column(self, name):
+        """A copy of the values of a column (an `array.array`, or a list for
+        "str" columns), with timestamps as ints.
+        """
+        start, stop = self._bounds()
+        return self._columns[name][start:stop]
+
+    def between(self, t1=None, t2=None):
+        """View of the records whose `time_column` is between `t1` and `t2`
+        (both included), found by binary search. Nothing is copied.
+
+        Args:
+            t1: Start of the range. A timestamp in milliseconds, a datetime,
+                or a datetime string, or an id for an "int" `time_column`.
+                `None` for the first record.
+            t2: End of the range. Same formats as `t1`. `None` for the last
+                record.
+        """
+        if self.time_column is None:
+            raise ValueError("`between()` requires a `time_column`")
+        column = self._columns[self.time_column]
+        is_timestamp = self.schema.types[self.time_column] == "timestamp_ms"
+        start, stop = self._bounds()
+        if t1 is not None:
+            t1 = convert_timearg_as_timestamp(t1, unit="ms") if is_timestamp else int(t1)
+            start = bisect.bisect_left(column, t1, start, stop)
+        if t2 is not None:
+            t2 = convert_timearg_as_timestamp(t2, unit="ms") if is_timestamp else int(t2)
+            stop = bisect.bisect_right(column, t2, start, stop)
+        return self._view(start, max(start, stop))
+
+    def extend(self, records):
+        """Append a page of records, after the existing ones.
+
+        Args:
+            records: A list of records (arrays or objects, as returned by the
+                API), decoded with the schema, or a `Columns` object with the
+                same schema (eg a page of the "columnar" response kind).
+
+        Raises:
+            ValueError: If the records are not in ascending order of
+                `time_column`, or start before the last existing record, or
+                if the columns of a `Columns` object are not named and typed
+                like those of the store.
+        """
+        if self._base is not None:
+            raise ValueError("Cannot extend a view of a RecordStore")
+        if not isinstance(records, Columns):
+            records = self.schema.decode(records)
+        elif (records.schema.names != self.schema.names) or (records.schema.types != self.schema.types):
+            raise ValueError(f"The columns {records.schema} do not match the columns of the store {self.schema}")
+        if len(records) == 0:
+            return
+        if self.time_column is not None:
+            times = records.columns[self.time_column]
+            existing = self._columns[self.time_column]
+            if (existing and times[0] < existing[-1]) or any(a > b for a, b in zip(times, itertools.islice(times, 1, None))):
+                raise ValueError(f"Records must be appended in ascending order of `{self.time_column}`")
+        lengths = {name: len(column) for name, column in self._columns.items()}
+        try:
+            for name in self.schema.names:
+                self._columns[name].extend(records.columns[name])
+        except BaseException:
+            # Leave every column as long as the others
+            for name, length in lengths.items():
+                del self._columns[name][length:]
+            raise
+
+    def append(self, record):
+        """Append a single record. Use `extend()` for pages of records."""
+        self.extend([record])
+
+    def to_columns(self):
+        """A copy of the records as a `Columns` object."""
+        return Columns(self.schema, {name: self.column(name) for name in self.schema.names})
+
+    def to_numpy(self):
+        """A copy of the records as a NumPy structured array."""
+        return self.to_columns().to_numpy()
+
+    @property
+    def nbytes(self):
+        """The number of bytes taken by the numeric columns (excluding the
+        "str" columns, which are lists of python objects).
+        """
+        start, stop = self._bounds()
+        return sum(
+            (stop - start) * column.itemsize
+            for column in self._columns.values()
+            if not isinstance(column, list)
+        )
+
+    def __getstate__(self):
+        # Only the rows of the view are pickled (eg results of Backfill
+        # workers), and the row class is created again when unpickled
+        return dict(schema=self.schema, time_column=self.time_column, tz=self.tz, columns=self.to_columns().columns)
+
+    def __setstate__(self, state):
+        self.schema = state["schema"]
+        self.time_column = state["time_column"]
+        self.tz = state["tz"]
+        self._columns = state["columns"]
+        self._row_class = _make_row_class(self.schema, self._columns, self.tz)
+        self._base = None
+        self._start = 0
+        self._stop = None
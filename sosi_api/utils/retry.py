@@ -0,0 +1,227 @@
+"""
+Retrying failed requests, and failing fast when a host keeps failing.
+
+- `RetryPolicy` decides whether (and after how long) a failed request should be
+  sent again.
+- `CircuitBreaker` keeps track of the failures of each host, and stops sending
+  requests to a host that keeps failing, until it has had time to recover.
+"""
+import email.utils
+import random
+import threading
+import time
+
+import requests
+import urllib3
+
+from .. import exceptions
+
+# Methods that can safely be sent more than once, since sending them again has
+# the same effect as sending them once.
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"])
+
+# Statuses meaning that the request was rejected before being executed, so any
+# method can be retried.
+REJECTED_STATUSES = frozenset([418, 429])
+
+
+def parse_retry_after(value):
+    """Parse the value of a `Retry-After` header, which is either a number of
+    seconds, or an HTTP date.
+
+    Returns:
+        float: the number of seconds to wait, or `None` if it could not be
+        parsed.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def did_not_connect(exception):
+    """Whether a request failed before a connection to the server was made
+    (eg a refused connection, a failed DNS lookup, or a connect timeout), so
+    that the request was certainly not executed.
+    """
+    if isinstance(exception, (requests.ConnectTimeout, exceptions.ConnectError)):
+        return True
+    if isinstance(exception, requests.ConnectionError):
+        # `requests` wraps the urllib3 error in a `MaxRetryError`
+        reason = exception.args[0] if exception.args else None
+        reason = getattr(reason, "reason", reason)
+        return isinstance(reason, urllib3.exceptions.NewConnectionError)
+    return False
+
+
+class RetryPolicy:
+    def __init__(self, max_retries=3, backoff_factor=0.5, max_backoff=60.0, jitter=True, retry_statuses=(418, 429, 500, 502, 503, 504), max_retry_after=300.0, idempotent_methods=IDEMPOTENT_METHODS):
+        """Decides which failed requests to retry, and how long to wait before
+        each retry.
+
+        - Responses with a `Retry-After` header (eg 429 and 418) are retried
+          after the number of seconds the server asks for.
+        - Otherwise, the wait grows exponentially with each attempt:
+          `backoff_factor * 2 ** attempt` seconds, capped to `max_backoff`,
+          with random jitter so that many clients failing at the same time do
+          not all retry at the same time.
+        - Non-idempotent requests (eg POST) are only retried when it is certain
+          that the server did not execute them: 418/429 responses, and
+          failures to connect (see `did_not_connect()`), such as a refused
+          connection or a connect timeout. Any other connection error, a 5XX
+          response or a read timeout means that
+          the execution status is unknown, so these are only retried for
+          idempotent methods.
+
+        Args:
+            max_retries (int): The maximum number of retries per request.
+            backoff_factor (float): The wait in seconds before the first retry.
+            max_backoff (float): The maximum wait in seconds between retries.
+            jitter (bool): Whether to randomize the wait between retries.
+            retry_statuses (iterable): Response status codes to retry.
+            max_retry_after (float): Give up instead of retrying if the server
+                asks to wait longer than this many seconds.
+            idempotent_methods (iterable): Methods that are safe to retry when
+                the outcome of the request is unknown.
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.max_retry_after = max_retry_after
+        self.idempotent_methods = frozenset(method.upper() for method in idempotent_methods)
+
+    def backoff(self, attempt):
+        """The wait in seconds before retrying, after `attempt` retries."""
+        wait = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            wait = random.uniform(wait / 2, wait)
+        return wait
+
+    def get_wait(self, method, attempt, response=None, exception=None):
+        """Decide whether to retry a request that failed, either with an error
+        `response`, or by raising an `exception`.
+
+        Args:
+            method (str): The method of the request, eg "GET".
+            attempt (int): The number of retries made so far.
+            response: The response received.
+            exception (Exception): The exception raised while sending.
+
+        Returns:
+            float: The number of seconds to wait before retrying, or `None` if
+            the request should not be retried.
+        """
+        if attempt >= self.max_retries:
+            return None
+        idempotent = method.upper() in self.idempotent_methods
+
+        if exception is not None:
+            if did_not_connect(exception):
+                # The request never reached the server
+                return self.backoff(attempt)
+            elif isinstance(exception, (requests.ConnectionError, requests.Timeout)) and idempotent:
+                return self.backoff(attempt)
+            return None
+
+        status_code = response.status_code
+        if status_code not in self.retry_statuses:
+            return None
+        if (status_code not in REJECTED_STATUSES) and not idempotent:
+            return None
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            return retry_after
+        return self.backoff(attempt)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, failure_statuses=(418, 429, 500, 502, 503, 504)):
+        """Per-host circuit breaker.
+
+        After `failure_threshold` consecutive failures from a host, the circuit
+        for that host opens, and requests to it fail immediately with a
+        `CircuitOpenError`, instead of adding load to a host that is already
+        struggling (or getting an IP banned). After `reset_timeout` seconds, a
+        single trial request is let through: if it succeeds the circuit closes
+        again, otherwise it stays open for another `reset_timeout`. If the
+        outcome of the trial is never recorded, another trial is let through
+        `reset_timeout` seconds after it started.
+
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit.
+            reset_timeout (float): Seconds to wait before a trial request.
+            failure_statuses (iterable): Response status codes that count as
+                failures. Connection errors and timeouts always count.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_statuses = frozenset(failure_statuses)
+        self._hosts = {}  # host -> [state, consecutive failures, opened at]
+        self._lock = threading.Lock()
+
+    def state(self, host):
+        """The state of the circuit for `host`: "closed", "open" or "half_open"."""
+        with self._lock:
+            return self._hosts.get(host, [self.CLOSED])[0]
+
+    def before_request(self, host):
+        """Raise a `CircuitOpenError` if requests to `host` should not be sent."""
+        with self._lock:
+            circuit = self._hosts.get(host)
+            if circuit is None or circuit[0] == self.CLOSED:
+                return
+            state, failures, opened_at = circuit
+            now = time.monotonic()
+            remaining = opened_at + self.reset_timeout - now
+            if remaining <= 0:
+                # Let this request through as a trial. While it is in flight,
+                # the time it started takes the place of the time the circuit
+                # opened
+                circuit[0] = self.HALF_OPEN
+                circuit[2] = now
+                return
+        raise exceptions.CircuitOpenError(f"Circuit for {host} is open after {failures} consecutive failures. Retry in {max(remaining, 0):.1f} seconds")
+
+    def release(self, host):
+        """Give up on a request to `host` without an outcome (eg it was
+        cancelled before it was sent). If it was the trial request, the next
+        request is let through as a new trial.
+        """
+        with self._lock:
+            circuit = self._hosts.get(host)
+            if circuit is not None and circuit[0] == self.HALF_OPEN:
+                circuit[0] = self.OPEN
+                circuit[2] = time.monotonic() - self.reset_timeout
+
+    def record_success(self, host):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def record_failure(self, host):
+        with self._lock:
+            circuit = self._hosts.setdefault(host, [self.CLOSED, 0, 0.0])
+            circuit[1] += 1
+            if circuit[0] == self.HALF_OPEN or circuit[1] >= self.failure_threshold:
+                circuit[0] = self.OPEN
+                circuit[2] = time.monotonic()
+
+    def record_response(self, host, response):
+        if response.status_code in self.failure_statuses:
+            self.record_failure(host)
+        else:
+            self.record_success(host)
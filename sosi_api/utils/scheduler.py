@@ -0,0 +1,281 @@
+"""
+Scheduling of requests of different priorities that share one rate budget.
+"""
+import asyncio
+import collections
+import threading
+import time
+
+from ..exceptions import BackpressureError
+from .metrics import Histogram
+from .rate_limiters import BaseRateLimiter
+
+# Priority classes, from the highest priority to the lowest, with the fraction
+# of the rate budget reserved for each of them
+DEFAULT_PRIORITY_CLASSES = {
+    "critical": 0.2,    # eg orders, and account queries
+    "normal": 0.1,
+    "bulk": 0.0,        # eg backfills of historical data
+}
+
+
+class PriorityScheduler(BaseRateLimiter):
+    def __init__(self, limiter, classes=None, default_priority=None, max_queue=None, max_wait=None, poll_interval=0.05):
+        """Rate limiter that shares the budget of another rate limiter between
+        classes of requests of different priorities. Pass it to a client as
+        its `rate_limiter`, and give each request a `priority` (or set the
+        client's `endpoint_priorities`).
+
+        - Priority: Requests waiting for the budget are served in order of
+          priority, and in order of arrival within a priority class. A
+          request of a higher priority overtakes all the lower priority ones
+          that are already queued, which are deferred until it is sent.
+        - Reserves: A fraction of the budget is reserved for each class, that
+          only the classes with the same or a higher priority can use. Eg with
+          the default classes, "bulk" requests stop once less than 30% of the
+          budget is left, so a backfill can never use up the budget that an
+          urgent "critical" request needs.
+        - Backpressure: Once a class has `max_queue` requests waiting, or a
+          request would wait longer than `max_wait`, a `BackpressureError` is
+          raised, instead of queuing more work behind a budget that has run
+          out.
+
+        Args:
+            limiter (BaseRateLimiter): The rate limiter holding the budget, eg
+                a `SlidingWindowLimiter`.
+            classes (dict): The fraction of the budget (the `capacity` of the
+                `limiter`) reserved for each priority class, keyed by class
+                name, from the highest priority to the lowest. The fractions
+                must add up to less than 1. Defaults to
+                `DEFAULT_PRIORITY_CLASSES`.
+            default_priority (str): The class of requests that do not specify
+                one. Defaults to "normal" if there is such a class, otherwise
+                to the lowest priority class.
+            max_queue (dict): The maximum number of requests waiting in each
+                class, keyed by class name. Classes that are not listed are
+                unbounded.
+            max_wait (dict): The maximum number of seconds a request of each
+                class waits, keyed by class name. Classes that are not listed
+                wait as long as it takes.
+            poll_interval (float): Seconds between checks of the queue, by
+                requests waiting in an event loop (`acquire_async()`), or for
+                limiters that cannot tell how long to wait.
+
+        Example:
+            >>> scheduler = PriorityScheduler(
+            ...     SlidingWindowLimiter(max_tokens=1200, period=60),
+            ...     max_queue={"bulk": 16},
+            ... )
+            >>> client = BaseClient("https://api.binance.com", rate_limiter=scheduler, endpoint_priorities={"/api/v3/order": "critical"})
+            >>> client.request(endpoint="/api/v3/klines", url_params=params, priority="bulk")
+            >>> scheduler.stats()["bulk"]["wait_p99"]
+        """
+        classes = DEFAULT_PRIORITY_CLASSES if classes is None else classes
+        if not classes:
+            raise ValueError("`classes` must contain at least one priority class")
+        if any(reserve < 0 for reserve in classes.values()) or sum(classes.values()) >= 1:
+            raise ValueError(f"The reserves of `classes` must not be negative, and must add up to less than 1, received {classes}")
+        self.limiter = limiter
+        self.classes = dict(classes)
+        self.priorities = list(self.classes)
+        if default_priority is None:
+            default_priority = "normal" if "normal" in self.classes else self.priorities[-1]
+        self.default_priority = self._check_priority(default_priority)
+        self.max_queue = {} if max_queue is None else {self._check_priority(name): n for name, n in max_queue.items()}
+        self.max_wait = {} if max_wait is None else {self._check_priority(name): s for name, s in max_wait.items()}
+        self.poll_interval = poll_interval
+
+        # The fraction of the budget that each class must leave for the
+        # classes of a higher priority
+        self._held_back = {}
+        total = 0.0
+        for name, reserve in self.classes.items():
+            self._held_back[name] = total
+            total += reserve
+
+        self._queues = {name: collections.deque() for name in self.priorities}
+        self._waits = {name: Histogram() for name in self.priorities}
+        self._counts = {name: collections.Counter() for name in self.priorities}
+        self._cond = threading.Condition()
+
+    @property
+    def capacity(self):
+        return self.limiter.capacity
+
+    def _check_priority(self, priority):
+        if priority not in self.classes:
+            raise ValueError(f"`priority` must be one of {list(self.classes)}, received {priority}")
+        return priority
+
+    def available(self):
+        return self.limiter.available()
+
+    def wait_time(self, tokens=1):
+        return self.limiter.wait_time(tokens)
+
+    def update(self, response):
+        self.limiter.update(response)
+
+    def _queued_ahead(self, priority, ticket):
+        """Whether a request of a higher priority, or an earlier request of
+        the same priority, is waiting.
+        """
+        for name in self.priorities:
+            if name == priority:
+                queue = self._queues[name]
+                return bool(queue) and (queue[0] is not ticket)
+            if self._queues[name]:
+                return True
+
+    def _attempt(self, tokens, priority, ticket=None):
+        """Take `tokens` for `priority` if it is its turn, and the budget left
+        outside the reserves of the higher classes allows it. Must be called
+        while holding `self._cond`.
+
+        Returns:
+            float: `0` if the tokens were taken, otherwise the number of
+            seconds to wait, or `None` to wait for the requests queued ahead.
+        """
+        if self._queued_ahead(priority, ticket):
+            return None
+        held_back = self._held_back[priority] * self.limiter.capacity
+        if held_back > 0:
+            wait = self.limiter.wait_time(min(tokens + held_back, self.limiter.capacity))
+            if wait is None:
+                wait = self.poll_interval
+            if wait > 0:
+                return wait
+        return self.limiter.try_acquire(tokens)
+
+    def try_acquire(self, tokens=1, priority=None):
+        priority = self.default_priority if priority is None else self._check_priority(priority)
+        with self._cond:
+            wait = self._attempt(tokens, priority)
+            if wait == 0:
+                self._record(priority, 0.0)
+            return self.poll_interval if wait is None else wait
+
+    def _enqueue(self, priority):
+        max_queue = self.max_queue.get(priority)
+        queue = self._queues[priority]
+        if (max_queue is not None) and (len(queue) >= max_queue):
+            self._counts[priority]["rejected"] += 1
+            raise BackpressureError(f"The queue of {priority} requests is full ({max_queue} requests)")
+        ticket = object()
+        queue.append(ticket)
+        counts = self._counts[priority]
+        counts["max_queued"] = max(counts["max_queued"], len(queue))
+        return ticket
+
+    def _dequeue(self, priority, ticket):
+        self._queues[priority].remove(ticket)
+        # Let the requests queued behind it have their turn
+        self._cond.notify_all()
+
+    def _check_timeout(self, priority, wait, deadline, timeout):
+        """Raise a `BackpressureError` if waiting `wait` seconds would go past
+        the `deadline`.
+        """
+        if deadline is None:
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or ((wait is not None) and (wait > remaining)):
+            self._counts[priority]["timed_out"] += 1
+            raise BackpressureError(f"A {priority} request would wait more than {timeout} seconds for the rate budget")
+
+    def _record(self, priority, waited):
+        self._counts[priority]["acquired"] += 1
+        self._waits[priority].observe(waited)
+
+    def acquire(self, tokens=1, priority=None, timeout=None):
+        """Block until it is the turn of a request of `priority`, and `tokens`
+        can be taken, and take them.
+
+        Args:
+            tokens (float): The number of tokens to take.
+            priority (str): The priority class of the request. Defaults to
+                `default_priority`.
+            timeout (float): Seconds after which to give up, with a
+                `BackpressureError`. Defaults to the `max_wait` of the class.
+
+        Returns:
+            float: The total number of seconds spent waiting.
+        """
+        priority = self.default_priority if priority is None else self._check_priority(priority)
+        timeout = self.max_wait.get(priority) if timeout is None else timeout
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            ticket = self._enqueue(priority)
+            try:
+                while True:
+                    wait = self._attempt(tokens, priority, ticket)
+                    if wait == 0:
+                        break
+                    self._check_timeout(priority, wait, deadline, timeout)
+                    if deadline is not None:
+                        wait = min(wait or float("inf"), deadline - time.monotonic())
+                    self._cond.wait(wait)
+            finally:
+                self._dequeue(priority, ticket)
+            waited = time.monotonic() - start
+            self._record(priority, waited)
+        return waited
+
+    async def acquire_async(self, tokens=1, priority=None, timeout=None):
+        """Same as `acquire()`, but waits with `asyncio.sleep()` so that it
+        does not block the event loop.
+        """
+        priority = self.default_priority if priority is None else self._check_priority(priority)
+        timeout = self.max_wait.get(priority) if timeout is None else timeout
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._attempt(tokens, priority, ticket)
+                    if wait == 0:
+                        break
+                    self._check_timeout(priority, wait, deadline, timeout)
+                # Requests queued ahead do not notify the event loop when they
+                # leave, so check again after `poll_interval`
+                await asyncio.sleep(self.poll_interval if wait is None else min(wait, self.poll_interval))
+        finally:
+            with self._cond:
+                self._dequeue(priority, ticket)
+        waited = time.monotonic() - start
+        with self._cond:
+            self._record(priority, waited)
+        return waited
+
+    def queued(self, priority=None):
+        """The number of requests waiting, of class `priority`, or in total."""
+        with self._cond:
+            if priority is None:
+                return sum(len(queue) for queue in self._queues.values())
+            return len(self._queues[self._check_priority(priority)])
+
+    def stats(self):
+        """The queue and wait time statistics of each priority class, eg to
+        export as metrics. The wait quantiles are the upper bounds of the
+        `Histogram` buckets they fall in.
+        """
+        with self._cond:
+            out = {}
+            for name in self.priorities:
+                waits = self._waits[name]
+                counts = self._counts[name]
+                out[name] = dict(
+                    reserve=self.classes[name],
+                    queued=len(self._queues[name]),
+                    max_queued=counts["max_queued"],
+                    acquired=counts["acquired"],
+                    rejected=counts["rejected"],
+                    timed_out=counts["timed_out"],
+                    wait_mean=(waits.sum / waits.count) if waits.count else None,
+                    wait_p50=waits.quantile(0.5),
+                    wait_p99=waits.quantile(0.99),
+                )
+            return out
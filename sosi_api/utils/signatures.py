@@ -1,12 +1,24 @@
 import hashlib
 import hmac
-import urllib
+import time
+import urllib.parse
 
 
 def hmac_sha256(msg:str, key:str)-> str:
     return hmac.new(key.encode('utf-8'), msg.encode('utf-8'), hashlib.sha256).hexdigest()
 
 
+# Signing functions available
+SIGNATURE_FUNCS = dict(
+    hmac_sha256 = hmac_sha256,
+)
+
+# Hash functions of the HMAC signing algorithms available to `Signer`
+HMAC_DIGESTS = dict(
+    hmac_sha256 = hashlib.sha256,
+)
+
+
 def sign_message(msg:str, kind:str, key:str, **kwargs)-> str:
     """Given a messge string, sign it given the key and name of signing algo.
     
@@ -15,15 +27,10 @@ def sign_message(msg:str, kind:str, key:str, **kwargs)-> str:
         keyword arguments, as the order of the arguments cannot be guaranteed in
         future versions.
     """
-    # Signing functions available
-    signature_func_mapper = dict(
-        hmac_sha256 = hmac_sha256,
-    )    
-
     # Determine which function to use to sign the params
-    signature_func = signature_func_mapper.get(kind)
+    signature_func = SIGNATURE_FUNCS.get(kind)
     if signature_func is None:
-        legal_kinds = list(signature_func_mapper.keys())
+        legal_kinds = list(SIGNATURE_FUNCS.keys())
         err_msg = f"kind must be one of {legal_kinds}, received {kind}"
         raise ValueError(err_msg)
     
@@ -47,3 +54,102 @@ def sign_params(params: dict, kind: str, key: str, **kwargs)-> str:
     # Sign the params
     msg = urllib.parse.urlencode(params)
     return sign_message(msg, kind=kind, key=key)
+
+
+def time_ms() -> int:
+    """The current unix time in milliseconds."""
+    return int(time.time() * 1000)
+
+
+class Signer:
+    def __init__(self, secret, kind="hmac_sha256", api_key=None, api_key_header="X-MBX-APIKEY", recv_window=None, timestamp_key="timestamp", recv_window_key="recvWindow", signature_key="signature", now_ms=None):
+        """Signs the url parameters of requests (eg. Binance "SIGNED"
+        endpoints), adding the timestamp and receive window to them.
+
+        The secret is only encoded and keyed into the HMAC once. Each
+        signature copies that keyed state, and only hashes the query string,
+        which is the exact string that is sent, so nothing is encoded twice.
+
+        Args:
+            secret (str): The secret key to sign with.
+            kind (str): The signing algorithm. eg "hmac_sha256".
+            api_key (str): The API key, sent in the `api_key_header` header of
+                signed requests. Defaults to `None`, for no header.
+            api_key_header (str): The name of the API key header.
+            recv_window (int): How many milliseconds after its timestamp the
+                request is valid for. Defaults to `None`, which leaves it to
+                the server's default.
+            timestamp_key (str): Name of the timestamp parameter. `None` to
+                not add a timestamp.
+            recv_window_key (str): Name of the receive window parameter.
+            signature_key (str): Name of the signature parameter.
+            now_ms (callable): Function returning the current time as a unix
+                timestamp in milliseconds. Defaults to the local clock.
+
+        Example:
+            >>> signer = Signer(secret="abc123", api_key="xyz", recv_window=5000)
+            >>> signer.sign_query({"symbol": "BTCUSDT", "side": "BUY"})
+            'symbol=BTCUSDT&side=BUY&timestamp=1640995200000&recvWindow=5000&signature=...'
+        """
+        digest = HMAC_DIGESTS.get(kind)
+        if digest is None:
+            legal_kinds = list(HMAC_DIGESTS.keys())
+            raise ValueError(f"kind must be one of {legal_kinds}, received {kind}")
+        self.kind = kind
+        self.api_key = api_key
+        self.api_key_header = api_key_header
+        self.recv_window = recv_window
+        self.timestamp_key = timestamp_key
+        self.recv_window_key = recv_window_key
+        self.signature_key = signature_key
+        self.now_ms = time_ms if now_ms is None else now_ms
+        self._hmac = hmac.new(secret.encode("utf-8"), digestmod=digest)
+
+    def __repr__(self):
+        # Never show the secret
+        return f"Signer(kind={self.kind!r}, recv_window={self.recv_window})"
+
+    @property
+    def headers(self):
+        """The headers to send with signed requests."""
+        if self.api_key is None or self.api_key_header is None:
+            return {}
+        return {self.api_key_header: self.api_key}
+
+    def sign(self, msg) -> str:
+        """The hex signature of a message (`str` or `bytes`)."""
+        signature = self._hmac.copy()
+        signature.update(msg.encode("utf-8") if isinstance(msg, str) else msg)
+        return signature.hexdigest()
+
+    def _query(self, params, timestamp, query=""):
+        if params:
+            encoded = urllib.parse.urlencode(params)
+            query = f"{query}&{encoded}" if query else encoded
+        extra = []
+        if self.timestamp_key is not None:
+            extra.append(f"{self.timestamp_key}={timestamp}")
+        if self.recv_window is not None:
+            extra.append(f"{self.recv_window_key}={self.recv_window}")
+        if extra:
+            query = "&".join([query] + extra) if query else "&".join(extra)
+        return f"{query}&{self.signature_key}={self.sign(query)}"
+
+    def sign_query(self, params=None, timestamp=None) -> str:
+        """The signed query string of `params`, with the timestamp, receive
+        window and signature appended.
+
+        Args:
+            params (dict): The parameters of the request.
+            timestamp (int): The timestamp of the request, in milliseconds.
+                Defaults to `now_ms()`.
+        """
+        return self._query(params, self.now_ms() if timestamp is None else timestamp)
+
+    def sign_url(self, url, params=None, timestamp=None) -> str:
+        """`url` with the signed query string of `params` appended. Any query
+        string already in `url` is also covered by the signature.
+        """
+        url, _, query = url.partition("?")
+        timestamp = self.now_ms() if timestamp is None else timestamp
+        return url + "?" + self._query(params, timestamp, query=query)
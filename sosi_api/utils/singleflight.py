@@ -0,0 +1,69 @@
+"""
+Coalescing of identical calls that are in flight at the same time.
+"""
+import copy
+import threading
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "followers")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        """Makes sure that only one call per key is in flight at a time.
+
+        While a call for a key is running, any other thread calling `do()`
+        with the same key waits for it to finish, and gets a deep copy of its
+        result (or has its exception raised), instead of making the same call
+        again.
+        """
+        self.deduplicated = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """Call `func()`, unless a call for `key` is already in flight, in
+        which case, wait for that call and share its result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+                self.deduplicated += 1
+
+        if leader:
+            result = None
+            try:
+                result = func()
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                # No follower can join anymore. Keep a copy of the result for
+                # them, that the caller of the leader cannot mutate
+                try:
+                    if call.followers and call.error is None:
+                        call.result = copy.deepcopy(result)
+                except BaseException as e:
+                    call.error = e
+                finally:
+                    call.event.set()
+            return result
+
+        call.event.wait()
+        if call.error is not None:
+            raise call.error
+        # Copy, so that callers mutating their result do not affect each other
+        return copy.deepcopy(call.result)
@@ -1,13 +1,22 @@
 from .. import exceptions
+from .retry import parse_retry_after
 
 def handle_too_many_requests(response, msg=None, **kwargs):
-    retry_after = response.headers.get("Retry-After")
-    if retry_after is not None:
-        retry_after = int(retry_after)
-    else:
-        retry_after_hours = None
-    raise exceptions.TooManyRequests(f"Retry after {retry_after} seconds", retry_after)
+    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    raise exceptions.TooManyRequests(f"Retry after {retry_after} seconds", retry_after, response=response)
+
+def handle_ip_banned(response, msg=None, **kwargs):
+    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    raise exceptions.IPBanned(f"IP has been banned for continuing to send requests after receiving 429 responses. Retry after {retry_after} seconds", retry_after, response=response)
+
+def handle_status_unknown(response, msg=None, **kwargs):
+    raise exceptions.StatusUnknown(f"{response.status_code} Server Error: the execution status of the request is UNKNOWN, and it could have been a success. {msg}", response=response)
 
 DEFAULT_STATUS_HANDLERS = {
+    418: handle_ip_banned,
     429: handle_too_many_requests,
+    500: handle_status_unknown,
+    502: handle_status_unknown,
+    503: handle_status_unknown,
+    504: handle_status_unknown,
 }
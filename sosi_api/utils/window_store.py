@@ -0,0 +1,128 @@
+"""
+Persistent on-disk store for the records of closed historical time windows
+(eg past klines or trades), which never change once the window is over.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class WindowStore:
+    def __init__(self, path, max_bytes=None, max_age=None, settle_time=24 * 60 * 60):
+        """SQLite backed store of the records fetched for each time window of
+        a time-ranged request.
+
+        Args:
+            path (str): Path of the SQLite database file. Created if it does
+                not exist.
+            max_bytes (int): Once the stored records take up more than this
+                many bytes, the least recently used windows are evicted.
+                Defaults to `None`, for no limit.
+            max_age (float): Windows stored more than this many seconds ago are
+                evicted. Defaults to `None`, for no limit.
+            settle_time (float): How many seconds after the end of a window its
+                records are considered final, and can be stored. This needs to
+                be at least as long as the longest record interval (eg 1 day
+                for daily klines). Defaults to 1 day.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.settle_time = settle_time
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS windows ("
+            "  request TEXT NOT NULL,"
+            "  start INTEGER NOT NULL,"
+            "  end INTEGER NOT NULL,"
+            "  data BLOB NOT NULL,"
+            "  nbytes INTEGER NOT NULL,"
+            "  created REAL NOT NULL,"
+            "  accessed REAL NOT NULL,"
+            "  PRIMARY KEY (request, start, end)"
+            ")"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS windows_accessed ON windows (accessed)")
+
+    @staticmethod
+    def request_key(method, url, params=None, exclude=()):
+        """A string identifying a time-ranged request, excluding the
+        parameters that change from one window to the next (eg the start and
+        end times, or the limit).
+        """
+        params = {str(k): str(v) for k, v in (params or {}).items() if k not in exclude}
+        return json.dumps([method.upper(), url, params], sort_keys=True)
+
+    def is_closed(self, end):
+        """Whether the window ending at `end` (a timestamp in milliseconds) is
+        old enough for its records to be final.
+        """
+        return end < (time.time() - self.settle_time) * 1000
+
+    def get(self, request, start, end):
+        """The stored records of a window, or `None` if it is not stored."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM windows WHERE request = ? AND start = ? AND end = ?",
+                (request, start, end),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute(
+                "UPDATE windows SET accessed = ? WHERE request = ? AND start = ? AND end = ?",
+                (time.time(), request, start, end),
+            )
+        return json.loads(row[0])
+
+    def put(self, request, start, end, records):
+        """Store the records of a window, then evict old windows if needed."""
+        data = json.dumps(records, separators=(",", ":")).encode("utf-8")
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO windows (request, start, end, data, nbytes, created, accessed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (request, start, end, data, len(data), now, now),
+            )
+        self.evict()
+
+    def evict(self):
+        """Remove the windows that are older than `max_age`, then the least
+        recently used ones until the store is within `max_bytes`.
+        """
+        with self._lock:
+            if self.max_age is not None:
+                self._connection.execute("DELETE FROM windows WHERE created < ?", (time.time() - self.max_age,))
+            if self.max_bytes is not None:
+                total = self._connection.execute("SELECT COALESCE(SUM(nbytes), 0) FROM windows").fetchone()[0]
+                if total > self.max_bytes:
+                    rows = self._connection.execute("SELECT request, start, end, nbytes FROM windows ORDER BY accessed").fetchall()
+                    evicted = []
+                    for request, start, end, nbytes in rows:
+                        if total <= self.max_bytes:
+                            break
+                        evicted.append((request, start, end))
+                        total -= nbytes
+                    self._connection.executemany("DELETE FROM windows WHERE request = ? AND start = ? AND end = ?", evicted)
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM windows")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def stats(self):
+        with self._lock:
+            windows, nbytes = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM windows").fetchone()
+            return dict(windows=windows, bytes=nbytes, hits=self.hits, misses=self.misses)
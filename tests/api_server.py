@@ -0,0 +1,68 @@
+"""
+Local stand-in for a REST API, for the tests of the clients.
+"""
+import json
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+
+KLINE_INTERVAL_MS = 60 * 1000
+
+# The open times of the klines of each symbol are shifted by these many
+# milliseconds, so that the klines of different symbols interleave
+KLINE_OFFSETS = {"BTCUSDT": 0, "ETHUSDT": 20000, "BNBUSDT": 40000}
+
+
+def make_klines(symbol, start, end, limit):
+    """`[open_time, symbol]` of the 1 minute klines of `symbol` opening between
+    `start` and `end` (inclusive), up to `limit` of them.
+    """
+    offset = KLINE_OFFSETS.get(symbol, 0)
+    first = start + (offset - start) % KLINE_INTERVAL_MS
+    return [[t, symbol] for t in range(first, end + 1, KLINE_INTERVAL_MS)][:limit]
+
+
+def respond(method, path, params, body):
+    """`(status, json)` of the response of the stand-in API to a request:
+
+    - /api/v3/klines: The klines of `make_klines()` for the `symbol`,
+        `startTime`, `endTime` and `limit` parameters.
+    - /echo: The method, url parameters and json body of the request.
+    - Anything else: a 404.
+    """
+    if path == "/api/v3/klines":
+        return 200, make_klines(params.get("symbol"), int(params["startTime"]), int(params["endTime"]), int(params.get("limit", 500)))
+    elif path == "/echo":
+        return 200, {"method": method, "params": params, "json": body}
+    return 404, {"msg": "Not found."}
+
+
+def in_memory_handler(request):
+    """Handler of an `InMemoryTransport` that answers like the server."""
+    params = {str(k): str(v) for k, v in request.params.items()}
+    return respond(request.method, urllib.parse.urlsplit(request.url).path, params, request.json)
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    """Serves the responses of `respond()`."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_request(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        with self.server.lock:
+            self.server.requests.append((self.command, url.path, params))
+
+        status, message = respond(self.command, url.path, params, body)
+        content = json.dumps(message).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = handle_request
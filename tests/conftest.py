@@ -0,0 +1,23 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from .api_server import APIHandler
+
+
+@pytest.fixture
+def api_server():
+    """A local `APIHandler` server, with the `url` it listens on, and the
+    `requests` it received as `(method, path, params)`.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), APIHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, kwargs=dict(poll_interval=0.01), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
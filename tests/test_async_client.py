@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+from sosi_api import AsyncBaseClient
+from sosi_api.utils.rate_limiters import SlidingWindowLimiter
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_requests_against_a_local_server(api_server):
+    async def main():
+        async with AsyncBaseClient(api_server.url, max_requests_per_min=None) as client:
+            get = await client.request(endpoint="/echo", url_params=dict(symbol="BTCUSDT"))
+            post = await client.request(endpoint="/echo", kind="post", body_params=dict(qty=1))
+            text = await client.request(endpoint="/echo", response_kind="text")
+        return get, post, text
+
+    get, post, text = run(main())
+    assert get == {"method": "GET", "params": {"symbol": "BTCUSDT"}, "json": {}}
+    assert post == {"method": "POST", "params": {}, "json": {"qty": 1}}
+    assert text.startswith('{"method": "GET"')
+
+
+def test_concurrent_requests_keep_their_order(api_server):
+    async def main():
+        async with AsyncBaseClient(api_server.url, max_requests_per_min=None, pool_maxsize=10) as client:
+            return await asyncio.gather(*[client.request(endpoint="/echo", url_params=dict(i=i)) for i in range(50)])
+
+    assert [result["params"]["i"] for result in run(main())] == [str(i) for i in range(50)]
+    assert len(api_server.requests) == 50
+
+
+def test_coroutine_status_handlers(api_server):
+    async def handle_not_found(response, msg=None, **kwargs):
+        await asyncio.sleep(0)
+        return {"status": response.status_code, "msg": msg}
+
+    async def main():
+        async with AsyncBaseClient(api_server.url, max_requests_per_min=None, status_handlers={404: handle_not_found}) as client:
+            return await client.request(endpoint="/missing")
+
+    assert run(main()) == {"status": 404, "msg": {"msg": "Not found."}}
+
+
+def test_unhandled_error_status_raises(api_server):
+    async def main():
+        async with AsyncBaseClient(api_server.url, max_requests_per_min=None) as client:
+            await client.request(endpoint="/missing")
+
+    with pytest.raises(requests.HTTPError):
+        run(main())
+
+
+def test_rate_limiter_paces_concurrent_requests(api_server):
+    async def main():
+        async with AsyncBaseClient(api_server.url, rate_limiter=SlidingWindowLimiter(max_tokens=3, period=0.3)) as client:
+            start = time.monotonic()
+            await asyncio.gather(*[client.request(endpoint="/echo") for _ in range(4)])
+            return time.monotonic() - start
+
+    assert run(main()) >= 0.29
@@ -0,0 +1,54 @@
+import datetime
+import glob
+import os
+import tempfile
+
+from sosi_api.backfill import Backfill, Shard
+
+from .api_server import make_klines
+
+T1 = 1640995200000  # 2022-01-01 00:00:00 UTC
+HOUR = 60 * 60 * 1000
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "BNBUSDT"]
+
+
+def count(klines):
+    return len(klines)
+
+
+def make_backfill(url, **kwargs):
+    kwargs = dict(dict(endpoint="/api/v3/klines", symbols=SYMBOLS, t1=T1, t2=T1 + 4 * HOUR - 1, window_delta=datetime.timedelta(hours=1), processes=2, max_pending=3), **kwargs)
+    return Backfill(url, **kwargs)
+
+
+def bucket_files():
+    return set(glob.glob(os.path.join(tempfile.gettempdir(), "sosi_api_*.bucket")))
+
+
+def test_records_of_all_symbols_are_merged_in_time_order(api_server):
+    records = list(make_backfill(api_server.url, order="time").iter_records())
+
+    expected = [(symbol, kline) for symbol in SYMBOLS for kline in make_klines(symbol, T1, T1 + 4 * HOUR - 1, 10 ** 6)]
+    assert records == sorted(expected, key=lambda item: item[1][0])
+    assert len(api_server.requests) == 12
+
+
+def test_results_are_yielded_in_the_order_of_the_shards(api_server):
+    backfill = make_backfill(api_server.url, order="symbol", transform=count)
+    results = list(backfill)
+
+    assert [Shard(result.symbol, result.start, result.end) for result in results] == backfill.shards()
+    assert [result.symbol for result in results[:5]] == ["BTCUSDT"] * 4 + ["ETHUSDT"]
+    assert all(result.records == 60 for result in results)
+    records = list(make_backfill(api_server.url, order="symbol").iter_records())
+    assert records == [(symbol, kline) for symbol in SYMBOLS for kline in make_klines(symbol, T1, T1 + 4 * HOUR - 1, 10 ** 6)]
+
+
+def test_default_rate_limiter_is_removed_when_stopped_early(api_server):
+    before = bucket_files()
+    backfill = make_backfill(api_server.url)
+    for result in backfill:
+        break
+    assert bucket_files() == before
+    # Fewer shards than the 12 were fetched
+    assert len(api_server.requests) < 12
@@ -0,0 +1,70 @@
+import time
+
+from sosi_api import BaseClient
+from sosi_api.transports import InMemoryTransport
+from sosi_api.utils.cache import ResponseCache
+
+
+def make_client(handler, **cache_kwargs):
+    transport = InMemoryTransport(handler=handler)
+    client = BaseClient("http://example.com", transport=transport, max_requests_per_min=None, cache=ResponseCache(**cache_kwargs))
+    return client, transport
+
+
+def test_entries_expire_after_their_ttl():
+    versions = iter(range(100))
+    client, transport = make_client(lambda request: (200, {"version": next(versions)}), endpoint_ttls={"/info": 0.2})
+
+    assert client.request(endpoint="/info") == {"version": 0}
+    assert client.request(endpoint="/info") == {"version": 0}
+    # Other endpoints, and other parameters, are not cached
+    assert client.request(endpoint="/other") == {"version": 1}
+    assert client.request(endpoint="/other") == {"version": 2}
+    assert client.request(endpoint="/info", url_params=dict(symbol="BTCUSDT")) == {"version": 3}
+    time.sleep(0.25)
+    assert client.request(endpoint="/info") == {"version": 4}
+    assert len(transport.requests) == 5
+    assert client.cache.stats()["hits"] == 1
+
+
+def test_callers_mutating_a_cached_message_do_not_affect_the_cache():
+    client, _ = make_client(lambda request: (200, {"symbols": ["BTCUSDT"]}), ttl=60)
+    client.request(endpoint="/info")["symbols"].clear()
+    assert client.request(endpoint="/info") == {"symbols": ["BTCUSDT"]}
+
+
+def test_expired_entries_are_revalidated_with_their_etag():
+    def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return (304, None, {"ETag": '"v1"'})
+        return (200, {"symbols": ["BTCUSDT"]}, {"ETag": '"v1"'})
+
+    client, transport = make_client(handler, ttl=0.1)
+    assert client.request(endpoint="/info") == {"symbols": ["BTCUSDT"]}
+    time.sleep(0.15)
+    assert client.request(endpoint="/info") == {"symbols": ["BTCUSDT"]}
+    assert transport.requests[1].headers["If-None-Match"] == '"v1"'
+    # The entry is fresh again
+    assert client.request(endpoint="/info") == {"symbols": ["BTCUSDT"]}
+    assert len(transport.requests) == 2
+    assert client.cache.stats()["revalidations"] == 1
+
+
+def test_changed_responses_replace_the_entry():
+    def handler(request):
+        return (200, {"version": 2}, {"ETag": '"v2"'}) if request.headers.get("If-None-Match") else (200, {"version": 1}, {"ETag": '"v1"'})
+
+    client, transport = make_client(handler, ttl=0.1)
+    assert client.request(endpoint="/info") == {"version": 1}
+    time.sleep(0.15)
+    assert client.request(endpoint="/info") == {"version": 2}
+    assert client.request(endpoint="/info") == {"version": 2}
+    assert len(transport.requests) == 2
+
+
+def test_least_recently_used_entries_are_evicted():
+    client, transport = make_client(lambda request: (200, {"path": request.url}), ttl=60, maxsize=2)
+    for endpoint in ["/a", "/b", "/a", "/c", "/a", "/b"]:
+        client.request(endpoint=endpoint)
+    # "/b" was evicted by "/c", since "/a" had been used since
+    assert [request.url for request in transport.requests] == ["http://example.com/a", "http://example.com/b", "http://example.com/c", "http://example.com/b"]
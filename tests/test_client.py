@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from sosi_api import BaseClient
+from sosi_api.transports import InMemoryTransport
+from sosi_api.utils.clock import ClockOffsetTracker
+from sosi_api.utils.columnar import Schema
+from sosi_api.utils.metrics import Metrics
+from sosi_api.utils.signatures import Signer
+
+
+def test_coalescing_keeps_requests_with_different_bodies_apart():
+    received = []
+
+    def handler(request):
+        received.append(request.json)
+        # Keep the request in flight while the other one is made
+        time.sleep(0.1)
+        return (200, request.json)
+
+    transport = InMemoryTransport(handler=handler)
+    client = BaseClient("http://example.com", transport=transport, max_requests_per_min=None, coalesce_requests=True)
+    results = {}
+
+    def put(qty):
+        results[qty] = client.request(endpoint="/o", kind="put", body_params={"qty": qty})
+
+    threads = [threading.Thread(target=put, args=(qty,)) for qty in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(body["qty"] for body in received) == [1, 2]
+    assert results == {1: {"qty": 1}, 2: {"qty": 2}}
+
+
+def test_coalescing_shares_identical_requests():
+    def handler(request):
+        time.sleep(0.1)
+        return (200, {"ok": True})
+
+    transport = InMemoryTransport(handler=handler)
+    client = BaseClient("http://example.com", transport=transport, max_requests_per_min=None, coalesce_requests=True)
+    threads = [threading.Thread(target=client.request, kwargs=dict(endpoint="/o", kind="put", body_params={"qty": 1})) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(transport.requests) == 1
+
+
+def test_id_pagination_of_columnar_pages():
+    trades = [{"id": i, "price": "1.5", "qty": "2", "time": 1640995200000 + i} for i in range(25)]
+
+    def handler(request):
+        start = int(request.params.get("fromId", 0))
+        return (200, trades[start:start + int(request.params["limit"])])
+
+    client = BaseClient("http://example.com", transport=InMemoryTransport(handler=handler), max_requests_per_min=None)
+    schema = Schema([("id", "int"), ("price", "float"), ("time", "timestamp_ms")])
+    pages = list(client.iter_pages(endpoint="/api/v3/historicalTrades", pagination="id", cursor=0, limit=10, response_kind="columnar", schema=schema))
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert list(pages[-1]["id"]) == list(range(20, 25))
+
+
+def test_signed_requests_reject_body_params():
+    client = BaseClient("http://example.com", transport=InMemoryTransport(), max_requests_per_min=None, signer=Signer("secret"))
+    with pytest.raises(ValueError):
+        client.request(endpoint="/api/v3/order", kind="post", body_params={"symbol": "BTCUSDT"}, signed=True)
+    assert client.transport.requests == []
+
+
+def test_closing_request_many_as_completed_early_skips_the_queued_requests():
+    def handler(request):
+        time.sleep(0.01)
+        return (200, {"ok": True})
+
+    transport = InMemoryTransport(handler=handler)
+    client = BaseClient("http://example.com", transport=transport, max_requests_per_min=None)
+    specs = [dict(endpoint="/a", url_params=dict(i=i)) for i in range(100)]
+    for result in client.request_many_as_completed(specs, max_concurrency=2):
+        break
+
+    assert len(transport.requests) < 10
+
+
+def test_clock_offset_is_exported_as_metrics():
+    transport = InMemoryTransport()
+    transport.add_route("GET", "/api/v3/time", json={"serverTime": int(time.time() * 1000) + 5000})
+    metrics = Metrics()
+    client = BaseClient("http://example.com", transport=transport, max_requests_per_min=None, metrics=metrics, clock=ClockOffsetTracker(time_endpoint="/api/v3/time"))
+    assert "clock_offset_ms" not in metrics.to_prometheus()
+    client.sync_clock()
+
+    gauges = metrics.snapshot()["gauges"]
+    assert 4900 < gauges["clock_offset_ms"] < 5100
+    assert gauges["clock_error_ms"] >= 0
+    assert "sosi_api_clock_offset_ms " in metrics.to_prometheus()
@@ -0,0 +1,31 @@
+import json
+import pickle
+
+import pytest
+
+from sosi_api.utils.columnar import Schema
+
+KLINE_SCHEMA = Schema([("open_time", "timestamp_ms"), (None, "str"), ("high", "float"), ("low", "float"), ("close", "float")])
+KLINES = [[1640995200000, "46216.93", "46271.08", "46208.37", "46250.00"], [1640995260000, "46250.00", "46300.00", "46240.01", "46290.55"]]
+
+
+def test_rows_are_indexed_like_the_records_of_the_api():
+    page = KLINE_SCHEMA.decode(KLINES)
+    row = page[-1]
+    assert row["close"] == 46290.55
+    assert row[4] == 46290.55
+    assert row[0] == row["open_time"] == 1640995260000
+    assert row[-1] == 46290.55
+    with pytest.raises(IndexError):
+        row[1]
+    with pytest.raises(KeyError):
+        row["open"]
+    assert [r["high"] for r in page] == [46271.08, 46300.0]
+
+
+def test_rows_and_schemas_serialize():
+    page = KLINE_SCHEMA.decode(KLINES)
+    assert json.loads(json.dumps(page[0])) == [1640995200000, 46271.08, 46208.37, 46250.0]
+    assert pickle.loads(pickle.dumps(page[0])) == page[0]
+    schema = pickle.loads(pickle.dumps(KLINE_SCHEMA))
+    assert schema.decode(KLINES)[0]["close"] == 46250.0
@@ -0,0 +1,33 @@
+import datetime
+import random
+
+import pytest
+
+from sosi_api.utils import dt
+
+
+def test_batch_and_scalar_conversions_agree():
+    rng = random.Random(0)
+    datetimes = [
+        datetime.datetime.fromtimestamp(rng.uniform(0, 2e9), datetime.timezone.utc).replace(microsecond=rng.randrange(10 ** 6))
+        for _ in range(2000)
+    ]
+    strs = [d.strftime("%Y-%m-%d %H:%M:%S UTC") for d in datetimes] + ["2021-12-05", "2021-12-05 12:50", "2021-12-05T12:50:00.123"]
+    for values in (datetimes, strs):
+        for unit in ("ms", "s"):
+            expected = [dt.convert_timearg_as_timestamp(value, unit=unit) for value in values]
+            assert dt.convert_timeargs_as_timestamps(values, unit=unit) == expected
+
+
+def test_timestamps_are_exact():
+    t = datetime.datetime(2004, 6, 5, 11, 49, 37, 294000, tzinfo=datetime.timezone.utc)
+    assert dt.convert_timearg_as_timestamp(t) == 1086436177294
+
+
+def test_batch_rejects_epoch_strings_like_the_scalar_conversion():
+    with pytest.raises(ValueError):
+        dt.convert_timearg_as_timestamp("1640995200")
+    with pytest.raises(ValueError):
+        dt.convert_timeargs_as_timestamps(["1640995200"])
+    with pytest.raises(ValueError):
+        dt.convert_timeargs_as_timestamps(["2021-12-05", "1640995200"])
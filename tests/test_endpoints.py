@@ -0,0 +1,76 @@
+import pytest
+
+from sosi_api import BaseClient
+from sosi_api.endpoints import Endpoint, PreparedEndpoint
+from sosi_api.transports import InMemoryTransport
+from sosi_api.utils.rate_limiters import SlidingWindowLimiter
+from sosi_api.utils.signatures import Signer
+
+
+class ExampleClient(BaseClient):
+    klines = Endpoint("/api/v3/klines", params=dict(interval="1m", limit=1000), weight=2)
+    ticker = Endpoint("/api/v3/ticker/price")
+    order = Endpoint("/api/v3/order", kind="post", signed=True)
+    update = Endpoint("/api/v3/settings", kind="put", headers={"X-Extra": "1"})
+
+
+def make_client(**kwargs):
+    transport = InMemoryTransport(handler=lambda request: (200, {"ok": True}))
+    return ExampleClient("http://example.com", transport=transport, max_requests_per_min=None, **kwargs)
+
+
+def test_endpoints_are_prepared_once_per_client():
+    assert isinstance(ExampleClient.klines, Endpoint)
+    client = make_client()
+    other = ExampleClient("http://other.com", transport=client.transport, max_requests_per_min=None)
+
+    assert isinstance(client.klines, PreparedEndpoint)
+    assert client.klines is client.klines
+    assert client.klines.url == "http://example.com/api/v3/klines"
+    assert other.klines.url == "http://other.com/api/v3/klines"
+
+
+def test_calls_send_the_same_requests_as_request():
+    client = make_client()
+    defaults = dict(interval="1m", limit=1000)
+    client.klines(symbol="BTCUSDT", limit=10)
+    client.request(endpoint="/api/v3/klines", url_params={**defaults, "symbol": "BTCUSDT", "limit": 10})
+    client.update(params=dict(value=1), headers={"X-Call": "2"})
+    client.request(endpoint="/api/v3/settings", kind="put", body_params=dict(value=1), headers={"X-Extra": "1", "X-Call": "2"})
+
+    first, second, third, fourth = client.transport.requests
+    assert first == second
+    assert third == fourth
+    assert third.json == {"value": 1} and third.params == {}
+    # The defaults are never modified by calls
+    assert ExampleClient.klines.params == defaults
+
+
+def test_weights_are_taken_from_the_rate_limiter():
+    limiter = SlidingWindowLimiter(max_tokens=10, period=60)
+    client = make_client(rate_limiter=limiter, endpoint_weights={"/api/v3/ticker/price": 3})
+    client.klines(symbol="BTCUSDT")
+    client.ticker(symbol="BTCUSDT")
+    assert limiter.available() == 5
+
+
+def test_signed_endpoints():
+    with pytest.raises(ValueError):
+        make_client().order
+
+    client = make_client(signer=Signer("secret", api_key="key", now_ms=lambda: 1640995200000))
+    client.order(symbol="BTCUSDT", side="BUY")
+    request = client.transport.requests[0]
+    assert request.headers["X-MBX-APIKEY"] == "key"
+    assert (request.json, request.params) == ({}, {})
+    assert request.url.startswith("http://example.com/api/v3/order?symbol=BTCUSDT&side=BUY&timestamp=1640995200000&signature=")
+
+    with pytest.raises(ValueError):
+        Endpoint("/api/v3/order", kind="post", signed=True, params_in="body").bind(client)
+
+
+def test_bind_to_a_client():
+    client = BaseClient("http://example.com", transport=InMemoryTransport(handler=lambda request: (200, [])), max_requests_per_min=None)
+    trades = Endpoint("/api/v3/trades", kind="post", params_in="url").bind(client)
+    assert trades(symbol="BTCUSDT") == []
+    assert client.transport.requests[0].params == {"symbol": "BTCUSDT"}
@@ -0,0 +1,37 @@
+import pytest
+
+from sosi_api import BaseClient
+from sosi_api.transports import InMemoryTransport
+from sosi_api.utils.json_decoders import DecodeError, iter_json_array
+
+
+def chunked(document, size):
+    data = document.encode("utf-8")
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 1024])
+def test_elements_are_parsed_across_chunks(size):
+    document = ' [12.5, {"a": [1, 2]}, "x,]", [], null] '
+    assert list(iter_json_array(chunked(document, size))) == [12.5, {"a": [1, 2]}, "x,]", [], None]
+    assert list(iter_json_array(chunked("[ ]", size))) == []
+    assert list(iter_json_array(chunked('{"code": -1121}', size))) == [{"code": -1121}]
+
+
+@pytest.mark.parametrize("document", ["[1 2]", "[1,]", "[,1]", "[1,,2]", "[1, 2", "[1] 2"])
+@pytest.mark.parametrize("size", [1, 3, 1024])
+def test_malformed_arrays_raise(document, size):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(document, size)))
+
+
+def test_malformed_stream_ends_with_a_decode_error():
+    transport = InMemoryTransport()
+    transport.add_route("GET", "/api/v3/aggTrades", content=b'[{"a": 1} {"a": 2}]')
+    client = BaseClient("http://example.com", transport=transport, max_requests_per_min=None)
+    items = list(client.request(endpoint="/api/v3/aggTrades", response_kind="stream"))
+
+    assert items[0] == {"a": 1}
+    assert isinstance(items[1], DecodeError)
+    assert (items[1].response_kind, items[1].status_code) == ("stream", 200)
+    assert len(items) == 2
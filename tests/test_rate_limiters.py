@@ -0,0 +1,86 @@
+import email.utils
+import threading
+import time
+from types import SimpleNamespace
+
+from sosi_api import BaseClient
+from sosi_api.transports import InMemoryTransport
+from sosi_api.utils.rate_limiters import AdaptiveWeightLimiter, SlidingWindowLimiter, TokenBucket
+
+
+def response(status_code=200, **headers):
+    return SimpleNamespace(status_code=status_code, headers={name.replace("_", "-"): value for name, value in headers.items()})
+
+
+def test_sliding_window_is_never_exceeded_by_concurrent_threads():
+    limiter = SlidingWindowLimiter(max_tokens=5, period=0.3)
+    times = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(2):
+            limiter.acquire()
+            with lock:
+                times.append(time.monotonic())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    times.sort()
+    assert len(times) == 16
+    # Any 6 acquisitions span more than one window
+    assert all(later - earlier >= 0.3 - 1e-3 for earlier, later in zip(times, times[5:]))
+
+
+def test_token_bucket_paces_requests_at_its_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    assert 0.19 <= time.monotonic() - start < 0.5
+
+
+def test_clients_sharing_a_limiter_share_its_budget():
+    limiter = SlidingWindowLimiter(max_tokens=3, period=0.3)
+    transport = InMemoryTransport(handler=lambda request: (200, {}))
+    clients = [BaseClient("http://example.com", transport=transport, rate_limiter=limiter) for _ in range(2)]
+    start = time.monotonic()
+    for i in range(3):
+        clients[i % 2].request(endpoint="/a")
+    assert time.monotonic() - start < 0.1
+    clients[1].request(endpoint="/a")
+    assert time.monotonic() - start >= 0.29
+
+
+def test_adaptive_rate_increases_additively_and_decreases_multiplicatively():
+    limiter = AdaptiveWeightLimiter({"1M": 1200}, increase=1.0, decrease=0.5)
+    assert limiter.rate == 18.0
+    limiter.rate = 10.0
+    limiter.update(response(**{"X_MBX_USED_WEIGHT_1M": "100"}))
+    assert limiter.rate == 11.0
+    limiter.update(response(**{"X_MBX_USED_WEIGHT_1M": "1100"}))
+    assert limiter.rate == 5.5
+    # Backs off at most once per second
+    limiter.update(response(429))
+    assert limiter.rate == 5.5
+
+
+def test_retry_after_holds_requests():
+    limiter = AdaptiveWeightLimiter({"1M": 1200})
+    limiter.update(response(429, Retry_After="2"))
+    assert 1.5 < limiter.try_acquire() <= 2
+
+
+def test_retry_after_as_an_http_date():
+    limiter = AdaptiveWeightLimiter({"1M": 1200})
+    limiter.update(response(429, Retry_After=email.utils.formatdate(time.time() + 30, usegmt=True)))
+    assert 25 < limiter.wait_time() <= 30
+
+
+def test_unparsable_retry_after_is_ignored():
+    limiter = AdaptiveWeightLimiter({"1M": 1200})
+    limiter.update(response(429, Retry_After="soon"))
+    assert limiter.try_acquire() == 0
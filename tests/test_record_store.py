@@ -0,0 +1,17 @@
+import pytest
+
+from sosi_api.utils.columnar import Columns, Schema
+from sosi_api.utils.record_store import RecordStore
+
+SCHEMA = Schema([("time", "timestamp_ms"), ("price", "float"), ("qty", "float")])
+
+
+def test_columns_typed_unlike_the_store_are_rejected():
+    store = RecordStore(SCHEMA, [[1000, "1.5", "2"]])
+    page = Columns(Schema([("time", "timestamp_ms"), ("price", "float"), ("qty", "str")]), {"time": [2000], "price": [2.5], "qty": ["3"]})
+    with pytest.raises(ValueError):
+        store.extend(page)
+
+    assert [len(store.column(name)) for name in SCHEMA.names] == [1, 1, 1]
+    store.extend([[2000, "2.5", "3"]])
+    assert [row.to_tuple() for row in store] == [(1000, 1.5, 2.0), (2000, 2.5, 3.0)]
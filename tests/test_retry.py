@@ -0,0 +1,95 @@
+import asyncio
+import socket
+import time
+
+import aiohttp
+import pytest
+import requests
+
+from sosi_api import AsyncBaseClient, BaseClient
+from sosi_api.exceptions import CircuitOpenError
+from sosi_api.transports import InMemoryTransport, Urllib3Transport
+from sosi_api.utils.metrics import Metrics
+from sosi_api.utils.retry import CircuitBreaker, RetryPolicy, did_not_connect
+
+
+def test_trial_that_raises_an_unexpected_error_does_not_block_the_host():
+    errors = [requests.ConnectionError("refused"), requests.exceptions.ChunkedEncodingError("truncated")]
+
+    def handler(request):
+        if errors:
+            raise errors.pop(0)
+        return (200, {"ok": True})
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    client = BaseClient("http://example.com", transport=InMemoryTransport(handler=handler), max_requests_per_min=None, circuit_breaker=breaker)
+    with pytest.raises(requests.ConnectionError):
+        client.request(endpoint="/a")
+    time.sleep(0.15)
+    # The trial fails, which opens the circuit again
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.request(endpoint="/a")
+    assert breaker.state("example.com") == CircuitBreaker.OPEN
+    time.sleep(0.15)
+    assert client.request(endpoint="/a") == {"ok": True}
+    assert breaker.state("example.com") == CircuitBreaker.CLOSED
+
+
+def test_half_open_admits_a_new_trial_after_reset_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.record_failure("host")
+    time.sleep(0.15)
+    breaker.before_request("host")
+    assert breaker.state("host") == CircuitBreaker.HALF_OPEN
+    # Only one trial at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request("host")
+    # The outcome of the trial is never recorded
+    time.sleep(0.15)
+    breaker.before_request("host")
+
+
+def test_released_trial_lets_the_next_request_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure("host")
+    breaker._hosts["host"][2] -= 10
+    breaker.before_request("host")
+    breaker.release("host")
+    breaker.before_request("host")
+    assert breaker.state("host") == CircuitBreaker.HALF_OPEN
+
+
+def refused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+@pytest.mark.parametrize("transport", [None, Urllib3Transport()])
+def test_post_is_retried_when_the_connection_is_refused(transport):
+    metrics = Metrics()
+    client = BaseClient(refused_url(), transport=transport, max_requests_per_min=None, retry_policy=RetryPolicy(max_retries=2, backoff_factor=0.01), metrics=metrics)
+    with pytest.raises(requests.ConnectionError) as info:
+        client.request(endpoint="/order", kind="post", body_params={"qty": 1})
+    assert did_not_connect(info.value)
+    assert metrics.snapshot()["counters"]["retries"]["/order"] == 2
+
+
+def test_async_post_is_retried_when_the_connection_is_refused():
+    metrics = Metrics()
+
+    async def main():
+        async with AsyncBaseClient(refused_url(), max_requests_per_min=None, retry_policy=RetryPolicy(max_retries=2, backoff_factor=0.01), metrics=metrics) as client:
+            await client.request(endpoint="/order", kind="post", body_params={"qty": 1})
+
+    with pytest.raises(aiohttp.ClientConnectorError):
+        asyncio.run(main())
+    assert metrics.snapshot()["counters"]["retries"]["/order"] == 2
+
+
+def test_connection_lost_after_sending_is_not_retried_for_post():
+    policy = RetryPolicy(backoff_factor=0.01)
+    error = requests.ConnectionError("Connection aborted.")
+    assert policy.get_wait("POST", 0, exception=error) is None
+    assert policy.get_wait("GET", 0, exception=error) is not None
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from sosi_api import BaseClient
+from sosi_api.exceptions import BackpressureError
+from sosi_api.transports import InMemoryTransport
+from sosi_api.utils.rate_limiters import SlidingWindowLimiter, TokenBucket
+from sosi_api.utils.scheduler import PriorityScheduler
+
+NO_RESERVES = {"critical": 0.0, "normal": 0.0, "bulk": 0.0}
+
+
+def wait_until(condition):
+    while not condition():
+        time.sleep(0.001)
+
+
+def test_higher_priorities_overtake_queued_requests():
+    scheduler = PriorityScheduler(TokenBucket(rate=20, capacity=1), classes=NO_RESERVES)
+    scheduler.acquire()
+    order = []
+
+    def acquire(priority):
+        scheduler.acquire(priority=priority)
+        order.append(priority)
+
+    threads = [threading.Thread(target=acquire, args=("bulk",)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: scheduler.queued("bulk") == 3)
+    threads.append(threading.Thread(target=acquire, args=("critical",)))
+    threads[-1].start()
+    for thread in threads:
+        thread.join()
+
+    assert order == ["critical", "bulk", "bulk", "bulk"]
+
+
+def test_reserves_are_left_for_higher_priorities():
+    scheduler = PriorityScheduler(SlidingWindowLimiter(max_tokens=10, period=60))
+    taken = {}
+    for priority in ["bulk", "normal", "critical"]:
+        taken[priority] = 0
+        while scheduler.try_acquire(priority=priority) == 0:
+            taken[priority] += 1
+
+    # "bulk" leaves 30% of the budget, "normal" leaves 20%
+    assert taken == {"bulk": 7, "normal": 1, "critical": 2}
+
+
+def test_full_queue_raises_backpressure_error():
+    scheduler = PriorityScheduler(TokenBucket(rate=2, capacity=1), max_queue={"bulk": 1})
+    scheduler.acquire(priority="bulk")
+    waiter = threading.Thread(target=scheduler.acquire, kwargs=dict(priority="bulk"))
+    waiter.start()
+    wait_until(lambda: scheduler.queued("bulk") == 1)
+    with pytest.raises(BackpressureError):
+        scheduler.acquire(priority="bulk")
+    # Other classes still queue
+    scheduler.acquire(priority="critical")
+    waiter.join()
+    assert scheduler.stats()["bulk"]["rejected"] == 1
+
+
+def test_requests_that_would_wait_too_long_are_not_sent():
+    scheduler = PriorityScheduler(TokenBucket(rate=1, capacity=1), max_wait={"bulk": 0.1})
+    transport = InMemoryTransport(handler=lambda request: (200, {}))
+    client = BaseClient("http://example.com", transport=transport, rate_limiter=scheduler)
+    client.request(endpoint="/a", priority="bulk")
+    with pytest.raises(BackpressureError):
+        client.request(endpoint="/a", priority="bulk")
+
+    assert len(transport.requests) == 1
+    assert scheduler.stats()["bulk"]["timed_out"] == 1
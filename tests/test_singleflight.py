@@ -0,0 +1,37 @@
+import threading
+import time
+
+from sosi_api.utils.singleflight import SingleFlight
+
+
+def test_leader_mutating_its_result_does_not_affect_followers():
+    for _ in range(20):
+        flight = SingleFlight()
+        release = threading.Event()
+        results = []
+
+        def fetch():
+            release.wait()
+            return {"items": [1, 2, 3]}
+
+        def leader():
+            result = flight.do("key", fetch)
+            result["items"].clear()
+
+        def follower():
+            results.append(flight.do("key", fetch))
+
+        threads = [threading.Thread(target=leader)]
+        threads[0].start()
+        while "key" not in flight._calls:
+            time.sleep(0.001)
+        threads += [threading.Thread(target=follower) for _ in range(4)]
+        for thread in threads[1:]:
+            thread.start()
+        while flight.deduplicated < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert results == [{"items": [1, 2, 3]}] * 4
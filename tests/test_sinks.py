@@ -0,0 +1,36 @@
+import csv
+import json
+import os
+
+import pytest
+
+from sosi_api import BaseClient
+from sosi_api.sinks import CSVSink, NDJSONSink
+from sosi_api.transports import InMemoryTransport
+
+
+def test_resumed_sync_discards_a_partial_batch_even_if_nothing_is_new(tmp_path):
+    with NDJSONSink(str(tmp_path)) as sink:
+        sink.write("BTCUSDT", [[1000, "1.0"], [2000, "2.0"]])
+    path = sink.path("BTCUSDT")
+    with open(path, "ab") as f:
+        f.write(b'[3000,"3.')
+
+    client = BaseClient("http://example.com", transport=InMemoryTransport(), max_requests_per_min=None)
+    assert NDJSONSink(str(tmp_path)).sync(client, "BTCUSDT", endpoint="/api/v3/klines", t2=2000) == 0
+    with open(path) as f:
+        assert [json.loads(line)[0] for line in f] == [1000, 2000]
+
+
+def test_csv_columns_of_dict_records_are_kept_across_batches(tmp_path):
+    with CSVSink(str(tmp_path), time_key="id", batch_size=1) as sink:
+        sink.write("trades", [{"id": 1, "price": "1.5", "qty": "2"}])
+    # A later run, where the keys come in another order, or are missing
+    with CSVSink(str(tmp_path), time_key="id", batch_size=1) as sink:
+        sink.write("trades", [{"qty": "4", "price": "3.5", "id": 2}, {"id": 3, "price": "5.5"}])
+    with pytest.raises(ValueError):
+        CSVSink(str(tmp_path), time_key="id", batch_size=1).write("trades", [{"id": 4, "price": "1", "qty": "1", "time": 0}])
+
+    with open(os.path.join(str(tmp_path), "trades.csv")) as f:
+        rows = list(csv.DictReader(f))
+    assert [(row["id"], row["price"], row["qty"]) for row in rows] == [("1", "1.5", "2"), ("2", "3.5", "4"), ("3", "5.5", "")]
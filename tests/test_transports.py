@@ -0,0 +1,60 @@
+import socket
+
+import pytest
+import requests
+
+from sosi_api import BaseClient
+from sosi_api.transports import HTTP2Transport, InMemoryTransport, RequestsTransport, Urllib3Transport
+from sosi_api.utils.retry import did_not_connect
+
+from .api_server import in_memory_handler, make_klines
+
+NETWORK_TRANSPORTS = {"requests": RequestsTransport, "urllib3": Urllib3Transport, "httpx": HTTP2Transport}
+
+
+@pytest.fixture(params=[*NETWORK_TRANSPORTS, "in_memory"])
+def client(request, api_server):
+    if request.param == "in_memory":
+        client = BaseClient("http://example.com", transport=InMemoryTransport(handler=in_memory_handler), max_requests_per_min=None)
+    else:
+        client = BaseClient(api_server.url, transport=NETWORK_TRANSPORTS[request.param](), max_requests_per_min=None)
+    with client:
+        yield client
+
+
+def test_methods_params_and_bodies(client):
+    assert client.request(endpoint="/echo", url_params=dict(symbol="BTCUSDT", limit=5)) == {"method": "GET", "params": {"symbol": "BTCUSDT", "limit": "5"}, "json": {}}
+    assert client.request(endpoint="/echo", kind="post", body_params=dict(qty=1.5)) == {"method": "POST", "params": {}, "json": {"qty": 1.5}}
+    assert client.request(endpoint="/echo", kind="delete", url_params=dict(orderId=1))["params"] == {"orderId": "1"}
+
+
+def test_raw_responses(client):
+    response = client.request(endpoint="/echo", url_params=dict(symbol="BTCUSDT"), response_kind="raw")
+    assert (response.status_code, response.ok) == (200, True)
+    assert response.headers["content-type"] == "application/json"
+    assert response.url.endswith("/echo?symbol=BTCUSDT")
+    assert response.json()["params"] == {"symbol": "BTCUSDT"}
+    assert response.text.startswith('{"method": "GET"')
+
+
+def test_streamed_responses(client):
+    params = dict(symbol="BTCUSDT", startTime=0, endTime=10 ** 7, limit=100)
+    assert list(client.request(endpoint="/api/v3/klines", url_params=params, response_kind="stream")) == make_klines("BTCUSDT", 0, 10 ** 7, 100)
+
+
+def test_error_statuses(client):
+    with pytest.raises(requests.HTTPError):
+        client.request(endpoint="/missing")
+    client.add_status_handlers({404: "pass"})
+    assert client.request(endpoint="/missing") == {"msg": "Not found."}
+
+
+@pytest.mark.parametrize("name", NETWORK_TRANSPORTS)
+def test_refused_connections(name):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    client = BaseClient(f"http://127.0.0.1:{port}", transport=NETWORK_TRANSPORTS[name](), max_requests_per_min=None)
+    with pytest.raises(requests.ConnectionError) as info:
+        client.request(endpoint="/echo")
+    assert did_not_connect(info.value)
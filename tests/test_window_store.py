@@ -0,0 +1,42 @@
+import datetime
+
+from sosi_api import BaseClient
+from sosi_api.backfill import Backfill
+from sosi_api.utils.window_store import WindowStore
+
+from .api_server import make_klines
+
+T1 = 1640995200000  # 2022-01-01 00:00:00 UTC
+HOUR = 60 * 60 * 1000
+DAY = 24 * HOUR
+KWARGS = dict(endpoint="/api/v3/klines", params=dict(symbol="BTCUSDT"), window_delta=datetime.timedelta(hours=6), limit=1000)
+
+
+def test_shifted_time_range_reads_the_stored_windows(api_server, tmp_path):
+    client = BaseClient(api_server.url, max_requests_per_min=None, window_store=WindowStore(str(tmp_path / "windows.db")))
+    assert list(client.iter_records(t1=T1, t2=T1 + DAY - 1, **KWARGS)) == make_klines("BTCUSDT", T1, T1 + DAY - 1, DAY)
+    assert len(api_server.requests) == 4
+
+    # One hour later, only the new window is fetched, whole
+    records = list(client.iter_records(t1=T1 + HOUR, t2=T1 + DAY + HOUR - 1, **KWARGS))
+    assert records == make_klines("BTCUSDT", T1 + HOUR, T1 + DAY + HOUR - 1, DAY)
+    assert len(api_server.requests) == 5
+
+    records = client._time_range_batched_request(t1=T1 + 2 * HOUR + 1, t2=T1 + DAY + 2 * HOUR, **KWARGS)
+    assert records == make_klines("BTCUSDT", T1 + 2 * HOUR + 1, T1 + DAY + 2 * HOUR, DAY)
+    assert len(api_server.requests) == 5
+
+
+def test_backfill_workers_open_the_window_store(api_server, tmp_path):
+    path = str(tmp_path / "windows.db")
+
+    def run(**kwargs):
+        backfill = Backfill(api_server.url, symbols=["BTCUSDT", "ETHUSDT"], t1=T1, t2=T1 + DAY - 1, processes=2, **KWARGS, **kwargs)
+        return list(backfill.iter_records())
+
+    records = run(window_store=path)
+    assert records == [(symbol, kline) for symbol in ("BTCUSDT", "ETHUSDT") for kline in make_klines(symbol, T1, T1 + DAY - 1, DAY)]
+    assert len(api_server.requests) == 8
+    # A store passed to the clients is opened again by each worker
+    assert run(client_kwargs=dict(window_store=WindowStore(path))) == records
+    assert len(api_server.requests) == 8